@@ -0,0 +1,66 @@
+import os
+import shutil
+from unittest import mock
+
+from diskcache import Cache
+
+import numpy as np
+
+import pytest
+
+from stratopy import cloudsat, goes
+
+import synthetic
+
+#: Pixels per side of the 2 km images. 5424 is the real full disk;
+#: smaller images are windows of it, trimmed to a smaller region.
+SIZE = int(os.environ.get("STRATOPY_BENCH_SIZE", 5424))
+
+#: CloudSat profiles per granule.
+PROFILES = int(os.environ.get("STRATOPY_BENCH_PROFILES", 37000))
+
+
+class FakeCalculator:
+    """pyspectral Calculator without its (downloaded) band responses."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def reflectance_from_tbs(self, zenith, ch7, ch13, **kwargs):
+        with np.errstate(invalid="ignore"):
+            return (ch7 - ch13) / 100.0 * np.cos(np.deg2rad(zenith))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def calculator():
+    with mock.patch("stratopy.goes.Calculator", FakeCalculator):
+        yield
+
+
+@pytest.fixture(scope="session")
+def paths(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("synthetic")
+    paths = synthetic.generate(str(directory), SIZE, PROFILES)
+    yield paths
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def coordinates():
+    return synthetic.region(SIZE) or "south_america"
+
+
+@pytest.fixture(scope="session")
+def goes_obj(paths, coordinates):
+    return goes.read_nc(paths["cmipf"], coordinates=coordinates)
+
+
+@pytest.fixture(scope="session")
+def cloudsat_obj(paths):
+    return cloudsat.read_hdf(paths["cldclass"])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with Cache(str(tmp_path / "cache")) as cache:
+        yield cache
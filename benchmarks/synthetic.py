@@ -0,0 +1,262 @@
+r"""Synthetic GOES-16 and CloudSat files for benchmarks.
+
+Writes CMIPF (one band) and MCMIPF (16 bands) netCDF files with the
+variables, packing and names of the ABI L2 products, and HDF4 files
+shaped like the 2B-CLDCLASS product, at configurable sizes. Images have
+the real pixel sizes: at 5424 pixels per side (the 2 km grid) they are
+full disks, and smaller images are windows of the disk around ``CENTER``
+(see ``region``), so every function of the package works on them as on
+real files.
+
+Usage::
+
+    python benchmarks/synthetic.py <directory> [size] [profiles]
+"""
+
+import os
+import sys
+
+from netCDF4 import Dataset
+
+import numpy as np
+
+from pyhdf.HDF import HC, HDF
+from pyhdf.SD import SD, SDC
+from pyhdf.VS import VS
+
+#: Pixels per side of the 2 km full disk.
+FULL_DISK = 5424
+
+#: (lat, lon) of the center of the windows smaller than the full disk,
+#: the center of the "south_america" region.
+CENTER = (-15.0, -58.5)
+
+#: (row, column) of ``CENTER`` in the 2 km grid, as given by
+#: ``core.GeosProjection().latlon2colfil``.
+CENTER_PIXEL = (3519, 3572)
+
+#: Start of the scan of all the files, as in the ABI file names.
+START = "s20190040600363"
+
+#: (scale_factor, add_offset, min, max) of reflective and emissive bands.
+PACKING = {
+    "reflective": (1.0 / 4095, 0.0, 0.0, 1.0),
+    "emissive": (0.1, 180.0, 200.0, 320.0),
+}
+
+#: Seconds from 2000-01-01 12:00 to the start of the scan.
+SCAN_TIME = 599896836.0
+
+#: Seconds from 1993-01-01 to the start of the CloudSat granule.
+TAI_START = 820734003.0
+
+
+def cmipf_name(band):
+    """ABI file name of a CMIPF band."""
+    return (
+        f"OR_ABI-L2-CMIPF-M3C{band:02d}_G16_{START}_"
+        "e20190040611141_c20190040611196.nc"
+    )
+
+
+def mcmipf_name():
+    """ABI file name of a MCMIPF file."""
+    return (
+        f"OR_ABI-L2-MCMIPF-M3_G16_{START}_"
+        "e20190040611141_c20190040611196.nc"
+    )
+
+
+def cldclass_name():
+    """CloudSat file name of a 2B-CLDCLASS granule."""
+    return "2019004054003_67554_CS_2B-CLDCLASS_GRANULE_P1_R05_E08_F03.hdf"
+
+
+def origin(size):
+    """First (row, column) of a window of the 2 km grid around ``CENTER``."""
+    return tuple(
+        min(max(idx - size // 2, 0), FULL_DISK - size) for idx in CENTER_PIXEL
+    )
+
+
+def region(size):
+    """Coordinates of a region inside the image, or None at full disk.
+
+    Pixels are at least 2 km wide, so a box of ``0.4 * size`` pixels of
+    2 km around ``CENTER`` fits in the window.
+    """
+    if size >= FULL_DISK:
+        return None
+    half = 0.4 * size * 2.0 / 111.0  # degrees
+    lat, lon = CENTER
+    return (lat - half, lat + half, lon + half, lon - half)
+
+
+def _grid(nc, size, factor=1):
+    """Write the fixed grid and projection of a window of the full disk.
+
+    ``factor`` is the number of pixels per 2 km pixel (2 for band 3).
+    """
+    nc.createDimension("y", size * factor)
+    nc.createDimension("x", size * factor)
+    scale = 5.6e-05 / factor
+    first = 0.151844 + (factor - 1) * scale / 2
+    row0, col0 = origin(size)
+    offsets = {"x": -first + col0 * 5.6e-05, "y": first - row0 * 5.6e-05}
+    for name, sign in (("x", 1), ("y", -1)):
+        var = nc.createVariable(name, "i2", (name,))
+        var.scale_factor = sign * scale
+        var.add_offset = offsets[name]
+        var.set_auto_scale(False)
+        var[:] = np.arange(size * factor, dtype="i2")
+
+    nc.createVariable("t", "f8")[...] = SCAN_TIME
+    projection = nc.createVariable("goes_imager_projection", "i4")
+    projection.perspective_point_height = 35786023.0
+    projection.semi_major_axis = 6378137.0
+    projection.semi_minor_axis = 6356752.31414
+    projection.longitude_of_projection_origin = -75.0
+
+
+def _band(nc, name, band, size, rng, dqf_name="DQF", factor=1):
+    """Write the packed CMI and the quality flags of a band."""
+    kind = "reflective" if band <= 6 else "emissive"
+    scale, offset, vmin, vmax = PACKING[kind]
+
+    cmi = nc.createVariable(
+        name, "u2", ("y", "x"), fill_value=np.uint16(65535), zlib=True
+    )
+    cmi.scale_factor = scale
+    cmi.add_offset = offset
+    cmi.set_auto_maskandscale(False)
+
+    low, high = (int((value - offset) / scale) for value in (vmin, vmax))
+    pixels = size * factor
+    raw = rng.integers(low, high, (pixels, pixels)).astype("u2")
+
+    # Pixels of the full disk
+    row0, col0 = origin(size)
+    yy, xx = np.ogrid[:pixels, :pixels]
+    yy, xx = yy + row0 * factor, xx + col0 * factor
+    center = (FULL_DISK * factor - 1) / 2
+    radius = 0.46 * FULL_DISK * factor
+    off_disk = (xx - center) ** 2 + (yy - center) ** 2 > radius**2
+    raw[off_disk] = 65535
+    cmi[:] = raw
+
+    dqf = nc.createVariable(dqf_name, "u1", ("y", "x"), zlib=True)
+    dqf[:] = np.where(off_disk, 3, 0).astype("u1")
+
+
+def write_cmipf(path, band, size=5424, seed=0):
+    """Write a single band CMIPF file.
+
+    Parameters
+    ----------
+    path: ``str``
+        Path of the file.
+    band: int
+        ABI band, from 1 to 16.
+    size: int
+        Pixels per side of the image at 2 km. Band 3 has twice as many,
+        as the real 1 km band.
+    seed: int
+        Seed of the random values.
+    """
+    rng = np.random.default_rng(seed)
+    factor = 2 if band == 3 else 1
+    with Dataset(path, "w") as nc:
+        _grid(nc, size, factor)
+        _band(nc, "CMI", band, size, rng, factor=factor)
+    return path
+
+
+def write_mcmipf(path, size=5424, seed=0):
+    """Write a MCMIPF file with the 16 bands at the same resolution."""
+    rng = np.random.default_rng(seed)
+    with Dataset(path, "w") as nc:
+        _grid(nc, size)
+        for band in range(1, 17):
+            _band(nc, f"CMI_C{band:02d}", band, size, rng, f"DQF_C{band:02d}")
+    return path
+
+
+def write_cldclass(path, profiles=37000, seed=0):
+    """Write a 2B-CLDCLASS-like HDF4 granule.
+
+    The track crosses the GOES-16 disk from south to north, with the
+    geolocation, time and "CloudLayerType" read by ``read_hdf``.
+    """
+    rng = np.random.default_rng(seed)
+    lat = np.linspace(-60.0, 60.0, profiles, dtype=np.float32)
+    lon = np.linspace(-70.0, -50.0, profiles, dtype=np.float32)
+    seconds = np.arange(profiles, dtype=np.float32) * 0.16
+    layers = np.zeros((profiles, 10), dtype=np.int8)
+    layers[:, 0] = rng.integers(0, 9, profiles)
+    layers[:, 1] = rng.integers(0, 9, profiles) * (rng.random(profiles) < 0.3)
+
+    if os.path.exists(path):
+        os.remove(path)
+    sd = SD(path, SDC.WRITE | SDC.CREATE)
+    dataset = sd.create("CloudLayerType", SDC.INT8, layers.shape)
+    dataset[:] = layers
+    dataset.endaccess()
+    sd.end()
+
+    hdf = HDF(path, HC.WRITE)
+    vs = VS(hdf)
+    vdata = {
+        "Latitude": (HC.FLOAT32, lat),
+        "Longitude": (HC.FLOAT32, lon),
+        "Profile_time": (HC.FLOAT32, seconds),
+        "TAI_start": (HC.FLOAT64, [TAI_START]),
+    }
+    for name, (kind, values) in vdata.items():
+        vd = vs.create(name, ((name, kind, 1),))
+        vd.write([[float(value)] for value in values])
+        vd.detach()
+    vs.end()
+    hdf.close()
+    return path
+
+
+def generate(directory, size=5424, profiles=37000):
+    """Write a whole synthetic dataset.
+
+    Parameters
+    ----------
+    directory: ``str``
+        Directory of the files. Created if it doesn't exist.
+    size: int
+        Pixels per side of the 2 km images. Band 3 has twice as many, as
+        the real 1 km band.
+    profiles: int
+        CloudSat profiles of the granule.
+
+    Returns
+    -------
+    ``dict``
+        Paths of the "cmipf" (bands 3, 7 and 13), "mcmipf" and
+        "cldclass" files.
+    """
+    os.makedirs(directory, exist_ok=True)
+    cmipf = tuple(
+        write_cmipf(
+            os.path.join(directory, cmipf_name(band)), band, size, seed=band
+        )
+        for band in (3, 7, 13)
+    )
+    return {
+        "cmipf": cmipf,
+        "mcmipf": write_mcmipf(os.path.join(directory, mcmipf_name()), size),
+        "cldclass": write_cldclass(
+            os.path.join(directory, cldclass_name()), profiles
+        ),
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    paths = generate(args[0], *(int(arg) for arg in args[1:]))
+    for kind, path in paths.items():
+        print(kind, path)
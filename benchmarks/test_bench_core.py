@@ -0,0 +1,51 @@
+import numpy as np
+
+import pytest
+
+from stratopy import core
+
+
+@pytest.fixture(scope="module")
+def scan_grid():
+    # Scan angles of a 1000 x 1000 window of the full disk
+    proj = core.GeosProjection()
+    return proj.colfil2scan(
+        np.arange(2000, 3000)[np.newaxis, :], np.arange(3000, 4000)[:, None]
+    )
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_scan2latlon(benchmark, scan_grid, dtype):
+    benchmark(core.GeosProjection().scan2latlon, *scan_grid, dtype=dtype)
+
+
+def test_scan2sat(benchmark, scan_grid):
+    benchmark(core.scan2sat, *scan_grid)
+
+
+def test_latlon2scan(benchmark, scan_grid):
+    lat, lon = core.GeosProjection().scan2latlon(*scan_grid)
+    benchmark(core.latlon2scan, lat, lon)
+
+
+def test_gen_vect(benchmark):
+    bands = {
+        f"C{band:02d}": np.random.default_rng(band).uniform(size=(500, 500))
+        for band in range(1, 17)
+    }
+    benchmark(core.gen_vect, (250, 250), bands)
+
+
+def test_extract_patches(benchmark):
+    image = np.random.default_rng(0).uniform(size=(2000, 2000, 3))
+    rng = np.random.default_rng(1)
+    centers = rng.integers(0, 2000, (2, 100000))
+    benchmark(core.extract_patches, image, centers, size=5)
+
+
+def test_merge(benchmark, cloudsat_obj, goes_obj):
+    benchmark(core.merge, cloudsat_obj, goes_obj)
+
+
+def test_merge_tensor(benchmark, cloudsat_obj, goes_obj):
+    benchmark(core.merge, cloudsat_obj, goes_obj, as_tensor=True)
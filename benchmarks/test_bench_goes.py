@@ -0,0 +1,50 @@
+import numpy as np
+
+from stratopy import goes
+
+
+def test_read_nc_cmipf(benchmark, paths, coordinates):
+    benchmark(goes.read_nc, paths["cmipf"], coordinates=coordinates)
+
+
+def test_read_nc_packed(benchmark, paths, coordinates):
+    benchmark(
+        goes.read_nc, paths["cmipf"], packed=True, coordinates=coordinates
+    )
+
+
+def test_read_nc_mcmipf(benchmark, paths, coordinates):
+    benchmark(goes.read_nc, (paths["mcmipf"],), coordinates=coordinates)
+
+
+def test_trim(benchmark, goes_obj):
+    benchmark(goes_obj.trim)
+
+
+def test_solar7(benchmark, goes_obj):
+    trimmed = goes_obj.trim()
+    benchmark(
+        goes.solar7,
+        goes_obj._trim_coord["M3C07"],
+        trimmed["M3C07"],
+        trimmed["M3C13"],
+        goes_obj._projection["M3C07"],
+        utc_time=goes_obj._img_date,
+        max_zenith=goes.MAX_ZENITH,
+    )
+
+
+def test_rgb(benchmark, goes_obj):
+    benchmark(goes_obj.rgb)
+
+
+def test_rgb_float32(benchmark, goes_obj):
+    benchmark(goes_obj.rgb, dtype=np.float32)
+
+
+def test_mask(benchmark, goes_obj):
+    benchmark(goes.mask, goes_obj.RGB)
+
+
+def test_rgb2hsi(benchmark, goes_obj):
+    benchmark(goes.rgb2hsi, goes_obj.RGB)
@@ -0,0 +1,31 @@
+import os
+
+from stratopy import IO, cloudsat
+
+
+def test_read_hdf(benchmark, paths):
+    benchmark(cloudsat.read_hdf, paths["cldclass"])
+
+
+def test_fetch_goes_cached(benchmark, paths, cache):
+    path = paths["cmipf"][1]
+    filename = os.path.basename(path)
+    with open(path, "rb") as fp:
+        cache.set(filename.split("_")[3][1:], fp.read())
+
+    benchmark(IO.fetch_goes, f"noaa-goes16/{filename}", path=cache.directory)
+
+
+def test_fetch_cloudsat_cached(benchmark, paths, cache):
+    path = paths["cldclass"]
+    filename = os.path.basename(path)
+    with open(path, "rb") as fp:
+        cache.set(filename.split("_")[0], fp.read())
+
+    benchmark(
+        IO.fetch_cloudsat,
+        f"2B-CLDCLASS.P1_R05/2019/004/{filename}",
+        user="anonymous",
+        passwd="",
+        path=cache.directory,
+    )
@@ -28,6 +28,8 @@ setup(
     long_description=LONG_DESCRIPTION,
     long_description_content_type="text/markdown",
     install_requires=REQUIREMENTS,
+    extras_require={"parquet": ["pyarrow"]},
+    entry_points={"console_scripts": ["stratopy=stratopy.cli:main"]},
     author="Paula Romero, Georgynio Rosales, Jose Robledo, Julian Villa",
     author_email="paula.romero@mi.unc.edu.ar",
     url="https://github.com/paula-rj/StratoPy",
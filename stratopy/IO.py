@@ -1,17 +1,23 @@
 r"""Module containing magement function."""
 
-import io
+import contextlib
+import ftplib
+import functools
+import hashlib
 import os
 import pathlib
+import shutil
 import tempfile
+import time
 from ftplib import FTP
 
-from diskcache import Cache
-from diskcache.core import ENOVAL
+import attr
 
-import s3fs
+from diskcache import Cache, Lock
+from diskcache.core import ENOVAL
 
 from . import core
+from .catalog import Catalog, GOES_BUCKET, parse_goes
 from .cloudsat import read_hdf
 from .goes import read_nc
 
@@ -20,6 +26,227 @@ DEFAULT_CACHE_PATH = pathlib.Path(
     os.path.expanduser(os.path.join("~", "stratopy_cache"))
 )
 
+#: Maximum bytes held in memory at once by every download.
+BLOCK_SIZE = 2 ** 20
+
+
+@attr.s
+class _HashingReader:
+    """File-like object that hashes and counts the bytes read from another.
+
+    Reads are limited to ``BLOCK_SIZE`` bytes.
+    """
+
+    raw = attr.ib()
+    hash = attr.ib(factory=hashlib.sha256)
+    size = attr.ib(default=0)
+
+    def read(self, size=-1):
+        """Read at most ``size`` bytes, and ``BLOCK_SIZE`` at most."""
+        if size is None or size < 0 or size > BLOCK_SIZE:
+            size = BLOCK_SIZE
+        chunk = self.raw.read(size)
+        self.hash.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+
+def _store(cache, id_, reader, tag, expected_size=None):
+    """Stream a download into the file storage of the cache.
+
+    The SHA-256 of the file is stored under (id_, "sha256"), see
+    ``_open_cached``.
+    """
+    hashing = _HashingReader(reader)
+    cache.set(id_, hashing, read=True, tag=tag, retry=True)
+    if expected_size is not None and hashing.size != expected_size:
+        cache.delete(id_, retry=True)
+        raise IOError(
+            f"Incomplete download of {id_}: "
+            f"{hashing.size} of {expected_size} bytes"
+        )
+    cache.set((id_, "sha256"), hashing.hash.hexdigest(), tag=tag, retry=True)
+
+
+@attr.s(frozen=True)
+class Retry:
+    """Policy of the retries of the downloads.
+
+    A failed download waits ``backoff * factor ** n`` seconds (at most
+    ``max_delay``) before the attempt n + 1, and resumes from the bytes
+    already downloaded.
+
+    Attributes
+    ----------
+    attempts: int
+        Maximum attempts of every download.
+    backoff: float
+        Seconds before the second attempt.
+    factor: float
+        Growth of the wait between attempts.
+    max_delay: float
+        Maximum seconds between attempts.
+    """
+
+    attempts = attr.ib(default=5)
+    backoff = attr.ib(default=1.0)
+    factor = attr.ib(default=2.0)
+    max_delay = attr.ib(default=60.0)
+
+    def delay(self, attempt):
+        """Seconds to wait after the failed attempt number ``attempt``."""
+        return min(self.backoff * self.factor ** attempt, self.max_delay)
+
+
+#: Default retry policy of the downloads.
+RETRY = Retry()
+
+#: Errors of the downloads that are not retried.
+PERMANENT_ERRORS = (ftplib.error_perm, FileNotFoundError, PermissionError)
+
+#: Errors of the downloads that are retried, e.g. dropped connections.
+TRANSIENT_ERRORS = (OSError, EOFError, ftplib.Error)
+
+#: Seconds after which the lock of a download is released, in case the
+#: process holding it died.
+LOCK_EXPIRE = 900
+
+
+def _download(cache, id_, tag, open_at, retry=RETRY):
+    """Download a file into the cache, resuming after failures.
+
+    The bytes are appended to "<cache>/partial/<id_>.part", which
+    survives failures (and the process) so following attempts resume from
+    its size. The complete file is then copied into the cache (which has
+    no way to take an existing file) while it's hashed, and removed, so
+    downloads are written twice to disk.
+
+    Parameters
+    ----------
+    open_at: callable
+        ``open_at(offset)`` returns a context manager of (reader, size)
+        of the file from the byte ``offset``, where size is the size of
+        the whole file (None if it's unknown).
+    """
+    partial = os.path.join(cache.directory, "partial")
+    os.makedirs(partial, exist_ok=True)
+    part = os.path.join(partial, f"{id_}.part")
+
+    # Other processes wait for the download instead of appending to it
+    with Lock(cache, ("download", id_), expire=LOCK_EXPIRE):
+        result = _open_cached(cache, id_)
+        if result is not ENOVAL:
+            return result
+
+        for attempt in range(retry.attempts):
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            try:
+                with open_at(offset) as (reader, size):
+                    with open(part, "ab") as fp:
+                        shutil.copyfileobj(reader, fp, BLOCK_SIZE)
+                written = os.path.getsize(part)
+                if size is not None and written > size:
+                    os.remove(part)  # not a piece of this file
+                if size is not None and written != size:
+                    raise IOError(
+                        f"Incomplete download of {id_}: "
+                        f"{written} of {size} bytes"
+                    )
+                break
+            except PERMANENT_ERRORS:
+                raise
+            except TRANSIENT_ERRORS:
+                if attempt + 1 >= retry.attempts:
+                    raise
+                time.sleep(retry.delay(attempt))
+
+        with open(part, "rb") as fp:
+            _store(cache, id_, fp, tag, size)
+        os.remove(part)
+
+    return _open_cached(cache, id_)
+
+
+@contextlib.contextmanager
+def _ftp_open_at(offset, host, user, passwd, dirname):
+    """Reader of a file of a FTP server from a byte (see ``_download``)."""
+    ftp = FTP()
+    ftp.connect(host=host)
+    try:
+        ftp.login(user, passwd)
+        ftp.voidcmd("TYPE I")
+        try:
+            size = ftp.size(dirname)
+        except ftplib.all_errors:
+            size = None
+
+        # The REST command starts the transfer at the offset
+        with ftp.transfercmd(f"RETR {dirname}", rest=offset or None) as conn:
+            with conn.makefile("rb") as reader:
+                yield reader, size
+        ftp.voidresp()
+        ftp.quit()
+    finally:
+        ftp.close()
+
+
+@contextlib.contextmanager
+def _s3_open_at(offset, s3, dirname):
+    """Reader of an S3 object from a byte (see ``_download``)."""
+    # Reads after a seek are range GETs from the offset
+    with s3.open(dirname, "rb") as f:
+        f.seek(offset)
+        yield f, getattr(f, "size", None)
+
+
+def _open_cached(cache, id_, verify=False):
+    """Open file of a cached download, or ENOVAL if it's not cached.
+
+    If ``verify`` is True, the file is hashed and, if it doesn't match the
+    hash of the download, it's removed from the cache.
+    """
+    result = cache.get(id_, default=ENOVAL, read=True, retry=True)
+    if result is ENOVAL or not verify:
+        return result
+
+    digest = cache.get((id_, "sha256"), retry=True)
+    if isinstance(result, bytes):
+        actual = hashlib.sha256(result).hexdigest()
+    else:
+        actual = hashlib.sha256()
+        for chunk in iter(lambda: result.read(BLOCK_SIZE), b""):
+            actual.update(chunk)
+        actual = actual.hexdigest()
+        result.seek(0)
+    if digest is not None and actual != digest:
+        if not isinstance(result, bytes):
+            result.close()
+        cache.delete(id_, retry=True)
+        return ENOVAL
+    return result
+
+
+@contextlib.contextmanager
+def _local_file(result, filename):
+    """Path named ``filename`` to the contents of a cached download.
+
+    Cached files are linked, not copied, since readers get the product,
+    channel and date from the name of the files.
+    """
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        fname = os.path.join(tmpdirname, filename)
+        if isinstance(result, bytes):  # small values stored in the database
+            with open(fname, "wb") as fp:
+                fp.write(result)
+        else:
+            with result:
+                try:
+                    os.symlink(os.path.abspath(result.name), fname)
+                except (OSError, AttributeError):
+                    with open(fname, "wb") as fp:
+                        shutil.copyfileobj(result, fp, BLOCK_SIZE)
+        yield fname
+
 
 def fetch_cloudsat(
     dirname,
@@ -28,6 +255,8 @@ def fetch_cloudsat(
     host="ftp.cloudsat.cira.colostate.edu",
     tag="stratopy-cloudsat",
     path=DEFAULT_CACHE_PATH,
+    verify=False,
+    retry=RETRY,
 ):
     """Get cloudsat files.
 
@@ -48,6 +277,12 @@ def fetch_cloudsat(
         Tag to be added to the cached file.
     path : `str`, optional
         Path where to save the cached file.
+    verify : bool, optional
+        If True, the hash of the cached file is checked, and it's
+        downloaded again if it doesn't match.
+    retry : `IO.Retry`, optional
+        Retries of the download, which resume from the bytes already
+        downloaded.
 
     Returns
     -------
@@ -61,26 +296,17 @@ def fetch_cloudsat(
 
     # Search in local cache
     cache.expire()
-    result = cache.get(id_, default=ENOVAL, retry=True)
+    result = _open_cached(cache, id_, verify=verify)
 
     if result is ENOVAL:
-
-        ftp = FTP()
-        ftp.connect(host=host)
-        ftp.login(user, passwd)
-
-        buffer_file = io.BytesIO()
-        ftp.retrbinary(f"RETR {dirname}", buffer_file.write)
-        result = buffer_file.getvalue()
-
-        cache.set(id_, result, tag=tag)
-
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        fname = os.path.join(tmpdirname, id_)
-
-        with open(fname, "wb") as fp:
-            fp.write(result)
-
+        open_at = functools.partial(
+            _ftp_open_at, host=host, user=user, passwd=passwd, dirname=dirname
+        )
+        result = _download(cache, id_, tag, open_at, retry)
+        if result is ENOVAL:
+            raise IOError(f"{dirname} could not be stored in {path}")
+
+    with _local_file(result, id_) as fname:
         df = read_hdf(fname)
 
     return df
@@ -90,6 +316,9 @@ def fetch_goes(
     dirname,
     tag="stratopy-goes",
     path=DEFAULT_CACHE_PATH,
+    verify=False,
+    retry=RETRY,
+    **kwargs,
 ):
     """Get GOES files.
 
@@ -104,6 +333,15 @@ def fetch_goes(
         Tag to append to name of cached file.
     path : `str`
         Location where to save the cached file.
+    verify : bool, optional
+        If True, the hash of the cached file is checked, and it's
+        downloaded again if it doesn't match.
+    retry : `IO.Retry`, optional
+        Retries of the download, which resume from the bytes already
+        downloaded.
+    kwargs :
+        Keyword arguments for ``goes.read_nc``, e.g. ``packed`` or
+        ``cache``.
 
     Returns
     -------
@@ -120,32 +358,64 @@ def fetch_goes(
 
     # Search in local cache
     cache.expire()
-    result = cache.get(id_, default=ENOVAL, retry=True)
+    result = _open_cached(cache, id_, verify=verify)
 
     if result is ENOVAL:
+        import s3fs  # slow to import, only needed on cache misses
+
         # Starts connection with AWS S3 bucket
         s3 = s3fs.S3FileSystem(anon=True)
 
-        # Open in-memory binary and write it
-        buffer_file = io.BytesIO()
-        with s3.open(dirname, "rb") as f:
-            buffer_file.write(f.read())
-        result = buffer_file.getvalue()
+        open_at = functools.partial(_s3_open_at, s3=s3, dirname=dirname)
+        result = _download(cache, id_, tag, open_at, retry)
+        if result is ENOVAL:
+            raise IOError(f"{dirname} could not be stored in {path}")
 
-        cache.set(id_, result, tag=tag)
+    with _local_file(result, filename) as fname:
+        goes_obj = read_nc((fname,), **kwargs)
 
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        fname = os.path.join(tmpdirname, filename)
+    return goes_obj
 
-        with open(fname, "wb") as fp:
-            fp.write(result)
 
-        goes_obj = read_nc((fname,))
+def goes_scan_start(filename):
+    """Start of the scan of an ABI file, from its name.
+
+    The name has the field "s<year><day of year><hour><minute><second>
+    <tenth of second>", e.g. "s20190040600363".
+    """
+    return parse_goes(filename).start
 
-    return goes_obj
 
+def list_goes(
+    start, end, product="ABI-L2-MCMIPF", bucket=GOES_BUCKET, catalog=None
+):
+    """List the GOES files of the scans started in a time range.
+
+    Parameters
+    ----------
+    start, end : `datetime.datetime`
+        Time range (UTC), both included.
+    product : `str`, optional
+        Name of the product in the bucket.
+    bucket : `str`, optional
+        S3 bucket of the satellite.
+    catalog : `catalog.Catalog`, optional
+        Catalog whose cached listings are used. The default one if None.
 
-def fetch(cloudsat_id, goes_id, cloudsat_kw=None, goes_kw=None):
+    Returns
+    -------
+    keys : `list`
+        S3 keys of the files, sorted by time, which can be given to
+        ``fetch_goes``.
+    """
+    catalog = Catalog() if catalog is None else catalog
+    records = catalog.list_goes(start, end, product, bucket)
+    return [record.path for record in records]
+
+
+def fetch(
+    cloudsat_id, goes_id, cloudsat_kw=None, goes_kw=None, prefilter=None
+):
     """Run both fetches for CloudSat and GOES data and merges them.
 
     Parameters
@@ -158,12 +428,20 @@ def fetch(cloudsat_id, goes_id, cloudsat_kw=None, goes_kw=None):
         Label to append to Cloudsat cached file, by default None
     goes_kw : str, optional
         Label to append to Cloudsat cached file, by default None
+    prefilter : `overpass.Prefilter`, optional
+        If given, nothing is fetched when the granule doesn't cross its
+        region during the scene, and the track of the fetched granule is
+        remembered.
 
     Returns
     -------
     merger.StratoFrame
-        Resulting merged DataFrame from both inputs.
+        Resulting merged DataFrame from both inputs, or None if the
+        prefilter discarded the pair.
     """
+    if prefilter is not None and not prefilter.check(cloudsat_id, goes_id):
+        return None
+
     # Anon connection.
     goes_kw = {} if goes_kw is None else goes_kw
     goes_data = fetch_goes(goes_id, **goes_kw)
@@ -172,5 +450,7 @@ def fetch(cloudsat_id, goes_id, cloudsat_kw=None, goes_kw=None):
     # must have user and password to connect with server
     cloudsat_kw = {} if cloudsat_kw is None else cloudsat_kw
     cloudsat_data = fetch_cloudsat(cloudsat_id, **cloudsat_kw)
+    if prefilter is not None:
+        prefilter.remember(cloudsat_id, cloudsat_data)
 
     return core.merge(cloudsat_data, goes_data)
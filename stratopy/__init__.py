@@ -10,12 +10,20 @@ r"""StratoPy Project.
 A Python package designed to easily manipulate CloudSat and GOES-R
 and generate labeled images containing cloud types.
 
-It consists in five modules:
+It consists of the following modules:
 
+- stratopy.catalog module
+- stratopy.cli module
 - stratopy.cloudsat module
 - stratopy.core module
 - stratopy.goes module
 - stratopy.io module
+- stratopy.ledger module
+- stratopy.overpass module
+- stratopy.parallel module
+- stratopy.products module
+- stratopy.tracing module
+- stratopy.writers module
 """
 
 __name__ = "stratopy"
@@ -26,7 +34,131 @@ __version__ = "0.0.1"
 # IMPORTS
 # =============================================================================
 
-from .cloudsat import *  # noqa
-from .core import *  # noqa
-from .goes import *  # noqa
-from .IO import *  # noqa
+import importlib
+
+# Modules are imported on first use of one of their names (PEP 562), so
+# ``import stratopy`` doesn't load geopandas, pyspectral, s3fs, etc. until
+# the functions that need them are used.
+
+#: Public names of every module, as {module: names}.
+_EXPORTS = {
+    "catalog": (
+        "CLOUDSAT_HOST",
+        "CLOUDSAT_PRODUCT",
+        "Catalog",
+        "DEFAULT_CATALOG_PATH",
+        "GOES_BUCKET",
+        "GRANULE_DURATION",
+        "Record",
+        "nearest",
+        "parse",
+        "parse_cloudsat",
+        "parse_goes",
+    ),
+    "cli": (
+        "STATUSES",
+        "Task",
+        "TaskResult",
+        "main",
+        "read_manifest",
+        "run_batch",
+        "run_task",
+        "summarize",
+    ),
+    "cloudsat": ("CloudSatFrame", "attach_vdata", "read_hdf"),
+    "core": (
+        "BAND_RANGES",
+        "GeosProjection",
+        "PADDING_MODES",
+        "colfil2scan",
+        "extract_patches",
+        "gen_vect",
+        "get_precision",
+        "latlon2scan",
+        "merge",
+        "precision",
+        "resolve_dtype",
+        "sat2latlon",
+        "scan2colfil",
+        "scan2sat",
+        "set_precision",
+        "valid_minmax",
+    ),
+    "goes": (
+        "DAY_MICROPHYSICS",
+        "DETACHED_VARIABLES",
+        "DetachedVariable",
+        "Goes",
+        "MAX_ZENITH",
+        "PATH",
+        "REGIONS",
+        "as_precision",
+        "is_night",
+        "mask",
+        "normalize_rgb",
+        "precompute_windows",
+        "read_nc",
+        "register_region",
+        "rgb2hsi",
+        "solar7",
+        "sun_zenith",
+        "trim_window",
+    ),
+    "IO": (
+        "DEFAULT_CACHE_PATH",
+        "RETRY",
+        "Retry",
+        "fetch",
+        "fetch_cloudsat",
+        "fetch_goes",
+        "goes_scan_start",
+        "list_goes",
+    ),
+    "ledger": ("Ledger", "PENDING"),
+    "overpass": ("DEFAULT_TRACKS_PATH", "PLATFORM", "Prefilter", "Track"),
+    "parallel": ("SharedArray", "Tile", "iter_tiles", "map_tiles"),
+    "products": ("ALGORITHM_VERSION", "DEFAULT_PRODUCTS_PATH", "ProductCache"),
+    "tracing": (
+        "JSONLinesSink",
+        "LoggingSink",
+        "Span",
+        "add_bytes",
+        "add_sink",
+        "is_enabled",
+        "remove_sink",
+        "span",
+        "trace",
+        "traced",
+    ),
+    "writers": (
+        "TENSOR_COLUMN",
+        "TIME_UNITS",
+        "read_parquet",
+        "to_parquet",
+        "write_images",
+    ),
+}
+
+#: Module of every public name.
+_MODULES = {
+    name: module for module, names in _EXPORTS.items() for name in names
+}
+
+__all__ = list(_EXPORTS) + list(_MODULES)
+
+
+def __getattr__(name):
+    """Import the module of a public name on first use (PEP 562)."""
+    if name in _EXPORTS:
+        return importlib.import_module(f".{name}", __name__)
+    if name in _MODULES:
+        module = importlib.import_module(f".{_MODULES[name]}", __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    """dir(stratopy), including the names not imported yet."""
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,7 @@
+r"""Run the ``stratopy`` command with ``python -m stratopy``."""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,389 @@
+r"""Module containing the catalog of the available GOES and CloudSat files."""
+
+import datetime
+import ftplib
+import os
+import pathlib
+import re
+
+import attr
+
+from diskcache import Cache
+from diskcache.core import ENOVAL
+
+#: S3 bucket of the GOES-16 files.
+GOES_BUCKET = "noaa-goes16"
+
+#: FTP server and directory of the CloudSat granules.
+CLOUDSAT_HOST = "ftp.cloudsat.cira.colostate.edu"
+CLOUDSAT_PRODUCT = "2B-CLDCLASS.P1_R05"
+
+#: Time covered by a CloudSat granule, which is an orbit (~99 minutes).
+GRANULE_DURATION = datetime.timedelta(minutes=99)
+
+#: Default directory of the cache of listings, next to the cache of ``IO``.
+DEFAULT_CATALOG_PATH = pathlib.Path(
+    os.path.expanduser(os.path.join("~", "stratopy_cache", "catalog"))
+)
+
+# e.g. OR_ABI-L2-CMIPF-M3C03_G16_s20190021800363_e20190021811129_c2019...
+_GOES_NAME = re.compile(
+    r"OR_(?P<product>ABI-L[^-_]+-[^-_]+)-(?P<mode>M\d)(?P<channel>C\d\d)?"
+    r"_(?P<satellite>G\d\d)_s(?P<start>\d{14})_e(?P<end>\d{14})?"
+)
+
+# e.g. 2019002175851_67551_CS_2B-CLDCLASS_GRANULE_P1_R05_E08_F03.hdf
+_CLOUDSAT_NAME = re.compile(
+    r"(?P<start>\d{13})_(?P<granule>\d+)_CS_(?P<product>[^_]+)_GRANULE_"
+)
+
+
+@attr.s(frozen=True)
+class Record:
+    """File of the catalog, with the fields of its name.
+
+    Attributes
+    ----------
+    path: ``str``
+        Path (or S3 key, or FTP path) of the file.
+    satellite: ``str``
+        "G16", "G17", etc. for GOES, "CloudSat" for CloudSat.
+    product: ``str``
+        e.g. "ABI-L2-CMIPF" or "2B-CLDCLASS".
+    start: ``datetime.datetime``
+        Start of the scan or granule (UTC).
+    end: ``datetime.datetime``, optional
+        End of the scan or granule (UTC), if it's known.
+    channel: ``str``, optional
+        Channel of single band GOES files, e.g. "C03".
+    mode: ``str``, optional
+        Scan mode of GOES files, e.g. "M3".
+    granule: int, optional
+        Number of the CloudSat granule (orbit).
+    """
+
+    path = attr.ib(converter=os.fspath)
+    satellite = attr.ib()
+    product = attr.ib()
+    start = attr.ib()
+    end = attr.ib(default=None)
+    channel = attr.ib(default=None)
+    mode = attr.ib(default=None)
+    granule = attr.ib(default=None)
+
+    @property
+    def name(self):
+        """Name of the file."""
+        return os.path.basename(self.path)
+
+    def overlaps(self, start, end):
+        """Whether the file covers part of a time range."""
+        return self.start <= end and (self.end or self.start) >= start
+
+
+def _goes_time(field):
+    """Time of "<year><day of year><hour><minute><second><tenth>"."""
+    return datetime.datetime.strptime(field[:13], "%Y%j%H%M%S").replace(
+        microsecond=int(field[13]) * 100000
+    )
+
+
+def parse_goes(path):
+    """Record of a GOES ABI file, from its name.
+
+    Raises
+    ------
+    ValueError
+        If it isn't the name of an ABI file.
+    """
+    match = _GOES_NAME.match(os.path.basename(os.fspath(path)))
+    if match is None:
+        raise ValueError(f"Not the name of a GOES ABI file: {path}")
+    end = match["end"]
+    return Record(
+        path,
+        satellite=match["satellite"],
+        product=match["product"],
+        start=_goes_time(match["start"]),
+        end=None if end is None else _goes_time(end),
+        channel=match["channel"],
+        mode=match["mode"],
+    )
+
+
+def parse_cloudsat(path):
+    """Record of a CloudSat granule, from its name.
+
+    The end is estimated as the start plus ``GRANULE_DURATION``.
+
+    Raises
+    ------
+    ValueError
+        If it isn't the name of a CloudSat granule.
+    """
+    match = _CLOUDSAT_NAME.match(os.path.basename(os.fspath(path)))
+    if match is None:
+        raise ValueError(f"Not the name of a CloudSat granule: {path}")
+    start = datetime.datetime.strptime(match["start"], "%Y%j%H%M%S")
+    return Record(
+        path,
+        satellite="CloudSat",
+        product=match["product"],
+        start=start,
+        end=start + GRANULE_DURATION,
+        granule=int(match["granule"]),
+    )
+
+
+def parse(path):
+    """Record of a GOES ABI file or a CloudSat granule, from its name.
+
+    Raises
+    ------
+    ValueError
+        If it isn't the name of a known file.
+    """
+    for parser in (parse_goes, parse_cloudsat):
+        try:
+            return parser(path)
+        except ValueError:
+            pass
+    raise ValueError(f"Unknown file name: {path}")
+
+
+def _parse_all(paths, parser):
+    """Parse the paths with known names, sorted by start."""
+    records = []
+    for path in paths:
+        try:
+            records.append(parser(path))
+        except ValueError:  # other files of the directory
+            continue
+    return sorted(records, key=lambda record: record.start)
+
+
+def nearest(records, time, tolerance=None):
+    """Record starting closest to a time.
+
+    Parameters
+    ----------
+    records: iterable of ``Record``
+    time: ``datetime.datetime``
+    tolerance: ``datetime.timedelta``, optional
+        Records starting farther from ``time`` are ignored.
+
+    Returns
+    -------
+    ``Record`` or None
+        None if there are no records (within the tolerance).
+    """
+    best = min(records, key=lambda rec: abs(rec.start - time), default=None)
+    if best is None or tolerance is None:
+        return best
+    return best if abs(best.start - time) <= tolerance else None
+
+
+def _utcnow():
+    """Naive current time in UTC, like the times of the file names."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return now.replace(tzinfo=None)
+
+
+@attr.s(frozen=True)
+class Catalog:
+    """Cached listings of the GOES and CloudSat files of time ranges.
+
+    Remote directories (an hour of a GOES product, a day of CloudSat
+    granules) are listed once, and their listing is kept in a local
+    cache: for ``ttl`` seconds if the directory may still get new files,
+    and for ``archive_ttl`` seconds (forever if None) once it's older
+    than ``archive_after``. Queries are answered from the listings.
+
+    Attributes
+    ----------
+    path: ``str`` or path
+        Directory of the cache of listings.
+    ttl: float
+        Seconds the listings of recent directories are kept.
+    archive_ttl: float, optional
+        Seconds the listings of archived directories are kept.
+    archive_after: ``datetime.timedelta``
+        Age (since the end of their time) of archived directories.
+    """
+
+    path = attr.ib(default=DEFAULT_CATALOG_PATH, converter=os.fspath)
+    ttl = attr.ib(default=600.0)
+    archive_ttl = attr.ib(default=None)
+    archive_after = attr.ib(default=datetime.timedelta(days=1))
+    _cache = attr.ib(init=False, repr=False)
+
+    @_cache.default
+    def _cache_default(self):
+        return Cache(self.path)
+
+    def _listing(self, key, end, lister):
+        """Names of a directory whose time ends at ``end``, listed once."""
+        names = self._cache.get(key, default=ENOVAL, retry=True)
+        if names is ENOVAL:
+            names = list(lister())
+            archived = end + self.archive_after < _utcnow()
+            expire = self.archive_ttl if archived else self.ttl
+            self._cache.set(key, names, expire=expire, retry=True)
+        return names
+
+    def list_goes(
+        self,
+        start,
+        end,
+        product="ABI-L2-MCMIPF",
+        bucket=GOES_BUCKET,
+        channel=None,
+    ):
+        """List the GOES files of the scans started in a time range.
+
+        Parameters
+        ----------
+        start, end : `datetime.datetime`
+            Time range (UTC), both included.
+        product : `str`, optional
+            Name of the product in the bucket.
+        bucket : `str`, optional
+            S3 bucket of the satellite.
+        channel : `str`, optional
+            Channel of single band products, e.g. "C03". All if None.
+
+        Returns
+        -------
+        records : `list` of `Record`
+            Files sorted by start, whose paths are S3 keys that can be
+            given to ``IO.fetch_goes``.
+        """
+        s3 = None
+
+        def ls(prefix):
+            nonlocal s3
+            if s3 is None:
+                import s3fs  # slow to import, only needed to list
+
+                s3 = s3fs.S3FileSystem(anon=True)
+            try:
+                return s3.ls(prefix)
+            except FileNotFoundError:
+                return []
+
+        paths = []
+        hour = start.replace(minute=0, second=0, microsecond=0)
+        while hour <= end:
+            # Files are stored by <year>/<day of year>/<hour>
+            prefix = f"{bucket}/{product}/{hour:%Y/%j/%H}"
+            paths.extend(
+                self._listing(
+                    ("goes", prefix),
+                    hour + datetime.timedelta(hours=1),
+                    lambda: ls(prefix),
+                )
+            )
+            hour += datetime.timedelta(hours=1)
+
+        return [
+            record
+            for record in _parse_all(paths, parse_goes)
+            if start <= record.start <= end
+            and (channel is None or record.channel == channel)
+        ]
+
+    def list_cloudsat(
+        self,
+        start,
+        end,
+        user,
+        passwd,
+        product=CLOUDSAT_PRODUCT,
+        host=CLOUDSAT_HOST,
+    ):
+        """List the CloudSat granules that cover part of a time range.
+
+        Parameters
+        ----------
+        start, end : `datetime.datetime`
+            Time range (UTC), both included.
+        user : `str`
+            Username for cloudsat ftp connection.
+        passwd : `str`
+            Password for cloudsat ftp connection.
+        product : `str`, optional
+            Directory of the product in the server, e.g.
+            "2B-CLDCLASS.P1_R05".
+        host : `str`, optional
+            Name of the server.
+
+        Returns
+        -------
+        records : `list` of `Record`
+            Granules sorted by start, whose paths can be given to
+            ``IO.fetch_cloudsat``.
+        """
+        ftp = None
+
+        def nlst(dirname):
+            nonlocal ftp
+            if ftp is None:
+                ftp = ftplib.FTP()
+                ftp.connect(host=host)
+                ftp.login(user, passwd)
+            try:
+                names = ftp.nlst(dirname)
+            except ftplib.error_perm:  # no such directory
+                return []
+            return [f"{dirname}/{os.path.basename(name)}" for name in names]
+
+        paths = []
+        day = (start - GRANULE_DURATION).date()
+        try:
+            while day <= end.date():
+                # Granules are stored by <year>/<day of year>
+                dirname = f"{product}/{day:%Y/%j}"
+                paths.extend(
+                    self._listing(
+                        ("cloudsat", host, dirname),
+                        datetime.datetime.combine(day, datetime.time())
+                        + datetime.timedelta(days=1),
+                        lambda: nlst(dirname),
+                    )
+                )
+                day += datetime.timedelta(days=1)
+        finally:
+            if ftp is not None:
+                ftp.close()
+
+        return [
+            record
+            for record in _parse_all(paths, parse_cloudsat)
+            if record.overlaps(start, end)
+        ]
+
+    def nearest_goes(
+        self, time, tolerance=datetime.timedelta(minutes=15), **kwargs
+    ):
+        """Find the GOES file of the scan started closest to a time.
+
+        Parameters
+        ----------
+        time : `datetime.datetime`
+            Time (UTC).
+        tolerance : `datetime.timedelta`, optional
+            Maximum difference with the start of the scan.
+        kwargs :
+            Keyword arguments for ``list_goes``, e.g. ``product``.
+
+        Returns
+        -------
+        `Record` or None
+            None if no scan started within the tolerance.
+        """
+        records = self.list_goes(time - tolerance, time + tolerance, **kwargs)
+        return nearest(records, time, tolerance)
+
+    def clear(self):
+        """Remove all the cached listings."""
+        self._cache.clear(retry=True)
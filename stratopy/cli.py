@@ -0,0 +1,542 @@
+r"""Module containing the ``stratopy`` batch command."""
+
+import argparse
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from multiprocessing import connection
+
+import attr
+
+#: Statuses of the tasks, see ``TaskResult``.
+STATUSES = ("done", "failed", "timeout")
+
+
+@attr.s(frozen=True)
+class Task:
+    """Scene to process, and optionally the granule merged with it.
+
+    Attributes
+    ----------
+    name: ``str``
+        Name of the outputs of the task.
+    goes: ``tuple``
+        Local paths or S3 keys (e.g. "noaa-goes16/ABI-L2-MCMIPF/...") of
+        the MCMIPF file, or of the CMIPF files of channels 3, 7 and 13.
+    cloudsat: ``str``, optional
+        Local path or FTP path of the 2B-CLDCLASS granule.
+    """
+
+    name = attr.ib()
+    goes = attr.ib(converter=tuple)
+    cloudsat = attr.ib(default=None)
+
+    @classmethod
+    def from_goes(cls, goes, cloudsat=None, name=None):
+        """Task named after its first GOES file."""
+        goes = tuple(goes.split(";")) if isinstance(goes, str) else goes
+        if not name:
+            name = os.path.splitext(os.path.basename(goes[0]))[0]
+        return cls(name, goes, cloudsat or None)
+
+
+@attr.s(frozen=True)
+class TaskResult:
+    """Outcome of a task.
+
+    Attributes
+    ----------
+    name: ``str``
+        Name of the task.
+    status: ``str``
+        One of ``STATUSES``.
+    seconds: float
+        Wall time of the task.
+    outputs: ``tuple``
+        Paths of the files written.
+    error: ``str``, optional
+        Traceback or reason of the failure.
+    """
+
+    name = attr.ib()
+    status = attr.ib(validator=attr.validators.in_(STATUSES))
+    seconds = attr.ib()
+    outputs = attr.ib(default=(), converter=tuple)
+    error = attr.ib(default=None)
+
+
+def read_manifest(path):
+    """Read the tasks of a CSV manifest.
+
+    The manifest has a "goes" column, with a local path or S3 key (or
+    three of them separated by ";"), and optional "cloudsat" and "name"
+    columns.
+
+    Returns
+    -------
+    ``list`` of ``cli.Task``
+    """
+    with open(path, newline="") as fp:
+        rows = list(csv.DictReader(fp))
+    if rows and "goes" not in rows[0]:
+        raise ValueError(f"{path} must have a 'goes' column")
+    return [
+        Task.from_goes(row["goes"], row.get("cloudsat"), row.get("name"))
+        for row in rows
+    ]
+
+
+def _load_goes(paths, cache, **kwargs):
+    from . import IO, goes
+
+    if all(os.path.exists(path) for path in paths):
+        return goes.read_nc(paths, **kwargs)
+    if len(paths) != 1:
+        raise ValueError("Only one GOES file (MCMIPF) can be fetched")
+    return IO.fetch_goes(paths[0], path=cache, **kwargs)
+
+
+def _load_cloudsat(path, cache, user, passwd):
+    from . import IO, cloudsat
+
+    if os.path.exists(path):
+        return cloudsat.read_hdf(path)
+    return IO.fetch_cloudsat(path, user, passwd, path=cache)
+
+
+def run_task(
+    task,
+    output,
+    cache=None,
+    user=None,
+    passwd=None,
+    products=None,
+    region=None,
+    tle_file=None,
+    skip_night=False,
+):
+    """Process a task: fetch, RGB and mask, merge and write.
+
+    Writes "<name>.nc" with the RGB and mask of the scene (see
+    ``writers.write_images``) and, if the task has a CloudSat granule,
+    "<name>.parquet" with the merged frame (see ``writers.to_parquet``).
+
+    Parameters
+    ----------
+    task: ``cli.Task``
+        Task to process.
+    output: ``str``
+        Directory of the outputs.
+    cache: ``str``, optional
+        Cache directory of the fetched files. Default:
+        ``IO.DEFAULT_CACHE_PATH``.
+    user, passwd: ``str``, optional
+        Credentials of the CloudSat FTP server.
+    products: ``str``, optional
+        Directory of the cache of trimmed images and RGB (see
+        ``products.ProductCache``). By default, nothing is cached.
+    region: ``tuple`` or ``str``, optional
+        Region of the outputs, as the coordinates of ``goes.Goes`` (by
+        default, those of ``goes.Goes``). If given, tasks whose CloudSat
+        granule doesn't cross it during the scene (see
+        ``overpass.Prefilter``) are skipped before fetching anything, so
+        nothing is written for them.
+    tle_file: ``str``, optional
+        Two-line elements of CloudSat, to predict the tracks of the
+        granules, with ``region``.
+    skip_night: bool
+        If True, scenes where the region of the outputs is in the night
+        (see ``goes.is_night``) aren't processed, since their Day
+        Microphysics RGB would be empty. With ``region`` they aren't even
+        fetched; otherwise the region is only known once the scene is
+        loaded.
+
+    Returns
+    -------
+    ``list``
+        Paths of the files written.
+    """
+    from . import IO, core, goes, products as products_, writers
+
+    cache = IO.DEFAULT_CACHE_PATH if cache is None else cache
+    if skip_night and region is not None:
+        from .catalog import parse_goes
+
+        if goes.is_night(parse_goes(task.goes[0]).start, region):
+            return []
+
+    prefilter = None
+    if task.cloudsat is not None and region is not None:
+        from .overpass import Prefilter
+
+        tracks = os.path.join(cache, "tracks")
+        prefilter = Prefilter(region, tle_file=tle_file, path=tracks)
+        if not prefilter.check(task.cloudsat, task.goes[0]):
+            return []
+
+    kwargs = {}
+    if products is not None:
+        kwargs["cache"] = products_.ProductCache(products)
+    if region is not None:
+        kwargs["coordinates"] = region
+    goes_obj = _load_goes(task.goes, cache, **kwargs)
+    if skip_night and goes_obj.is_night():
+        return []
+
+    rgb = goes_obj.RGB
+    if rgb.ndim != 3 or rgb.shape[-1] != 3:
+        raise ValueError("The scene must have the channels 3, 7 and 13")
+
+    images_path = os.path.join(output, f"{task.name}.nc")
+    if os.path.exists(images_path):
+        os.remove(images_path)
+    writers.write_images(
+        images_path, goes_obj._img_date, RGB=rgb, mask=goes.mask(rgb)
+    )
+    outputs = [images_path]
+
+    if task.cloudsat is not None:
+        cloudsat_obj = _load_cloudsat(task.cloudsat, cache, user, passwd)
+        if prefilter is not None:
+            prefilter.remember(task.cloudsat, cloudsat_obj)
+        merged = core.merge(cloudsat_obj, goes_obj)
+        merged_path = os.path.join(output, f"{task.name}.parquet")
+        writers.to_parquet(merged, merged_path)
+        outputs.append(merged_path)
+
+    return outputs
+
+
+def _worker(conn, target, task, output, kwargs):
+    """Run a task in a child process and send back its outcome."""
+    try:
+        conn.send(("done", target(task, output, **kwargs)))
+    except BaseException:
+        conn.send(("failed", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def _run_inline(target, task, output, kwargs):
+    start = time.perf_counter()
+    try:
+        outputs = target(task, output, **kwargs)
+    except Exception:
+        return TaskResult(
+            task.name,
+            "failed",
+            time.perf_counter() - start,
+            error=traceback.format_exc(),
+        )
+    return TaskResult(task.name, "done", time.perf_counter() - start, outputs)
+
+
+def run_batch(
+    tasks,
+    output,
+    workers=None,
+    timeout=None,
+    callback=None,
+    target=run_task,
+    **kwargs,
+):
+    """Run tasks in a pool of processes.
+
+    Every task runs in its own process, so a task that hangs or crashes
+    the interpreter doesn't take down the batch: it's terminated when it
+    exceeds the timeout, and reported as failed or timed out.
+
+    Parameters
+    ----------
+    tasks: iterable of ``cli.Task``
+        Tasks to run.
+    output: ``str``
+        Directory of the outputs, created if needed.
+    workers: int, optional
+        Number of tasks running at once. Default: the number of CPUs. 0
+        runs the tasks one by one in the current process, without
+        timeouts.
+    timeout: float, optional
+        Maximum seconds of every task.
+    callback: callable, optional
+        Called with every ``cli.TaskResult`` as soon as it's available.
+    target: callable
+        Function processing a task, ``target(task, output, **kwargs)``,
+        that returns the paths written. It must be picklable.
+    kwargs:
+        Keyword arguments for ``target``.
+
+    Returns
+    -------
+    ``list`` of ``cli.TaskResult``
+        Results in the order of the tasks.
+    """
+    tasks = list(tasks)
+    os.makedirs(output, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    results = [None] * len(tasks)
+    if workers == 0:
+        for index, task in enumerate(tasks):
+            results[index] = _run_inline(target, task, output, kwargs)
+            if callback is not None:
+                callback(results[index])
+        return results
+
+    ctx = multiprocessing.get_context()
+    pending = list(enumerate(tasks))[::-1]
+    running = {}
+    while pending or running:
+        while pending and len(running) < workers:
+            index, task = pending.pop()
+            recv, send = ctx.Pipe(duplex=False)
+            process = ctx.Process(
+                target=_worker,
+                args=(send, target, task, output, kwargs),
+                daemon=True,
+            )
+            process.start()
+            send.close()
+            running[recv] = (index, task, process, time.perf_counter())
+
+        wait = None
+        if timeout is not None:
+            first = min(start for *_, start in running.values())
+            wait = max(first + timeout - time.perf_counter(), 0.0)
+        # The pipe is readable when the task sends its outcome, or when
+        # the process dies without sending it.
+        ready = connection.wait(list(running), timeout=wait)
+
+        for recv in list(running):
+            index, task, process, start = running[recv]
+            seconds = time.perf_counter() - start
+            if recv in ready:
+                try:
+                    status, payload = recv.recv()
+                except EOFError:
+                    process.join()
+                    status = "failed"
+                    payload = f"Process died (exit code {process.exitcode})"
+                process.join()
+                outputs = payload if status == "done" else ()
+                error = None if status == "done" else payload
+                result = TaskResult(task.name, status, seconds, outputs, error)
+            elif timeout is not None and seconds >= timeout:
+                process.terminate()
+                process.join()
+                result = TaskResult(
+                    task.name,
+                    "timeout",
+                    seconds,
+                    error=f"Timed out after {timeout} s",
+                )
+            else:
+                continue
+
+            del running[recv]
+            recv.close()
+            results[index] = result
+            if callback is not None:
+                callback(result)
+
+    return results
+
+
+def summarize(results):
+    """Summary report of the results of a batch, as text."""
+    lines = []
+    total = sum(result.seconds for result in results)
+    counts = ", ".join(
+        f"{sum(result.status == status for result in results)} {status}"
+        for status in STATUSES
+    )
+    lines.append(f"{len(results)} tasks: {counts}")
+    if results:
+        lines.append(
+            f"Task time: {total:.1f} s total, "
+            f"{total / len(results):.1f} s mean, "
+            f"{max(result.seconds for result in results):.1f} s max"
+        )
+    for result in results:
+        if result.status != "done":
+            error = (result.error or "").strip().splitlines()
+            reason = (error or [result.status])[-1]
+            lines.append(f"  {result.name}: {result.status} ({reason})")
+    return "\n".join(lines)
+
+
+def _region(value):
+    """Region name, or coordinates separated by commas."""
+    if "," not in value:
+        return value
+    return tuple(float(coord) for coord in value.split(","))
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog="stratopy",
+        description=(
+            "Fetch GOES scenes (and CloudSat granules), make the Day "
+            "Microphysics RGB and its mask, merge them and write the "
+            "results, in parallel."
+        ),
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--manifest",
+        help="CSV file with 'goes' and optional 'cloudsat' and 'name' columns",
+    )
+    source.add_argument(
+        "--start",
+        type=datetime.datetime.fromisoformat,
+        help="Start of the scenes to process (ISO format), with --end",
+    )
+    parser.add_argument(
+        "--end",
+        type=datetime.datetime.fromisoformat,
+        help="End of the scenes to process (ISO format)",
+    )
+    parser.add_argument(
+        "--product", default="ABI-L2-MCMIPF", help="GOES product, with --start"
+    )
+    parser.add_argument(
+        "--bucket", default="noaa-goes16", help="GOES bucket, with --start"
+    )
+    parser.add_argument(
+        "-o", "--output", default=".", help="Directory of the outputs"
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="Tasks running at once (default: CPUs, 0: no processes)",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=None, help="Seconds per task"
+    )
+    parser.add_argument("--cache", default=None, help="Cache directory")
+    parser.add_argument(
+        "--products",
+        default=None,
+        help="Cache directory of the trimmed images and RGB",
+    )
+    parser.add_argument(
+        "--user",
+        default=os.environ.get("STRATOPY_CLOUDSAT_USER"),
+        help="CloudSat FTP user (default: $STRATOPY_CLOUDSAT_USER)",
+    )
+    parser.add_argument(
+        "--password",
+        default=os.environ.get("STRATOPY_CLOUDSAT_PASSWORD"),
+        help="CloudSat FTP password (default: $STRATOPY_CLOUDSAT_PASSWORD)",
+    )
+    parser.add_argument(
+        "--region",
+        type=_region,
+        default=None,
+        help=(
+            "Region name or 'lat_inf,lat_sup,lon_east,lon_west' of the "
+            "outputs: skip CloudSat granules that don't cross it during "
+            "the scene"
+        ),
+    )
+    parser.add_argument(
+        "--tle", help="CloudSat TLE file to predict tracks, with --region"
+    )
+    parser.add_argument(
+        "--skip-night",
+        action="store_true",
+        help="Skip the scenes where the region is in the night",
+    )
+    parser.add_argument("--report", help="JSON file of the task results")
+    parser.add_argument(
+        "--ledger",
+        help="SQLite file of the state of the tasks, to resume the batch",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=None,
+        help="Runs of a task before giving up on it, with --ledger",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Run again completed tasks with missing outputs, with --ledger",
+    )
+    args = parser.parse_args(argv)
+    if args.start is not None and args.end is None:
+        parser.error("--start requires --end")
+    return args
+
+
+def main(argv=None):
+    """Entry point of the ``stratopy`` command.
+
+    Returns
+    -------
+    int
+        Exit status: 0 if every task is done, 1 otherwise.
+    """
+    args = _parse_args(argv)
+    if args.manifest is not None:
+        tasks = read_manifest(args.manifest)
+    else:
+        from . import IO
+
+        keys = IO.list_goes(args.start, args.end, args.product, args.bucket)
+        tasks = [Task.from_goes((key,)) for key in keys]
+
+    ledger = None
+    if args.ledger is not None:
+        from .ledger import Ledger
+
+        ledger = Ledger(args.ledger)
+        ledger.add(tasks)
+        total = len(tasks)
+        tasks = ledger.pending(args.max_attempts, verify=args.verify)
+        skipped = total - len(tasks)
+        print(f"{skipped} of {total} tasks skipped", file=sys.stderr)
+
+    def progress(result):
+        if ledger is not None:
+            ledger.record(result)
+        print(
+            f"{result.status:>7} {result.seconds:8.1f} s  {result.name}",
+            file=sys.stderr,
+        )
+
+    results = run_batch(
+        tasks,
+        args.output,
+        workers=args.workers,
+        timeout=args.timeout,
+        callback=progress,
+        cache=args.cache,
+        products=args.products,
+        user=args.user,
+        passwd=args.password,
+        region=args.region,
+        tle_file=args.tle,
+        skip_night=args.skip_night,
+    )
+    print(summarize(results))
+
+    if args.report is not None:
+        with open(args.report, "w") as fp:
+            report = [attr.asdict(result) for result in results]
+            json.dump(report, fp, indent=2)
+
+    failed = any(result.status != "done" for result in results)
+    if ledger is not None:
+        counts = ledger.counts()
+        ledger.close()
+        failed = sum(counts.values()) != counts["done"]
+    return int(failed)
@@ -5,8 +5,6 @@ import pathlib
 
 import attr
 
-import geopandas as gpd
-
 import numpy as np
 
 import pandas as pd
@@ -15,12 +13,15 @@ from pyhdf.HDF import HC, HDF
 from pyhdf.SD import SD
 from pyhdf.VS import VS
 
+from . import tracing
+
 # type: ignore
 DEFAULT_CACHE_PATH = pathlib.Path(
     os.path.expanduser(os.path.join("~", "stratopy_cache"))
 )
 
 
+@tracing.traced("cloudsat.read_hdf")
 def read_hdf(path, layer="CloudLayerType"):
     """Read CloudSat data files, with extension ".hdf".
 
@@ -57,6 +58,9 @@ def read_hdf(path, layer="CloudLayerType"):
         # Read sd data
         file_path = SD(path)
         cld_layertype = file_path.select(layer)[:]
+        tracing.add_bytes(
+            lat.nbytes + lon.nbytes + seconds.nbytes + cld_layertype.nbytes
+        )
         layers_df = {"read_time": hdf_time, "Longitude": lon, "Latitude": lat}
         for i, v in enumerate(np.transpose(cld_layertype)):
             layers_df[f"layer_{i}"] = v
@@ -222,6 +226,9 @@ class CloudSatFrame:
         cloudsat.CloudSatFrame
             Returns reprojected CloudSatFrame.
         """
+        # geopandas takes most of the import time of the module
+        import geopandas as gpd
+
         geo_df = gpd.GeoDataFrame(
             self._data.values,
             columns=self._data.columns,
@@ -1,15 +1,138 @@
 r"""Contains methods to perform transformation operations on loaded images."""
 
+import contextlib
+import os
+
+import attr
+
 import numpy as np
 
+from . import tracing
+
+#: Fixed physical range (min, max) of every ABI band in the CMI product.
+#: Reflective bands (C01-C06) are reflectance factors and emissive bands
+#: (C07-C16) are brightness temperatures, in K.
+BAND_RANGES = {
+    "C01": (0.0, 1.0),
+    "C02": (0.0, 1.0),
+    "C03": (0.0, 1.0),
+    "C04": (0.0, 1.0),
+    "C05": (0.0, 1.0),
+    "C06": (0.0, 1.0),
+    "C07": (197.31, 411.86),
+    "C08": (138.05, 311.06),
+    "C09": (137.7, 311.08),
+    "C10": (126.91, 331.2),
+    "C11": (127.69, 341.3),
+    "C12": (117.49, 311.06),
+    "C13": (89.62, 341.27),
+    "C14": (96.19, 341.28),
+    "C15": (97.38, 341.28),
+    "C16": (92.7, 318.26),
+}
+
+
+#: Default floating point type of the computations. It can be changed
+#: with ``set_precision`` or the STRATOPY_PRECISION environment variable
+#: (e.g. for worker processes).
+_PRECISION = {"dtype": np.dtype(os.environ.get("STRATOPY_PRECISION", "f8"))}
+
 
-def scan2sat(x, y, Re=6378137.0, Rp=6356752.31414, h=35786023.0):
+def get_precision():
+    """Return the default floating point type of the computations."""
+    return _PRECISION["dtype"]
+
+
+def set_precision(dtype):
+    """Set the default floating point type of the computations.
+
+    Navigation, trimming, RGB, HSI and merge functions compute and return
+    this type unless a ``dtype`` is given to them. numpy.float32 halves
+    the memory of every intermediate array, with a precision well above
+    that of the GOES data.
+
+    Parameters
+    ----------
+    dtype: ``numpy.dtype``
+        Floating point type, e.g. numpy.float32. Default: numpy.float64.
+
+    Returns
+    -------
+    ``numpy.dtype``
+        The previous precision.
+    """
+    dtype = np.dtype(dtype)
+    if not np.issubdtype(dtype, np.floating):
+        raise TypeError("precision must be a floating point type")
+    previous, _PRECISION["dtype"] = _PRECISION["dtype"], dtype
+    return previous
+
+
+@contextlib.contextmanager
+def precision(dtype):
+    """Context manager that sets the precision while it's active.
+
+    Parameters
+    ----------
+    dtype: ``numpy.dtype``
+        Floating point type, e.g. numpy.float32.
+    """
+    previous = set_precision(dtype)
+    try:
+        yield get_precision()
+    finally:
+        set_precision(previous)
+
+
+def resolve_dtype(dtype=None):
+    """Return ``dtype``, or the precision if it's None."""
+    return get_precision() if dtype is None else np.dtype(dtype)
+
+
+def _as_float(value, dtype):
+    """Convert input coordinates into a float array of the given dtype.
+
+    Masked values of ``numpy.ma.MaskedArray`` inputs are replaced by NaN,
+    which is how off-disk pixels are flagged by the navigation functions.
+    """
+    if np.ma.isMaskedArray(value):
+        value = value.astype(dtype).filled(np.nan)
+    return np.asarray(value, dtype=dtype)
+
+
+def _buffers(out, shape, dtype, n):
+    """Return ``n`` output arrays, allocating them if ``out`` is None."""
+    if out is None:
+        return tuple(np.empty(shape, dtype=dtype) for _ in range(n))
+    if len(out) != n or any(arr.shape != shape for arr in out):
+        raise ValueError(f"out must be a tuple of {n} arrays of shape {shape}")
+    return tuple(out)
+
+
+def _unwrap(arrays):
+    """Return scalars instead of 0-d arrays for scalar inputs."""
+    return tuple(arr[()] if arr.ndim == 0 else arr for arr in arrays)
+
+
+def scan2sat(
+    x,
+    y,
+    Re=6378137.0,
+    Rp=6356752.31414,
+    h=35786023.0,
+    dtype=None,
+    out=None,
+):
     """Convert scan to satellite coordinates.
 
     Transform x,y geostationary scan coordinates into
     cartesian coordinates with origin on the satellite. Based
     PUG3, version 5.2.8.1.
 
+    The whole computation is made in place over the output arrays and
+    two scratch arrays. Scan angles whose line of sight doesn't reach
+    the Earth (off-disk pixels) are returned as NaN.
+
     Parameters
     ----------
     x : float, float arr numpy.ma.core.MaskedArray
@@ -23,6 +146,11 @@ def scan2sat(x, y, Re=6378137.0, Rp=6356752.31414, h=35786023.0):
         Polar radius, in m.
     h: float
         Satellite's height, in m.
+    dtype: numpy.dtype
+        Floating point type of the computation, e.g. numpy.float32.
+        Default: the precision, see ``set_precision``.
+    out: tuple of three arrays, optional
+        Arrays where (sx, sy, sz) are written.
 
     Returns
     -------
@@ -33,40 +161,65 @@ def scan2sat(x, y, Re=6378137.0, Rp=6356752.31414, h=35786023.0):
     sz : float, float arr
         Vertical coordinate.
     """
-    if (
-        str(type(x))[8:-2] != "numpy.ma.core.MaskedArray"
-        or str(type(y))[8:-2] != "numpy.ma.core.MaskedArray"
-    ):
-        x = np.ma.MaskedArray(x)
-        y = np.ma.MaskedArray(y)
-    mask = x.mask
+    dtype = resolve_dtype(dtype)
+    x = _as_float(x, dtype)
+    y = _as_float(y, dtype)
+    shape = np.broadcast_shapes(x.shape, y.shape)
+    sx, sy, sz = _buffers(out, shape, dtype, 3)
 
     H = Re + h  # satellite orbital radius
-    a = np.sin(x) ** 2 + np.cos(x) ** 2 * (
-        np.cos(y) ** 2 + (np.sin(y) * Re / Rp) ** 2
-    )
-    b = -2 * H * np.cos(x) * np.cos(y)
     c = H ** 2 - Re ** 2
 
-    aux = b ** 2 - 4 * a * c
+    a, b, aux = _buffers(None, shape, dtype, 3)
+
+    with np.errstate(invalid="ignore"):
+        cos_x = np.broadcast_to(np.cos(x), shape)
+
+        # sx <- cos(x)cos(y), sz <- cos(x)sin(y), sy <- sin(x)
+        np.multiply(np.cos(y), cos_x, out=sx)
+        np.multiply(np.sin(y), cos_x, out=sz)
+        np.copyto(sy, np.sin(x))
 
-    rs = np.zeros(aux.shape)
+        # a = sin(x)^2 + cos(x)^2 (cos(y)^2 + (sin(y) Re / Rp)^2),
+        # built in two steps as the partial sum is needed below.
+        np.square(sz, out=a)
+        a *= (Re / Rp) ** 2
+        np.square(sy, out=aux)
+        a += aux
 
-    sx = np.ma.MaskedArray(np.zeros(aux.shape), mask)
-    sy = np.ma.MaskedArray(np.zeros(aux.shape), mask)
-    sz = np.ma.MaskedArray(np.zeros(aux.shape), mask)
+        # Discriminant over four, written with H^2 - c = Re^2 to avoid
+        # cancellation: (Re cos(x)cos(y))^2 - c (a - (cos(x)cos(y))^2).
+        # It's negative for off-disk pixels, where the sqrt gives NaN.
+        np.multiply(a, c, out=b)
+        np.square(sx, out=aux)
+        a += aux
+        aux *= Re ** 2
+        aux -= b
+        np.sqrt(aux, out=aux)
 
-    rs[aux >= 0] = -(b[aux >= 0] + np.sqrt(aux[aux >= 0])) / (2 * a[aux >= 0])
+        # Distance from satellite: rs = (H cos(x)cos(y) - sqrt(aux)) / a
+        rs = np.multiply(sx, H, out=b)
+        rs -= aux
+        rs /= a
 
-    sx[aux >= 0] = rs[aux >= 0] * np.cos(x[aux >= 0]) * np.cos(y[aux >= 0])
-    sy[aux >= 0] = -rs[aux >= 0] * np.sin(x[aux >= 0])
-    sz[aux >= 0] = rs[aux >= 0] * np.cos(x[aux >= 0]) * np.sin(y[aux >= 0])
+        sx *= rs
+        sy *= rs
+        np.negative(sy, out=sy)
+        sz *= rs
 
-    return sx, sy, sz
+    return _unwrap((sx, sy, sz))
 
 
 def sat2latlon(
-    sx, sy, sz, lon0=-75.0, Re=6378137.0, Rp=6356752.31414, h=35786023.0
+    sx,
+    sy,
+    sz,
+    lon0=-75.0,
+    Re=6378137.0,
+    Rp=6356752.31414,
+    h=35786023.0,
+    dtype=None,
+    out=None,
 ):
     """Convert satellite to geographic coordinates.
 
@@ -75,6 +228,8 @@ def sat2latlon(
     latitude/longitude coordinates.
     Based on PUG3 5.1.2.8.1
 
+    NaN coordinates (off-disk pixels) remain NaN.
+
     Parameters
     ----------
     sx : float, float arr
@@ -91,6 +246,11 @@ def sat2latlon(
         Polar radius, in m.
     h: float
         Satellite's height, in m.
+    dtype: numpy.dtype
+        Floating point type of the computation, e.g. numpy.float32.
+        Default: the precision, see ``set_precision``.
+    out: tuple of two arrays, optional
+        Arrays where (lat, lon) are written.
 
     Returns
     -------
@@ -100,19 +260,47 @@ def sat2latlon(
         Longitude coordinates.
 
     """
+    dtype = resolve_dtype(dtype)
+    sx = _as_float(sx, dtype)
+    sy = _as_float(sy, dtype)
+    sz = _as_float(sz, dtype)
+    shape = np.broadcast_shapes(sx.shape, sy.shape, sz.shape)
+    lat, lon = _buffers(out, shape, dtype, 2)
+
     H = Re + h
-    gr2rad = np.pi / 180
+    rad2gr = 180 / np.pi
 
-    lat = (
-        np.arctan((Re / Rp) ** 2 * sz / np.sqrt((H - sx) ** 2 + sy ** 2))
-        / gr2rad
-    )
-    lon = lon0 - np.arctan(sy / (H - sx)) / gr2rad
-    return lat, lon
+    (aux,) = _buffers(None, shape, dtype, 1)
+    np.subtract(H, sx, out=aux)
+
+    # lon = lon0 - arctan(sy / (H - sx))
+    np.divide(sy, aux, out=lon)
+    np.arctan(lon, out=lon)
+    lon *= -rad2gr
+    lon += lon0
+
+    # lat = arctan((Re / Rp)^2 sz / sqrt((H - sx)^2 + sy^2))
+    np.square(aux, out=aux)
+    np.square(np.broadcast_to(sy, shape), out=lat)
+    aux += lat
+    np.sqrt(aux, out=aux)
+    np.divide(sz, aux, out=lat)
+    lat *= (Re / Rp) ** 2
+    np.arctan(lat, out=lat)
+    lat *= rad2gr
+
+    return _unwrap((lat, lon))
 
 
 def latlon2scan(
-    lat, lon, lon0=-75.0, Re=6378137.0, Rp=6356752.31414, h=35786023.0
+    lat,
+    lon,
+    lon0=-75.0,
+    Re=6378137.0,
+    Rp=6356752.31414,
+    h=35786023.0,
+    dtype=None,
+    out=None,
 ):
     """Convert geographical to scan coordinates.
 
@@ -120,6 +308,8 @@ def latlon2scan(
     into x/y geoestationary projection.
     Based on PUG3 5.1.2.8.2
 
+    Points that are not visible from the satellite are returned as NaN.
+
     Parameters
     ----------
     lat: float, float arr
@@ -134,6 +324,11 @@ def latlon2scan(
         Polar radius, in m.
     h: float
         Satellite's height, in m.
+    dtype: numpy.dtype
+        Floating point type of the computation, e.g. numpy.float32.
+        Default: the precision, see ``set_precision``.
+    out: tuple of two arrays, optional
+        Arrays where (x, y) are written.
 
     Returns
     -------
@@ -142,24 +337,73 @@ def latlon2scan(
     y : float, float arr
        Vertical coordinate, in radianes. Paralell to Earth's axis.
     """
+    dtype = resolve_dtype(dtype)
+    lat, lon = np.broadcast_arrays(
+        _as_float(lat, dtype), _as_float(lon, dtype)
+    )
+    x, y = _buffers(out, lat.shape, dtype, 2)
+    sx, sz, cos_latc = _buffers(None, lat.shape, dtype, 3)
+
     H = Re + h
-    e = (1 - (Rp / Re) ** 2) ** 0.5  # excentricity
+    e2 = 1 - (Rp / Re) ** 2  # squared excentricity
     gr2rad = np.pi / 180
 
-    latc = np.arctan((Rp / Re) ** 2 * np.tan(lat * gr2rad))
+    # Geocentric latitude: latc = arctan((Rp / Re)^2 tan(lat))
+    np.multiply(lat, gr2rad, out=sz)
+    np.tan(sz, out=sz)
+    sz *= (Rp / Re) ** 2
+    np.arctan(sz, out=sz)
+    np.cos(sz, out=cos_latc)
+    np.sin(sz, out=sz)
 
-    rc = Rp / (1 - (e * np.cos(latc)) ** 2) ** 0.5
+    # rc = Rp / sqrt(1 - (e cos(latc))^2), kept in y
+    np.square(cos_latc, out=y)
+    y *= -e2
+    y += 1
+    np.sqrt(y, out=y)
+    np.divide(Rp, y, out=y)
 
-    sx = H - rc * np.cos(latc) * np.cos((lon - lon0) * gr2rad)
-    sy = -rc * np.cos(latc) * np.sin((lon - lon0) * gr2rad)
-    sz = rc * np.sin(latc)
+    # sz = rc sin(latc), rc cos(latc)
+    sz *= y
+    cos_latc *= y
 
-    s_norm = np.sqrt(sx ** 2 + sy ** 2 + sz ** 2)
+    # -sy = rc cos(latc) sin(lon - lon0), sx = H - rc cos(latc) cos(lon - lon0)
+    np.subtract(lon, lon0, out=sx)
+    sx *= gr2rad
+    np.sin(sx, out=y)
+    y *= cos_latc
+    np.cos(sx, out=sx)
+    sx *= cos_latc
+    np.subtract(H, sx, out=sx)
 
-    x = np.arcsin(-sy / s_norm)
-    y = np.arctan(sz / sx)
+    # Points on the far side of the Earth: H (H - sx) < sy^2 + (Re/Rp sz)^2
+    norm = cos_latc
+    np.subtract(H, sx, out=x)
+    x *= H
+    np.square(y, out=norm)
+    x -= norm
+    np.square(sz, out=norm)
+    norm *= (Re / Rp) ** 2
+    x -= norm
+    hidden = x < 0
 
-    return x, y
+    # |s| = sqrt(sx^2 + sy^2 + sz^2)
+    np.square(sx, out=norm)
+    np.square(y, out=x)
+    norm += x
+    np.square(sz, out=x)
+    norm += x
+    np.sqrt(norm, out=norm)
+
+    np.divide(y, norm, out=x)
+    np.arcsin(x, out=x)
+    np.divide(sz, sx, out=y)
+    np.arctan(y, out=y)
+
+    x[hidden] = np.nan
+    y[hidden] = np.nan
+
+    return _unwrap((x, y))
 
 
 def colfil2scan(col, row, x0=-0.151844, y0=0.151844, scale=5.6e-05):
@@ -234,7 +478,364 @@ def scan2colfil(x_y, x0=-0.151844, y0=0.151844, scale=5.6e-05, tipo=1):
         raise TypeError("Type must be 0 (float) or 1 (int)")
 
 
-def gen_vect(col_row, band_dict):
+@attr.s(frozen=True)
+class GeosProjection:
+    """Geostationary projection of a GOES image.
+
+    Holds the projection and grid parameters of an ABI image along with
+    the constants derived from them, so they are computed only once, and
+    offers transforms between geographic coordinates, scan angles and
+    pixel indices (column, row) for whole arrays. Instances are immutable
+    and hashable, so they can be used as keys of caches.
+
+    Default values correspond to the 2 km GOES-16 full disk image.
+
+    Parameters
+    ----------
+    lon0 : float
+        Satellite's longitude, origin of plane coordinate system.
+    Re: float
+        Equatorial radius, in m.
+    Rp: float
+        Polar radius, in m.
+    h: float
+        Satellite's height, in m.
+    x0 : float
+        Position of the first x coordinate x[0] in radians.
+    y0 : float
+        Position of the first y coordinate y[0] in radians.
+    scale : float
+        Pixel size, in radians.
+    """
+
+    lon0 = attr.ib(default=-75.0, converter=float)
+    Re = attr.ib(default=6378137.0, converter=float)
+    Rp = attr.ib(default=6356752.31414, converter=float)
+    h = attr.ib(default=35786023.0, converter=float)
+    x0 = attr.ib(default=-0.151844, converter=float)
+    y0 = attr.ib(default=0.151844, converter=float)
+    scale = attr.ib(default=5.6e-05, converter=float)
+
+    # Derived constants
+    H = attr.ib(init=False, eq=False, repr=False)
+    e2 = attr.ib(init=False, eq=False, repr=False)
+    ratio2 = attr.ib(init=False, eq=False, repr=False)
+
+    @H.default
+    def _H_default(self):
+        # satellite orbital radius
+        return self.Re + self.h
+
+    @e2.default
+    def _e2_default(self):
+        # squared excentricity
+        return 1 - (self.Rp / self.Re) ** 2
+
+    @ratio2.default
+    def _ratio2_default(self):
+        return (self.Re / self.Rp) ** 2
+
+    @classmethod
+    def from_dataset(cls, dataset):
+        """Build the projection of a GOES channel.
+
+        Parameters
+        ----------
+        dataset : ``netCDF4.Dataset.variables dict``
+            Variables of a channel, containing at least
+            "goes_imager_projection", "x" and "y".
+
+        Returns
+        -------
+        ``core.GeosProjection``
+            Projection of the channel.
+        """
+        projection = dataset["goes_imager_projection"]
+        return cls(
+            lon0=projection.longitude_of_projection_origin,
+            Re=projection.semi_major_axis,
+            Rp=projection.semi_minor_axis,
+            h=projection.perspective_point_height,
+            x0=dataset["x"].add_offset,
+            y0=dataset["y"].add_offset,
+            scale=dataset["x"].scale_factor,
+        )
+
+    @property
+    def _ellipsoid(self):
+        return {"Re": self.Re, "Rp": self.Rp, "h": self.h}
+
+    def latlon2scan(self, lat, lon, dtype=None, out=None):
+        """Convert geographical coordinates into scan angles.
+
+        See ``core.latlon2scan``.
+        """
+        return latlon2scan(
+            lat, lon, self.lon0, dtype=dtype, out=out, **self._ellipsoid
+        )
+
+    def scan2latlon(self, x, y, dtype=None):
+        """Convert scan angles into geographical coordinates.
+
+        Off-disk scan angles are returned as NaN.
+        See ``core.scan2sat`` and ``core.sat2latlon``.
+        """
+        sx, sy, sz = scan2sat(x, y, dtype=dtype, **self._ellipsoid)
+        # lat is written once sx is no longer needed, so it can reuse it
+        return sat2latlon(
+            sx,
+            sy,
+            sz,
+            self.lon0,
+            dtype=dtype,
+            out=(np.asarray(sx), np.empty_like(sx)),
+            **self._ellipsoid,
+        )
+
+    def scan2colfil(self, x, y):
+        """Convert scan angles into (fractional) column and row indices."""
+        col = np.subtract(x, self.x0)
+        col /= self.scale
+        row = np.subtract(self.y0, y)
+        row /= self.scale
+        return col, row
+
+    def colfil2scan(self, col, row, dtype=None):
+        """Convert column and row indices into scan angles."""
+        dtype = resolve_dtype(dtype)
+        x = np.multiply(col, self.scale, dtype=dtype)
+        x += self.x0
+        y = np.multiply(row, -self.scale, dtype=dtype)
+        y += self.y0
+        return x, y
+
+    def latlon2colfil(self, lat, lon, dtype=None):
+        """Convert geographical coordinates into column and row indices.
+
+        Indices are fractional; points not visible from the satellite
+        are returned as NaN.
+        """
+        return self.scan2colfil(*self.latlon2scan(lat, lon, dtype=dtype))
+
+    def colfil2latlon(self, col, row, dtype=None):
+        """Convert column and row indices into geographical coordinates.
+
+        ``col`` and ``row`` are broadcasted against each other, so a grid
+        can be obtained from a row vector of columns and a column vector
+        of rows. Off-disk pixels are returned as NaN.
+        """
+        return self.scan2latlon(*self.colfil2scan(col, row, dtype), dtype)
+
+    def window(self, coordinates):
+        """Image window containing a geographical box.
+
+        Parameters
+        ----------
+        coordinates: ``tuple``
+            (lat_inf, lat_sup, lon_east, lon_west)
+
+        Returns
+        -------
+        ``tuple``
+            (r0, r1, c0, c1) rows and columns of the window.
+        """
+        lat_inf, lat_sup, lon_east, lon_west = coordinates
+        x, y = self.latlon2scan(
+            np.array([lat_sup, lat_inf]), np.array([lon_west, lon_east])
+        )
+        c0, r0 = scan2colfil((x[0], y[0]), self.x0, self.y0, self.scale)
+        c1, r1 = scan2colfil((x[1], y[1]), self.x0, self.y0, self.scale)
+        return r0, r1, c0, c1
+
+
+def valid_minmax(
+    variable, dqf=None, max_dqf=0, fill_value=None, chunk_rows=512
+):
+    """Compute minimum and maximum of the valid pixels of a band.
+
+    The band is read in blocks of rows, so minimum and maximum are
+    obtained in a single streaming pass without building filtered copies
+    of the whole image. Pixels equal to the ``_FillValue`` of the variable
+    are ignored and, if a data quality flag is given, so are the pixels
+    whose flag is larger than ``max_dqf``.
+
+    Parameters
+    ----------
+    variable : netCDF4.Variable, array-like
+        CMI variable of a channel, of shape (rows, cols).
+    dqf : netCDF4.Variable, array-like, optional
+        DQF variable of the same channel.
+    max_dqf : int
+        Largest data quality flag considered valid.
+        Default: 0 (only good quality pixels).
+    fill_value : float, optional
+        Value of the missing pixels. By default the ``_FillValue``
+        attribute of the variable.
+    chunk_rows : int
+        Number of rows read on every step.
+
+    Returns
+    -------
+    vmin, vmax : float
+        Minimum and maximum of the valid pixels.
+        Both are NaN if the band has no valid pixels.
+    """
+    if fill_value is None:
+        fill_value = getattr(variable, "_FillValue", None)
+    vmin, vmax = np.inf, -np.inf
+
+    for r0 in range(0, variable.shape[0], chunk_rows):
+        block = variable[r0 : r0 + chunk_rows]
+        invalid = np.ma.getmaskarray(block)
+        block = np.ma.getdata(block)
+        if fill_value is not None:
+            invalid = invalid | (block == fill_value)
+        if dqf is not None:
+            invalid |= np.ma.getdata(dqf[r0 : r0 + chunk_rows]) > max_dqf
+        if invalid.all():
+            continue
+        valid = block[~invalid] if invalid.any() else block
+        vmin = min(vmin, valid.min())
+        vmax = max(vmax, valid.max())
+
+    if vmin > vmax:
+        return np.nan, np.nan
+    return float(vmin), float(vmax)
+
+
+def _read_window(variable, window, dtype):
+    """Read a window of an image, with NaN outside of the image."""
+    r0, r1, c0, c1 = window
+    rows, cols = variable.shape[-2:]
+    img = np.full((r1 - r0, c1 - c0), np.nan, dtype=dtype)
+    R0, R1 = max(r0, 0), min(r1, rows)
+    C0, C1 = max(c0, 0), min(c1, cols)
+    if R0 < R1 and C0 < C1:
+        block = np.ma.getdata(variable[R0:R1, C0:C1])
+        tracing.add_bytes(block.nbytes)
+        img[R0 - r0 : R1 - r0, C0 - c0 : C1 - c0] = block
+    return img
+
+
+#: Edge policies of ``extract_patches``.
+PADDING_MODES = ("constant", "edge", "reflect", "valid")
+
+
+def _padded_index(idx, size, padding):
+    """Map indices outside of [0, size) according to the padding."""
+    if padding == "reflect" and size > 1:
+        # As numpy.pad "reflect": -1 -> 1, size -> size - 2
+        period = 2 * (size - 1)
+        idx = np.abs(idx) % period
+        return np.where(idx >= size, period - idx, idx)
+    return np.clip(idx, 0, size - 1)
+
+
+def extract_patches(
+    image,
+    centers=None,
+    size=3,
+    stride=1,
+    padding="constant",
+    fill_value=np.nan,
+    out=None,
+):
+    """Extract square patches of an image.
+
+    With ``centers``, the patches around the given pixels are gathered
+    into a single array, indexing the image directly (only indices are
+    computed for the borders, the image is not padded). Without them,
+    the image is tiled densely with patches every ``stride`` pixels as a
+    read-only strided view (``numpy.lib.stride_tricks``), so patches
+    aren't copied until they are used.
+
+    Parameters
+    ----------
+    image : numpy.array
+        Image of shape (rows, cols) or (rows, cols, bands).
+    centers : tuple of int arrays, optional
+        (rows, cols) of the central pixels of the patches. They must be
+        inside the image.
+    size : int
+        Odd side of the patches, in pixels.
+    stride : int
+        Pixels between the centers of consecutive patches, without
+        ``centers``.
+    padding : str
+        How pixels outside of the image are filled: "constant" with
+        ``fill_value``, "edge" with the nearest border pixel, "reflect"
+        mirroring the image at the border (without repeating it), or
+        "valid" to not allow patches crossing the border (dense tiling
+        only includes patches inside the image).
+    fill_value : scalar
+        Value of pixels outside of the image with "constant" padding. It
+        must be representable in the type of the image. Default: NaN
+    out : numpy.array, optional
+        Array where the patches around ``centers`` are written.
+
+    Returns
+    -------
+    numpy.array
+        With ``centers``, patches of shape (n, size, size[, bands]).
+        Otherwise, a view of shape (rows, cols, size, size[, bands]) with
+        the patches centered every ``stride`` pixels.
+    """
+    if size < 1 or size % 2 == 0:
+        raise ValueError("size must be a positive odd integer")
+    if padding not in PADDING_MODES:
+        raise ValueError(f"padding must be one of {PADDING_MODES}")
+    image = np.asarray(image)
+    half = size // 2
+    rows, cols = image.shape[:2]
+
+    if centers is None:
+        if stride < 1:
+            raise ValueError("stride must be a positive integer")
+        if padding != "valid":
+            pad_width = [(half, half)] * 2 + [(0, 0)] * (image.ndim - 2)
+            kwargs = {}
+            if padding == "constant":
+                kwargs["constant_values"] = fill_value
+            image = np.pad(image, pad_width, padding, **kwargs)
+        windows = np.lib.stride_tricks.sliding_window_view(
+            image, (size, size), axis=(0, 1)
+        )[::stride, ::stride]
+        # (rows, cols, [bands,] size, size) -> (rows, cols, size, size, ...)
+        return np.moveaxis(windows, (-2, -1), (2, 3))
+
+    center_rows, center_cols = (
+        np.asarray(idx, dtype=np.intp).ravel() for idx in centers
+    )
+    if (
+        (center_rows < 0).any()
+        or (center_rows >= rows).any()
+        or (center_cols < 0).any()
+        or (center_cols >= cols).any()
+    ):
+        raise ValueError("Patch centers must be inside the image")
+
+    offsets = np.arange(-half, half + 1)
+    patch_rows = center_rows[:, np.newaxis] + offsets
+    patch_cols = center_cols[:, np.newaxis] + offsets
+    outside_rows = (patch_rows < 0) | (patch_rows >= rows)
+    outside_cols = (patch_cols < 0) | (patch_cols >= cols)
+    if padding == "valid" and (outside_rows.any() or outside_cols.any()):
+        raise ValueError("Patches cross the border of the image")
+
+    patch_rows = _padded_index(patch_rows, rows, padding)
+    patch_cols = _padded_index(patch_cols, cols, padding)
+    patches = image[patch_rows[:, :, np.newaxis], patch_cols[:, np.newaxis]]
+    if padding == "constant":
+        outside = outside_rows[:, :, np.newaxis] | outside_cols[:, np.newaxis]
+        patches[outside] = fill_value
+
+    if out is None:
+        return patches
+    out[...] = patches
+    return out
+
+
+def gen_vect(col_row, band_dict, dtype=None, size=3):
     """Generate 3D vector.
 
     For a given (col,row) coordinate, generates a matrix of size 3x3xN
@@ -242,6 +843,7 @@ def gen_vect(col_row, band_dict):
     N should be 1 if the goes object contains one band CMI,
     N should be 3 if the goes object contains three band CMI,
     N should be 16 if goes object is a multi-band CMI.
+    Pixels outside of the image are NaN.
 
     Parameters
     ----------
@@ -249,6 +851,10 @@ def gen_vect(col_row, band_dict):
         Column and row coordinates given as (col, row).
     band_dict : dict
         Dictionary where bands are defined.
+    dtype : numpy.dtype, optional
+        Type of the vector. Default: the precision, see ``set_precision``.
+    size : int
+        Odd side of the neighbourhood. Default: 3
 
     Returns
     -------
@@ -258,29 +864,46 @@ def gen_vect(col_row, band_dict):
     key_list = list(band_dict.keys())
     brows, bcols = band_dict.get(key_list[0]).shape
 
-    if col_row[0] > bcols or col_row[1] > brows:
-        raise ValueError("Input column or row larger than image size")
-    band_vec = np.zeros((3, 3, len(band_dict)))
+    col, row = col_row
+    if not (0 <= col < bcols and 0 <= row < brows):
+        raise ValueError("Input column or row outside of the image")
+    band_vec = np.empty(
+        (size, size, len(band_dict)), dtype=resolve_dtype(dtype)
+    )
 
     # cut
     for count, band in enumerate(band_dict.values()):
-        band_vec[:, :, count] = band[
-            col_row[1] - 1 : col_row[1] + 2,
-            col_row[0] - 1 : col_row[0] + 2,
-        ].copy()
+        extract_patches(
+            band, ([row], [col]), size, out=band_vec[np.newaxis, ..., count]
+        )
 
-    return np.array(band_vec)
+    return band_vec
 
 
+@tracing.traced("core.merge")
 def merge(
     cloudsat_obj,
     goes_obj,
     all_layers=False,
     no_clouds=False,
     norm=True,
+    use_dqf=False,
+    dtype=None,
+    as_tensor=False,
+    out=None,
+    size=3,
 ):
     """Merge data from Cloudsat with co-located data from GOES-16.
 
+    By default, the 3x3 (see ``size``) neighbourhood of every CloudSat
+    profile in the GOES bands is stored as an array in the "goes_vec"
+    column. With
+    ``as_tensor``, neighbourhoods are returned instead as a single
+    contiguous array, aligned with the rows of the frame. Pixels outside
+    of the GOES image are NaN. Profiles are located in every band with
+    the projection read from its dataset (see ``GeosProjection``), as in
+    ``goes.Goes.trim``.
+
     Parameters
     ----------
     cloudsat_obj: ``cloudsat.CloudSatFrame``
@@ -299,24 +922,52 @@ def merge(
         coordinates where no clouds were detected by CloudSat.
         Default: False
 
-    norm: bool
-        If True, normalizes all GOES channels [0,1].
-        Default:True
+    norm: bool or str
+        Normalization of the GOES channels to [0,1]:
+            "scene" or True, with the minimum and maximum of the valid
+            pixels of each band, computed once and kept in the Goes object;
+            "fixed", with the physical range of each band (``BAND_RANGES``);
+            False or None, channels are not normalized.
+        Default: True
+
+    use_dqf: bool
+        If True, pixels with a non zero data quality flag are excluded
+        from the scene statistics.
+        Default: False
+
+    dtype: numpy.dtype
+        Type of the GOES vectors.
+        Default: the precision, see ``set_precision``.
+
+    as_tensor: bool
+        If True, return the neighbourhoods as an array of shape
+        (profiles, size, size, bands) along with the frame of the
+        profiles.
+        Default: False
+
+    out: numpy.array, str or path, optional
+        With ``as_tensor``, array where neighbourhoods are written, or
+        path of a .npy file created for them and returned memory-mapped.
+
+    size: int
+        Odd side of the neighbourhoods, in pixels.
+        Default: 3
 
     Returns
     -------
     Cloudsat Object
         DataFrame containing merged data.
+    tuple
+        With ``as_tensor``, (frame, neighbourhoods) where the row i of
+        the array belongs to the profile in the row i of the frame, which
+        has its labels, coordinates, time and (col, row) pixel in the
+        coarsest band.
     """
-    band_dict = {}
-    for key, band in goes_obj._data.items():
-        img = np.array(band["CMI"][:].data)
-        # Normalize data
-        if norm:
-            mini = np.amin(img[img != 65535.0])  # min
-            dif = np.amax(img[img != 65535.0]) - mini  # max - min
-            img = (img - mini) / dif
-        band_dict.update({key: img})
+    if norm is True:
+        norm = "scene"
+    if norm not in ("scene", "fixed", False, None):
+        raise ValueError("norm must be 'scene', 'fixed', True or False")
+    dtype = resolve_dtype(dtype)
 
     # Cloudsat
     if all_layers is False:
@@ -337,16 +988,72 @@ def merge(
     if no_clouds is False:
         cloudsat_obj = cloudsat_obj[cloudsat_obj.layer_0 != 0]
 
-    cloudsat_obj["col_row"] = cloudsat_obj.apply(
-        lambda x: scan2colfil(
-            latlon2scan(x.Latitude, x.Longitude),
-        ),
-        axis=1,
+    # Pixel of every CloudSat profile in the grid of every band (from the
+    # projection read from its dataset), dropping those not visible by
+    # GOES. Positions are always computed in double precision, so the
+    # pixels don't depend on the precision.
+    lat = cloudsat_obj["Latitude"].to_numpy()
+    lon = cloudsat_obj["Longitude"].to_numpy()
+    pixels = {}
+    for key in goes_obj._data:
+        projection = goes_obj._projection[key]
+        if projection not in pixels:
+            pixels[projection] = projection.latlon2colfil(
+                lat, lon, dtype=np.float64
+            )
+    visible = np.logical_and.reduce(
+        [~np.isnan(col) for col, _ in pixels.values()]
     )
+    cloudsat_obj = cloudsat_obj[visible]
+    pixels = {
+        projection: (
+            np.rint(col[visible]).astype(int),
+            np.rint(row[visible]).astype(int),
+        )
+        for projection, (col, row) in pixels.items()
+    }
+
+    # "col_row" is the pixel in the coarsest grid (2 km in real files)
+    col, row = pixels[max(pixels, key=lambda proj: proj.scale)]
+    cloudsat_obj["col_row"] = list(zip(col.tolist(), row.tolist()))
+
+    shape = (len(col), size, size, len(goes_obj._data))
+    if out is None or not as_tensor:
+        out = np.empty(shape, dtype=dtype)
+    elif isinstance(out, (str, os.PathLike)):
+        out = np.lib.format.open_memmap(
+            out, mode="w+", dtype=dtype, shape=shape
+        )
+    elif out.shape != shape:
+        raise ValueError(f"out must have shape {shape}")
+
+    half = size // 2
+    for count, (key, band) in enumerate(goes_obj._data.items()):
+        # Only the window around the profiles is read (and unpacked) from
+        # every band, so pixels are indexed relative to it
+        col, row = pixels[goes_obj._projection[key]]
+        r0, c0 = (idx.min() - half if idx.size else 0 for idx in (row, col))
+        r1, c1 = (
+            idx.max() + half + 1 if idx.size else 0 for idx in (row, col)
+        )
+        img = _read_window(band["CMI"], (r0, r1, c0, c1), dtype)
+
+        # Only the neighbourhoods are normalized
+        img = extract_patches(
+            img, (row - r0, col - c0), size, out=out[..., count]
+        )
+        if norm == "scene":
+            mini, maxi = goes_obj.band_stats(key, use_dqf)
+        elif norm == "fixed":
+            mini, maxi = BAND_RANGES[key[-3:]]
+        if norm:
+            img -= mini
+            img /= maxi - mini
+
+    if as_tensor:
+        return cloudsat_obj, out
 
     # Merge
-    cloudsat_obj["goes_vec"] = cloudsat_obj.apply(
-        lambda x: gen_vect(x.col_row, band_dict), axis=1
-    )
+    cloudsat_obj["goes_vec"] = list(out)
 
     return cloudsat_obj
@@ -1,6 +1,8 @@
 r"""Module containing all GOES satellite related classes and methods."""
 
 import datetime
+import functools
+import importlib
 import os
 
 import attr
@@ -9,18 +11,48 @@ from netCDF4 import Dataset
 
 import numpy as np
 
-from pyorbital import astronomy
+from . import core, parallel, tracing
+from .catalog import parse_goes
 
-from pyspectral.near_infrared_reflectance import Calculator
+PATH = os.path.abspath(os.path.dirname(__file__))
 
-from scipy import interpolate
+#: Dependencies imported on first use, as {name: (module, attribute)},
+#: since pyspectral takes most of the import time of the module.
+_LAZY_IMPORTS = {
+    "astronomy": ("pyorbital.astronomy", None),
+    "Calculator": ("pyspectral.near_infrared_reflectance", "Calculator"),
+}
 
-from . import core
 
-PATH = os.path.abspath(os.path.dirname(__file__))
+def __getattr__(name):
+    """Import the dependencies of ``_LAZY_IMPORTS`` on first use."""
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module, attribute = _LAZY_IMPORTS[name]
+    value = importlib.import_module(module)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+
+def _lazy(name):
+    """Dependency of ``_LAZY_IMPORTS`` (or its replacement, if patched)."""
+    return globals()[name] if name in globals() else __getattr__(name)
+
+
+#: Named regions, as (lat_inf, lat_sup, lon_east, lon_west), that can be
+#: given as coordinates of a Goes object.
+REGIONS = {"south_america": (-40.0, 10.0, -37.0, -80.0)}
 
+#: Maximum solar zenith angle (degrees) of the pixels of the Day
+#: Microphysics RGB. Beyond it the 3.9 um reflectance is meaningless, so
+#: it isn't computed and the pixels are left empty.
+MAX_ZENITH = 85.0
 
-def read_nc(file_path, **kwargs):
+
+@tracing.traced("goes.read_nc")
+def read_nc(file_path, packed=False, **kwargs):
     """Read netCDF files through the netCDF4 library.
 
     Parameters
@@ -30,6 +62,10 @@ def read_nc(file_path, **kwargs):
         channels 3, 7 and 13 of the CMIPF GOES-16 product.
         Can also contain a single path to  all 16 channels
         of MCMIPF GOES-16 product.
+    packed : bool
+        If True, the CMI of every channel is loaded into memory as
+        packed integers (see ``DetachedVariable``) and only the pixels
+        that are used are unpacked.
 
     Returns
     -------
@@ -39,14 +75,11 @@ def read_nc(file_path, **kwargs):
     """
     if len(file_path) == 3:
         # Check for date and product consistency
-        files_date = [
-            band_path.split("s20", 1)[1].split("_", 1)[0]
-            for band_path in file_path
-        ]
+        records = [parse_goes(band_path) for band_path in file_path]
 
         # Create boolean for consistency evaluation
-        eq_dates = all(date == files_date[0] for date in files_date)
-        eq_product = all("L2-CMIPF" in path for path in file_path)
+        eq_dates = all(rec.start == records[0].start for rec in records)
+        eq_product = all(rec.product == "ABI-L2-CMIPF" for rec in records)
 
         if not eq_dates:
             raise ValueError("Start date's from all files should be the same.")
@@ -61,16 +94,21 @@ def read_nc(file_path, **kwargs):
         # Needed attributes
         attributes = {"goes_imager_projection", "t", "y", "x"}
 
-        # Keep only CMI bands and needed attributes
+        # Keep only CMI bands, their quality flags and needed attributes
         for key in raw_data:
             if "CMI" in key:
                 channel = key.split("_")[1]
+                items = attributes.union({key, f"DQF_{channel}"})
                 data[f"M3{channel}"] = {
-                    item if item != key else key.split("_")[0]: raw_data[item]
-                    for item in attributes.union({key})
+                    item if item in attributes else item.split("_")[0]: (
+                        raw_data[item]
+                    )
+                    for item in items
+                    if item in raw_data
                 }
 
-        return Goes(data)
+        data = _load_packed(data) if packed else data
+        return Goes(data, files=file_path, **kwargs)
 
     elif len(file_path) != 1 and len(file_path) != 3:
 
@@ -80,10 +118,271 @@ def read_nc(file_path, **kwargs):
 
     data = dict()
     for paths in file_path:
-        channel = paths.split("-")[3].split("_")[0]
-        data[channel] = Dataset(paths, "r").variables
+        record = parse_goes(paths)
+        data[f"{record.mode}{record.channel}"] = Dataset(paths, "r").variables
+
+    data = _load_packed(data) if packed else data
+    return Goes(data, files=file_path, **kwargs)
+
+
+def _load_packed(data):
+    """Replace the CMI of every channel by its packed values in memory."""
+    packed = {}
+    for ch_id, dataset in data.items():
+        cmi = DetachedVariable.from_variable(dataset["CMI"], packed=True)
+        tracing.add_bytes(cmi.array.nbytes)
+        packed[ch_id] = dict(dataset, CMI=cmi)
+    return packed
+
+
+def _source(path):
+    """(satellite, name) of a GOES file, for the keys of the products."""
+    name = os.path.basename(os.fspath(path))
+    try:
+        return parse_goes(name).satellite, name
+    except ValueError:  # not named as the ABI files
+        return None, name
+
+
+def register_region(name, coordinates):
+    """Add a named region.
+
+    Parameters
+    ----------
+    name: ``str``
+        Name of the region.
+    coordinates: ``tuple``
+        (lat_inf, lat_sup, lon_east, lon_west) of the region.
+    """
+    if len(coordinates) != 4:
+        raise ValueError("coordinates must have length four")
+    REGIONS[name] = tuple(float(coord) for coord in coordinates)
+
+
+def _as_coordinates(coordinates):
+    """Resolve region names into coordinates tuples."""
+    if isinstance(coordinates, str):
+        try:
+            return REGIONS[coordinates]
+        except KeyError:
+            raise ValueError(f"Unknown region {coordinates!r}")
+    return tuple(coordinates)
+
+
+@functools.lru_cache(maxsize=1024)
+def trim_window(projection, coordinates):
+    """Image window of a region for a given projection.
+
+    Windows are memoized by (projection, coordinates), so they are
+    computed once per resolution and region in the whole process,
+    no matter how many channels or Goes objects share them.
+
+    Parameters
+    ----------
+    projection: ``core.GeosProjection``
+        Projection of the channel.
+    coordinates: ``tuple``
+        (lat_inf, lat_sup, lon_east, lon_west) of the region.
+
+    Returns
+    -------
+    ``tuple``
+        (r0, r1, c0, c1) rows and columns of the window.
+    """
+    return projection.window(coordinates)
+
+
+def precompute_windows(projections, regions=None):
+    """Compute and memoize trim windows for several regions.
+
+    Parameters
+    ----------
+    projections: iterable of ``core.GeosProjection``
+        Projections (one per resolution) to compute the windows for.
+    regions: iterable of ``str``, optional
+        Names of the regions. By default, all registered regions.
+
+    Returns
+    -------
+    ``dict``
+        {region: {projection: (r0, r1, c0, c1)}}
+    """
+    regions = REGIONS if regions is None else regions
+    projections = set(projections)
+    return {
+        name: {
+            projection: trim_window(projection, _as_coordinates(name))
+            for projection in projections
+        }
+        for name in regions
+    }
+
+
+@attr.s(frozen=True, repr=False)
+class DetachedVariable:
+    """In-memory stand-in for a netCDF variable.
+
+    Holds the values and attributes of a variable without its file, so
+    Goes objects built from them can be pickled and sent to other
+    processes. Like ``netCDF4.Variable``, indexing returns masked arrays
+    and netCDF attributes can be read as attributes.
+
+    Integer values with ``scale_factor`` or ``add_offset`` attributes
+    are kept packed (e.g. CMI is stored as uint16), and only the elements
+    that are indexed are unpacked, so the variable takes a fraction of the
+    memory of the unpacked image.
+
+    Parameters
+    ----------
+    values: ``numpy.array`` or ``parallel.SharedArray``
+        Values of the variable, with ``fill_value`` on masked elements.
+    attrs: ``dict``
+        netCDF attributes of the variable.
+    fill_value: float, optional
+        Value of the masked elements. None if nothing is masked.
+    """
 
-    return Goes(data, **kwargs)
+    values = attr.ib()
+    attrs = attr.ib(factory=dict)
+    fill_value = attr.ib(default=None)
+
+    @classmethod
+    def from_variable(cls, variable, shared=False, packed=False):
+        """Read a variable into memory.
+
+        Parameters
+        ----------
+        variable: ``netCDF4.Variable``, ``numpy.array`` or DetachedVariable
+            Variable to read.
+        shared: bool
+            If True, images (arrays with two or more dimensions) are
+            placed in shared memory, see ``parallel.SharedArray``.
+        packed: bool
+            If True, netCDF variables are read without applying their
+            scale, offset and fill value. Variables already in memory are
+            kept as they are.
+
+        Returns
+        -------
+        ``goes.DetachedVariable``
+            The detached variable.
+        """
+        attrs = {}
+        if hasattr(variable, "ncattrs"):
+            attrs = {
+                key: variable.getncattr(key) for key in variable.ncattrs()
+            }
+
+        if isinstance(variable, cls):
+            values, fill_value = variable.values, variable.fill_value
+        elif packed and hasattr(variable, "set_auto_maskandscale"):
+            values = _read_raw(variable)
+            fill_value = attrs.get("_FillValue")
+        else:
+            data = variable[:]
+            if np.ndim(data) == 0:
+                # e.g. the np.ma.masked constant of empty scalars
+                data = np.ma.array(data)
+            fill_value = None
+            if np.ma.is_masked(data):
+                fill_value = data.fill_value
+                data = data.filled(fill_value)
+            values = np.ma.getdata(data)
+
+        if shared and np.ndim(values) >= 2:
+            if not isinstance(values, parallel.SharedArray):
+                values = parallel.SharedArray.from_array(values)
+        return cls(values, attrs, fill_value)
+
+    @property
+    def array(self):
+        """Values of the variable as a ``numpy.array``."""
+        if isinstance(self.values, parallel.SharedArray):
+            return self.values.array
+        return self.values
+
+    @property
+    def packed(self):
+        """True if values are stored packed."""
+        return np.issubdtype(self.array.dtype, np.integer) and (
+            "scale_factor" in self.attrs or "add_offset" in self.attrs
+        )
+
+    @property
+    def shape(self):
+        """Shape of the variable."""
+        return self.array.shape
+
+    @property
+    def ndim(self):
+        """Number of dimensions of the variable."""
+        return self.array.ndim
+
+    def __repr__(self):
+        """repr(x) <=> x.__repr__()."""
+        return f"<DetachedVariable shape={self.shape}>"
+
+    def __getitem__(self, key):
+        """x[key] <=> x.__getitem__(key), as a masked array."""
+        array = self.array
+        # Like netCDF scalar variables, accept any key on 0-d values
+        block = array[...] if array.ndim == 0 else array[key]
+        if self.packed:
+            return self._unpack(block)
+        mask = np.ma.nomask
+        if self.fill_value is not None:
+            mask = block == self.fill_value
+        return np.ma.MaskedArray(block, mask=mask)
+
+    def _unpack(self, raw):
+        """Apply scale, offset and fill value to packed values."""
+        # Integer compares, before unpacking
+        raw = np.asarray(raw)
+        mask = np.zeros(raw.shape, dtype=bool)
+        if self.fill_value is not None:
+            mask |= raw == self.fill_value
+        valid_range = self.attrs.get("valid_range")
+        if valid_range is not None:
+            mask |= raw < valid_range[0]
+            mask |= raw > valid_range[1]
+
+        scale = self.attrs.get("scale_factor", 1.0)
+        data = np.asarray(np.multiply(raw, scale))
+        data += self.attrs.get("add_offset", 0.0)
+        # As netCDF4 does, masked elements keep their packed value
+        np.copyto(data, raw, where=mask)
+        return np.ma.MaskedArray(data, mask=mask)
+
+    def __getattr__(self, name):
+        """Read netCDF attributes as attributes."""
+        # __dict__ is empty while unpickling
+        attrs = self.__dict__.get("attrs", {})
+        if name in attrs:
+            return attrs[name]
+        raise AttributeError(name)
+
+    def ncattrs(self):
+        """Names of the netCDF attributes."""
+        return list(self.attrs)
+
+    def getncattr(self, name):
+        """Value of a netCDF attribute."""
+        return self.attrs[name]
+
+
+def _read_raw(variable):
+    """Read a netCDF variable without unpacking nor masking it."""
+    auto_mask, auto_scale = variable.mask, variable.scale
+    variable.set_auto_maskandscale(False)
+    try:
+        return variable[:]
+    finally:
+        variable.set_auto_mask(auto_mask)
+        variable.set_auto_scale(auto_scale)
+
+
+#: Variables of each channel kept by ``Goes.detach``.
+DETACHED_VARIABLES = ("CMI", "DQF", "t", "x", "y", "goes_imager_projection")
 
 
 @attr.s(frozen=False, repr=False)
@@ -99,19 +398,33 @@ class Goes:
     data: ``netCDF4.Dataset.variables dict``
         Dictionary with variables data from each channel of the
         GOES Day Microphysics product.
-    coordinates: ``tuple``  (default: cut will be south hemisphere)
+    coordinates: ``tuple`` or ``str``  (default: cut will be south hemisphere)
         (lat_inf, lat_sup, lon_east, lon_west) where:
             lat_inf, latitude of minimal position
             lat_sup, latitude of maximal position
             lon_east, longitude of
             lon_west, longitude of
+        or the name of a region in ``REGIONS``.
+    cache: ``products.ProductCache``, optional
+        Cache of the trimmed images and the RGB, shared by the objects of
+        the same scene and coordinates.
+    files: ``tuple``, optional
+        Paths of the files of the data, which tell the products of
+        different satellites (or files) apart in ``cache``.
     """
 
     _data = attr.ib(validator=attr.validators.instance_of(dict))
-    coordinates = attr.ib(default=(-40.0, 10.0, -37.0, -80.0))
+    coordinates = attr.ib(
+        default=(-40.0, 10.0, -37.0, -80.0), converter=_as_coordinates
+    )
+    cache = attr.ib(default=None)
+    files = attr.ib(default=(), converter=tuple)
+    _projection = attr.ib(init=False)
     _trim_coord = attr.ib(init=False)
-    RGB = attr.ib(init=False)
     _img_date = attr.ib(init=False)
+    RGB = attr.ib(init=False)
+    _band_stats = attr.ib(init=False, factory=dict)
+    _shared = attr.ib(init=False, factory=dict)
 
     def __repr__(self):
         """repr(x) <=> x.__repr__()."""
@@ -159,99 +472,265 @@ class Goes:
         date_0 = datetime.datetime(year=2000, month=1, day=1, hour=12)
         return date_0 + time_delta
 
+    @_projection.default
+    def _projection_default(self):
+        return {
+            ch_id: core.GeosProjection.from_dataset(dataset)
+            for ch_id, dataset in self._data.items()
+        }
+
     @_trim_coord.default
     def _trim_coord_default(self):
-        # Coordinates in deegres
-        lat_inf, lat_sup, lon_east, lon_west = self.coordinates
+        return {
+            ch_id: trim_window(projection, self.coordinates)
+            for ch_id, projection in self._projection.items()
+        }
+
+    @property
+    def is_detached(self):
+        """True if the data doesn't depend on open netCDF files."""
+        return all(
+            isinstance(variable, DetachedVariable)
+            for dataset in self._data.values()
+            for variable in dataset.values()
+        )
+
+    def detach(self, shared=False, packed=False):
+        """Copy of the object that doesn't depend on its netCDF files.
 
-        trim_coordinates = dict()
+        The variables needed by the object (see ``DETACHED_VARIABLES``)
+        are read into memory as ``DetachedVariable``, and everything
+        already computed (RGB, trim windows, statistics) is kept, so the
+        copy can be pickled and sent to worker processes. Pickling a Goes
+        object detaches it automatically.
+
+        Parameters
+        ----------
+        shared: bool
+            If True, the images and the RGB are placed in shared memory:
+            pickles only carry references to the memory blocks, and
+            workers attach to them instead of receiving a copy. The blocks
+            must be freed with ``release`` when workers are done.
+        packed: bool
+            If True, packed variables (e.g. CMI) are kept as packed
+            integers and unpacked only where they are used.
+
+        Returns
+        -------
+        ``goes.Goes``
+            Detached Goes object.
+        """
+        variables = {}
+        data = {}
         for ch_id, dataset in self._data.items():
-            # Extract all the variables
-            metadata = dataset
-
-            # satellite height
-            h = metadata["goes_imager_projection"].perspective_point_height
-            semieje_may = metadata["goes_imager_projection"].semi_major_axis
-            semieje_men = metadata["goes_imager_projection"].semi_minor_axis
-            lon_cen = metadata[
-                "goes_imager_projection"
-            ].longitude_of_projection_origin
-            scale_factor = metadata["x"].scale_factor
-            offset = np.array(
-                [metadata["x"].add_offset, metadata["y"].add_offset]
-            )
+            data[ch_id] = {}
+            for name in DETACHED_VARIABLES:
+                if name not in dataset:
+                    continue
+                # Variables shared by all bands of MCMIPF are read once
+                variable = dataset[name]
+                if id(variable) not in variables:
+                    variables[id(variable)] = DetachedVariable.from_variable(
+                        variable, shared=shared, packed=packed
+                    )
+                data[ch_id][name] = variables[id(variable)]
+
+        detached = object.__new__(type(self))
+        detached.__dict__.update(
+            self.__dict__,
+            _data=data,
+            _band_stats=dict(self._band_stats),
+            _shared=dict(self._shared),
+        )
+        if shared and isinstance(self.RGB, np.ndarray):
+            if "RGB" not in detached._shared:
+                detached._shared["RGB"] = parallel.SharedArray.from_array(
+                    self.RGB
+                )
+            detached.RGB = detached._shared["RGB"].array
+        return detached
+
+    def release(self):
+        """Free the shared memory created by ``detach(shared=True)``.
+
+        Only the process that detached the object should call it, once
+        no worker needs the data anymore.
+        """
+        blocks = list(self._shared.values())
+        for dataset in self._data.values():
+            for variable in dataset.values():
+                values = getattr(variable, "values", None)
+                if isinstance(values, parallel.SharedArray):
+                    blocks.append(values)
+
+        for block in {block.name: block for block in blocks}.values():
+            if block.owner:
+                block.unlink()
+
+    def __getstate__(self):
+        """Detach the object before pickling it."""
+        detached = self if self.is_detached else self.detach()
+        state = dict(detached.__dict__)
+        # Attributes in shared memory travel as references
+        state.update(detached._shared)
+        return state
+
+    def __setstate__(self, state):
+        """Restore a pickled object, attaching to its shared memory."""
+        for name, block in state["_shared"].items():
+            state[name] = block.array
+        self.__dict__.update(state)
+
+    def band_stats(self, ch_id, use_dqf=False, image=None):
+        """Minimum and maximum of the valid pixels of a channel.
+
+        Statistics are computed once, in a single pass over the band,
+        and kept in the object so later calls (e.g. repeated merges
+        against the same scene) don't read the band again.
 
-            pto_sup_izq = core.latlon2scan(
-                lat_sup,
-                lon_west,
-                lon_cen,
-                Re=semieje_may,
-                Rp=semieje_men,
-                h=h,
-            )
+        Parameters
+        ----------
+        ch_id: ``str``
+            Channel key, e.g. "M3C13".
+        use_dqf: bool
+            If True, pixels with a non zero data quality flag are
+            also excluded.
+        image: ``numpy.array``, optional
+            CMI values of the channel already in memory, used instead
+            of reading the band again.
 
-            pto_inf_der = core.latlon2scan(
-                lat_inf,
-                lon_east,
-                lon_cen,
-                Re=semieje_may,
-                Rp=semieje_men,
-                h=h,
+        Returns
+        -------
+        ``tuple``
+            (min, max) of the channel.
+        """
+        key = (ch_id, use_dqf)
+        if key not in self._band_stats:
+            dataset = self._data[ch_id]
+            dqf = dataset["DQF"] if use_dqf and "DQF" in dataset else None
+            cmi = dataset["CMI"]
+            self._band_stats[key] = core.valid_minmax(
+                cmi if image is None else image,
+                dqf,
+                fill_value=getattr(cmi, "_FillValue", None),
             )
+        return self._band_stats[key]
 
-            c0, r0 = core.scan2colfil(
-                pto_sup_izq,
-                offset[0],
-                offset[1],
-                scale_factor,
-                1,
-            )
-            c1, r1 = core.scan2colfil(
-                pto_inf_der,
-                offset[0],
-                offset[1],
-                scale_factor,
-                1,
-            )
+    def _trim(self, windows, dtype=None):
+        """Trim every channel for several windows, reading each band once.
 
-            trim_coordinates[ch_id] = (r0, r1, c0, c1)
+        ``windows`` maps names to {ch_id: (r0, r1, c0, c1)}. Only the
+        union of the windows of each channel is read, and every name gets
+        a view of it. See ``as_precision`` for ``dtype``.
+        """
+        trim_img = {name: dict() for name in windows}
+        scale_2km = core.GeosProjection().scale  # psize = 2000 [m]
+        for ch_id, dataset in self._data.items():
+            ch_windows = [window[ch_id] for window in windows.values()]
+            R0 = min(window[0] for window in ch_windows)
+            R1 = max(window[1] for window in ch_windows)
+            C0 = min(window[2] for window in ch_windows)
+            C1 = max(window[3] for window in ch_windows)
+
+            with tracing.span("goes.trim", channel=ch_id):
+                image = np.ma.getdata(dataset["CMI"][R0:R1, C0:C1])
+                tracing.add_bytes(image.nbytes)
+                image = as_precision(image, dtype)
+
+            for name, window in windows.items():
+                r0, r1, c0, c1 = window[ch_id]
+                img = image[r0 - R0 : r1 - R0, c0 - C0 : c1 - C0]
+
+                # Rescale channels with psize = 1000 [m]. A cubic
+                # interpolation evaluated on the 2 km grid only hits
+                # original samples, so it is one every ``step`` pixels
+                # (the grid stops before the last row).
+                if ch_id == "M3C03" and len(self._data.keys()) != 16:
+                    with tracing.span("goes.resample_c03"):
+                        step = round(scale_2km / self._projection[ch_id].scale)
+                        img = img[: img.shape[0] - 1 : step, ::step]
+
+                trim_img[name][ch_id] = img
 
-        return trim_coordinates
+        return trim_img
 
-    def trim(self):
+    def trim(self, dtype=None):
         """Drop the GOES image.
 
         Trims a GOES CMI image according to coordinate:
         lower latitude, upper latitude, eastern longitude, western longitude
         specified on the parameters.
         Default parameters are set to return a South America image.
+        Only the trimmed window is read from each band.
 
         Parameters
         ----------
-        None
+        dtype: ``numpy.dtype``, optional
+            Type of the images. By default, the precision (see
+            ``core.set_precision``), without expanding images read with
+            less precision.
 
         Returns
         -------
         trim_img: ``numpy.array`` containing the trimmed image.
         """
-        trim_img = dict()
-        N = 5424  # Image size for psize = 2000 [m]
-        for ch_id, dataset in self._data.items():
-            image = np.array(dataset["CMI"][:].data)
-            esc = N / image.shape[0]
-            r0, r1, c0, c1 = self._trim_coord[ch_id]
-            trim_img[ch_id] = image[r0:r1, c0:c1]
-
-            # Rescale channels with psize = 1000 [m]
-            if ch_id == "M3C03" and len(self._data.keys()) != 16:
-                x = range(trim_img[ch_id][:].shape[1])
-                y = range(trim_img[ch_id][:].shape[0])
-                f = interpolate.interp2d(x, y, trim_img[ch_id], kind="cubic")
-                xnew = np.arange(x[0], x[-1] + 1, (x[1] - x[0]) / esc)
-                ynew = np.arange(y[0], y[-1], (y[1] - y[0]) / esc)
-                trim_img[ch_id] = f(xnew, ynew)
+        if self.cache is None:
+            return self._trim({None: self._trim_coord}, dtype)[None]
+        key = self._product_key(
+            "trim",
+            dtype=None if dtype is None else np.dtype(dtype),
+            precision=core.get_precision(),
+        )
+        return self.cache.get_or_compute(
+            key, lambda: self._trim({None: self._trim_coord}, dtype)[None]
+        )
 
-        return trim_img
+    def _product_key(self, stage, **params):
+        """Key of a product of the scene in ``cache``."""
+        return self.cache.key(
+            stage=stage,
+            scene=self._img_date.isoformat(),
+            sources=[_source(path) for path in self.files],
+            channels={
+                ch_id: dataset["CMI"].shape
+                for ch_id, dataset in self._data.items()
+            },
+            windows=self._trim_coord,
+            params=params,
+        )
+
+    def trim_regions(self, regions, dtype=None):
+        """Trim the GOES image for several regions at once.
+
+        Each channel is read only once, in the window that contains all
+        the regions, and the image of every region is a view of it.
+
+        Parameters
+        ----------
+        regions: ``dict`` or iterable of ``str``
+            {name: (lat_inf, lat_sup, lon_east, lon_west)}, or names of
+            regions in ``REGIONS``.
+        dtype: ``numpy.dtype``, optional
+            Type of the images, as in ``trim``.
+
+        Returns
+        -------
+        ``dict``
+            {name: {ch_id: ``numpy.array``}} trimmed images of each region.
+        """
+        if not isinstance(regions, dict):
+            regions = {name: name for name in regions}
+        if not regions:
+            raise ValueError("At least one region is needed")
+
+        windows = {
+            name: {
+                ch_id: trim_window(projection, _as_coordinates(coordinates))
+                for ch_id, projection in self._projection.items()
+            }
+            for name, coordinates in regions.items()
+        }
+        return self._trim(windows, dtype)
 
     @RGB.default
     def _RGB_default(self, masked=False):
@@ -278,58 +757,308 @@ class Goes:
         RGB: ``numpy.array``
             RGB day microphysics image.
         """
+        return self.rgb(masked=masked)
+
+    def rgb(self, masked=False, dtype=None, out=None):
+        """Make the Day Microphysics RGB of the region.
+
+        ``RGB`` holds the result with the default options. With a
+        ``cache``, the RGB is stored as a product (see
+        ``products.ProductCache``).
+
+        Parameters
+        ----------
+        masked: bool
+            If True, returns a masked RGB
+            according to day MP quick guide
+        dtype: ``numpy.dtype``
+            Type of the RGB, float or numpy.uint8 (values in [0, 255]).
+            Default: the precision, see ``core.set_precision``.
+        out: ``numpy.array``, optional
+            Array of shape (rows, cols, 3) where the RGB is written.
+
+        Returns
+        -------
+        RGB: ``numpy.array``
+            RGB day microphysics image, or the trimmed image of the only
+            channel of the object.
+        """
+        if self.cache is not None and out is None and len(self._data) != 1:
+            key = self._product_key(
+                "rgb", masked=masked, dtype=core.resolve_dtype(dtype)
+            )
+            product = self.cache.get(key)
+            if product is None:
+                rgb = self.day_microphysics(masked=masked, dtype=dtype)
+                product = self.cache.put(key, rgb)
+            return product
+
+        # Night scenes aren't trimmed, see day_microphysics
+        if len(self._data) != 1 and self.is_night():
+            return self.day_microphysics(masked=masked, dtype=dtype, out=out)
+
         # Starts with all channels trimmed images
         trimmed_img = self.trim()
 
         if len(trimmed_img) == 1:
             return np.array(list(trimmed_img.values()))
         else:
-            # Asign color to bands and make zenith correction on band 7.
-            R = trimmed_img["M3C03"]
-            G = solar7(
-                self._trim_coord["M3C07"],
-                trimmed_img["M3C07"],
-                trimmed_img["M3C13"],
+            return self.day_microphysics(
+                masked=masked, dtype=dtype, out=out, trimmed_img=trimmed_img
             )
-            B = trimmed_img["M3C13"]
 
-            # Minimuns and Maximuns
-            Rmin = 0
-            Rmax = 1
+    @tracing.traced("goes.day_microphysics")
+    def day_microphysics(
+        self,
+        masked=False,
+        dtype=None,
+        out=None,
+        tile_shape=None,
+        executor=None,
+        max_workers=None,
+        trimmed_img=None,
+        max_zenith=MAX_ZENITH,
+    ):
+        """Make the Day Microphysics RGB by tiles.
+
+        The zenith correction of channel 7, the normalization and the
+        optional mask only need each pixel, so the trimmed image can be
+        split into tiles processed in parallel and written into a
+        preallocated output. See ``parallel.map_tiles``.
+
+        Pixels whose solar zenith angle exceeds ``max_zenith`` are empty
+        (NaN, or 0 for numpy.uint8): their reflectance isn't computed,
+        tiles without sunlit pixels are skipped and, if the whole region
+        is in the night (see ``is_night``), the channels aren't even
+        read.
 
-            Gmin = 0
-            Gmax = 0.6
+        Parameters
+        ----------
+        masked: bool
+            If True, returns a masked RGB
+            according to day MP quick guide
+        dtype: ``numpy.dtype``
+            Type of the RGB, float or numpy.uint8 (values in [0, 255]).
+            Default: the precision, see ``core.set_precision``.
+        out: ``numpy.array``, optional
+            Array of shape (rows, cols, 3) where the RGB is written.
+        tile_shape: ``tuple``, optional
+            (rows, cols) of the tiles. By default, a single tile.
+        executor: None, "thread", "process" or ``Executor``
+            Where the tiles are processed. Default: serially.
+        max_workers: int, optional
+            Number of workers of the pool.
+        trimmed_img: ``dict``, optional
+            Result of ``trim``, if it's already available.
+        max_zenith: float, optional
+            Maximum solar zenith angle of the pixels, in degrees. If
+            None, every pixel is computed.
 
-            Bmin = 203
-            Bmax = 323
+        Returns
+        -------
+        RGB: ``numpy.array``
+            RGB day microphysics image.
+        """
+        if self.is_night(max_zenith):
+            if out is None:
+                # Shape of the trimmed channel 7, without reading it
+                r0, r1, c0, c1 = self._trim_coord["M3C07"]
+                rows, cols = self._data["M3C07"]["CMI"].shape
+                shape = (min(r1, rows) - r0, min(c1, cols) - c0, 3)
+                out = np.empty(shape, dtype=core.resolve_dtype(dtype))
+            return _night_rgb(out, masked)
+
+        if trimmed_img is None:
+            trimmed_img = self.trim()
+
+        # Asign color to bands, band 7 is corrected by tiles
+        R = trimmed_img["M3C03"]
+        ch7 = trimmed_img["M3C07"]
+        B = trimmed_img["M3C13"]
+
+        if out is None:
+            out = np.empty(ch7.shape + (3,), dtype=core.resolve_dtype(dtype))
+        r0, _, c0, _ = self._trim_coord["M3C07"]
+
+        return parallel.map_tiles(
+            _day_microphysics_tile,
+            (R, ch7, B),
+            out,
+            tile_shape=tile_shape or ch7.shape,
+            executor=executor,
+            max_workers=max_workers,
+            origin=(r0, c0),
+            projection=self._projection["M3C07"],
+            masked=masked,
+            dtype=out.dtype,
+            utc_time=self._img_date,
+            max_zenith=max_zenith,
+        )
 
-            # Normalize the data and copying
-            R = (R - Rmin) / (Rmax - Rmin)
-            with np.errstate(invalid="ignore"):
-                G = ((G - Gmin) / (Gmax - Gmin)) ** 0.4
-            B = (B - Bmin) / (Bmax - Bmin)
+    def is_night(self, max_zenith=MAX_ZENITH):
+        """Whether the whole region of the image is in the night.
 
-            RR = np.copy(R)
-            BB = np.copy(B)
-            GG = np.copy(G)
+        See the function ``is_night``. Always False if ``max_zenith`` is
+        None.
+        """
+        if max_zenith is None:
+            return False
+        return is_night(self._img_date, self.coordinates, max_zenith)
 
-            RR[RR < 0] = 0.0
-            RR[RR > 1] = 1.0
-            BB[BB < 0] = 0.0
-            BB[BB > 1] = 1.0
-            GG[GG < 0] = 0.0
-            GG[GG > 1] = 1.0
 
-            # Create the norm RGB
-            RRGB = np.stack([RR, GG, BB], axis=2)
+def as_precision(image, dtype=None):
+    """Convert an image to a float type.
 
-            if masked is True:
-                RRGB = mask(RRGB)
+    Parameters
+    ----------
+    image: ``numpy.array``
+        Image to convert.
+    dtype: ``numpy.dtype``, optional
+        Type of the result. By default, the precision (see
+        ``core.set_precision``), but float images with less precision are
+        not expanded: e.g. CMI read as float32 stays float32.
 
-            return RRGB
+    Returns
+    -------
+    ``numpy.array``
+        The converted image, or the same image if it has the type.
+    """
+    if dtype is None:
+        dtype = core.get_precision()
+        if np.issubdtype(image.dtype, np.floating) and (
+            image.dtype.itemsize <= dtype.itemsize
+        ):
+            return image
+    return image.astype(dtype, copy=False)
+
+
+def _night_rgb(out, masked=False):
+    """Fill an RGB with the value of pixels without Day Microphysics.
+
+    NaN for float RGB, and 0 for numpy.uint8 or masked RGB (see ``mask``).
+    """
+    floating = np.issubdtype(out.dtype, np.floating)
+    out[...] = np.nan if floating and not masked else 0
+    return out
+
+
+def _day_microphysics_tile(
+    tile,
+    ch3,
+    ch7,
+    ch13,
+    origin,
+    projection,
+    masked,
+    dtype,
+    utc_time,
+    max_zenith,
+):
+    """Day Microphysics RGB of a tile of the trimmed channels."""
+    r0 = origin[0] + tile.outer_rows.start
+    c0 = origin[1] + tile.outer_cols.start
+    window = (r0, r0 + ch7.shape[0], c0, c0 + ch7.shape[1])
+
+    zenith = sun_zenith(window, utc_time, projection)
+    night = None
+    if max_zenith is not None:
+        with np.errstate(invalid="ignore"):
+            night = ~(zenith <= max_zenith)
+        if night.all():
+            return _night_rgb(np.empty(ch7.shape + (3,), dtype), masked)
+
+    G = solar7(
+        window,
+        ch7,
+        ch13,
+        projection=projection,
+        max_zenith=max_zenith,
+        zenith=zenith,
+    )
+    rgb = normalize_rgb(ch3, G, ch13, dtype=dtype)
+    if night is not None and night.any():
+        rgb[night] = np.nan if np.issubdtype(rgb.dtype, np.floating) else 0
+    return mask(rgb) if masked else rgb
+
+
+#: Time of the zenith correction of ``solar7`` when no time is given.
+_DEFAULT_UTC_TIME = datetime.datetime(2019, 1, 2, 18, 00)
+
+
+@tracing.traced("goes.sun_zenith")
+def sun_zenith(trim_coord_ch7, utc_time, projection=None):
+    """Compute the solar zenith angle of every pixel of channel 7.
+
+    Parameters
+    ----------
+    trim_coord_ch7: ``tuple``
+        (r0, r1, c0, c1) window of the pixels, see ``solar7``.
+    utc_time: ``datetime.datetime``
+        Time of the image (UTC).
+    projection: ``core.GeosProjection``, optional
+        Projection of channel 7, see ``solar7``.
+
+    Returns
+    -------
+    ``numpy.array``
+        Zenith angles, in degrees (NaN outside of the disk).
+    """
+    # Trimmed coordinates
+    r0, r1, c0, c1 = trim_coord_ch7
+
+    if projection is None:
+        # Construct paths
+        latitude_path = os.path.join(PATH, "lat_vec.npy")
+        longitude_path = os.path.join(PATH, "lon_vec.npy")
+
+        lat = np.load(latitude_path)[r0:r1]
+        lon = np.load(longitude_path)[c0:c1]
+        LON, LAT = np.meshgrid(lon, lat)
+    else:
+        LAT, LON = projection.colfil2latlon(
+            np.arange(c0, c1)[np.newaxis, :], np.arange(r0, r1)[:, np.newaxis]
+        )
 
+    return _lazy("astronomy").sun_zenith_angle(utc_time, LON, LAT)
 
-def solar7(trim_coord_ch7, ch7, ch13):
+
+def is_night(utc_time, coordinates, max_zenith=MAX_ZENITH, step=0.5):
+    """Whether the solar zenith exceeds ``max_zenith`` in a whole region.
+
+    The zenith is computed on a grid of the region with ``step`` degrees,
+    so it's cheap enough to check scenes before reading (or fetching)
+    them. Points within ``step`` degrees of the limit count as day.
+
+    Parameters
+    ----------
+    utc_time: ``datetime.datetime``
+        Time of the image (UTC).
+    coordinates: ``tuple`` or ``str``
+        (lat_inf, lat_sup, lon_east, lon_west) or the name of a region
+        in ``REGIONS``.
+    max_zenith: float
+        Maximum zenith angle of the day, in degrees.
+    step: float
+        Spacing of the grid, in degrees.
+    """
+    lat_inf, lat_sup, lon_east, lon_west = _as_coordinates(coordinates)
+    lat = np.append(np.arange(lat_inf, lat_sup, step), lat_sup)
+    lon = np.append(np.arange(lon_west, lon_east, step), lon_east)
+    LON, LAT = np.meshgrid(lon, lat)
+    zenith = _lazy("astronomy").sun_zenith_angle(utc_time, LON, LAT)
+    return bool(np.all(zenith > max_zenith + step))
+
+
+@tracing.traced("goes.solar7")
+def solar7(
+    trim_coord_ch7,
+    ch7,
+    ch13,
+    projection=None,
+    utc_time=None,
+    max_zenith=None,
+    zenith=None,
+):
     """Correct the channel 7.
 
     This function does a zenith angle correction to channel 7.
@@ -348,30 +1077,138 @@ def solar7(trim_coord_ch7, ch7, ch13):
         Trimmed image of channel 7.
     ch13: ``numpy.array``
         Trimed image of channel 13.
+    projection: ``core.GeosProjection``, optional
+        Projection of channel 7. If given, latitude and longitude of
+        every pixel are computed from it; otherwise they are
+        approximated with the stored latitude and longitude vectors.
+    utc_time: ``datetime.datetime``, optional
+        Time of the image (UTC). Goes objects give the date of their
+        image; by default, 2019-01-02 18:00.
+    max_zenith: float, optional
+        If given, the reflectance is only computed for the pixels whose
+        solar zenith angle is at most ``max_zenith``, and the others are
+        NaN.
+    zenith: ``numpy.array``, optional
+        Zenith angle of every pixel, if it's already computed (see
+        ``sun_zenith``).
 
     Returns
     -------
     ``numpy.array``
         Zenith calculation for every pixel for channel 7.
     """
-    # Construct paths
-    latitude_path = os.path.join(PATH, "lat_vec.npy")
-    longitude_path = os.path.join(PATH, "lon_vec.npy")
-
-    # Trimmed coordinates
-    r0, r1, c0, c1 = trim_coord_ch7
-    lat = np.load(latitude_path)[r0:r1]
-    lon = np.load(longitude_path)[c0:c1]
-
     # Calculate the solar zenith angle
-    utc_time = datetime.datetime(2019, 1, 2, 18, 00)
-    LON, LAT = np.meshgrid(lon, lat)
-    zenith = astronomy.sun_zenith_angle(utc_time, LON, LAT)
-    refl39 = Calculator(platform_name="GOES-16", instrument="abi", band="ch7")
-
-    return refl39.reflectance_from_tbs(zenith, ch7, ch13)
+    if zenith is None:
+        utc_time = _DEFAULT_UTC_TIME if utc_time is None else utc_time
+        zenith = sun_zenith(trim_coord_ch7, utc_time, projection)
+
+    sunlit = None
+    if max_zenith is not None:
+        with np.errstate(invalid="ignore"):
+            sunlit = zenith <= max_zenith
+        if sunlit.all():
+            sunlit = None
+        elif not sunlit.any():
+            return np.full(np.shape(ch7), np.nan)
+
+    refl39 = _lazy("Calculator")(
+        platform_name="GOES-16", instrument="abi", band="ch7"
+    )
+    if sunlit is None:
+        return refl39.reflectance_from_tbs(zenith, ch7, ch13)
+
+    # Only the sunlit pixels are corrected
+    refl = np.full(np.shape(ch7), np.nan)
+    refl[sunlit] = np.ma.filled(
+        refl39.reflectance_from_tbs(
+            zenith[sunlit], ch7[sunlit], ch13[sunlit]
+        ),
+        np.nan,
+    )
+    return refl
+
+
+#: Day Microphysics (min, max, gamma) of the red (channel 3 reflectance),
+#: green (channel 7 reflectance) and blue (channel 13 brightness
+#: temperature) components.
+DAY_MICROPHYSICS = (
+    (0.0, 1.0, 1.0),
+    (0.0, 0.6, 0.4),
+    (203.0, 323.0, 1.0),
+)
+
+
+@tracing.traced("goes.normalize_rgb")
+def normalize_rgb(R, G, B, out=None, dtype=None, chunk_rows=256):
+    """Normalize the Day Microphysics components into an RGB image.
+
+    Every component is scaled to [0, 1] with the ranges and gamma of
+    ``DAY_MICROPHYSICS`` and clipped, working in place over the output
+    array (or over a small scratch buffer, for integer outputs) so no
+    full size temporaries are created.
 
+    Parameters
+    ----------
+    R, G, B: ``numpy.array``
+        Trimmed channel 3, zenith corrected channel 7 and trimmed
+        channel 13, all of the same shape (rows, cols).
+    out: ``numpy.array``, optional
+        Array of shape (rows, cols, 3) where the RGB is written.
+    dtype: ``numpy.dtype``
+        Type of the RGB when ``out`` is not given. Float types hold
+        values in [0, 1]; numpy.uint8 quantizes them into [0, 255],
+        with NaN mapped to 0. Default: the precision, see
+        ``core.set_precision``.
+    chunk_rows: int
+        Rows processed on every step.
 
+    Returns
+    -------
+    RGB: ``numpy.array``
+        RGB image of shape (rows, cols, 3).
+    """
+    components = (R, G, B)
+    shape = np.shape(R)
+    if any(np.shape(comp) != shape for comp in components):
+        raise ValueError("R, G and B must have the same shape")
+
+    if out is None:
+        out = np.empty(shape + (3,), dtype=core.resolve_dtype(dtype))
+    elif out.shape != shape + (3,):
+        raise ValueError(f"out must have shape {shape + (3,)}")
+
+    quantize = not np.issubdtype(out.dtype, np.floating)
+    if quantize and out.dtype != np.uint8:
+        raise TypeError("RGB type must be a float type or numpy.uint8")
+    scratch = np.empty((min(chunk_rows, shape[0]), shape[1]), np.float32)
+
+    with np.errstate(invalid="ignore"):
+        for r0 in range(0, shape[0], chunk_rows):
+            rows = slice(r0, r0 + chunk_rows)
+            for i, (comp, (vmin, vmax, gamma)) in enumerate(
+                zip(components, DAY_MICROPHYSICS)
+            ):
+                if quantize:
+                    target = scratch[: len(comp[rows])]
+                else:
+                    target = out[rows, :, i]
+
+                np.subtract(comp[rows], vmin, out=target, casting="unsafe")
+                target /= vmax - vmin
+                if gamma != 1.0:
+                    np.power(target, gamma, out=target)
+                np.clip(target, 0.0, 1.0, out=target)
+
+                if quantize:
+                    target *= 255
+                    np.rint(target, out=target)
+                    np.nan_to_num(target, copy=False, nan=0.0)
+                    out[rows, :, i] = target
+
+    return out
+
+
+@tracing.traced("goes.mask")
 def mask(rgb):
     """Correct the RGB.
 
@@ -383,99 +1220,159 @@ def mask(rgb):
     Parameters
     ----------
     rgb: numpy array
-        Object containig the Day Microphysics RGB product.
+        Object containig the Day Microphysics RGB product, either float
+        (values in [0, 1]) or numpy.uint8 (values in [0, 255]).
 
     Returns
     -------
     img_mask: numpy array
-        Masked RGB.
+        Masked RGB, of the same type of the RGB.
     """
-    img_mask = np.zeros(rgb.shape)
+    img_mask = np.zeros(rgb.shape, dtype=rgb.dtype)
+
+    # Thresholds and colors are given for RGB values in [0, 1]
+    top = 255 if rgb.dtype == np.uint8 else 1.0
 
     # Large drops, Low clouds-> pink/magenta
-    lc_rfilter = rgb[:, :, 0] > 0.7  # R>0.8
-    lc_gfilter = rgb[:, :, 1] < 0.4  # G
-    lc_bfilter = rgb[:, :, 2] > 0.6  # B
+    lc_rfilter = rgb[:, :, 0] > 0.7 * top  # R>0.8
+    lc_gfilter = rgb[:, :, 1] < 0.4 * top  # G
+    lc_bfilter = rgb[:, :, 2] > 0.6 * top  # B
     lc_filter = lc_rfilter * lc_gfilter * lc_bfilter
 
     # Mask= magenta
-    img_mask[lc_filter, 0] = 1.0
+    img_mask[lc_filter, 0] = top
     img_mask[lc_filter, 1] = 0.0
-    img_mask[lc_filter, 2] = 1.0
+    img_mask[lc_filter, 2] = top
 
     # Stratus/Stratoculumus (small drops, low clouds) -> bright green/blue
-    st_rfilter = (rgb[:, :, 0] > 0.3) * (rgb[:, :, 0] < 0.45)  # R
-    st_gfilter = (rgb[:, :, 1] > 0.5) * (rgb[:, :, 1] < 0.8)  # G
-    st_bfilter = rgb[:, :, 2] < 0.7
+    st_rfilter = (rgb[:, :, 0] > 0.3 * top) * (rgb[:, :, 0] < 0.45 * top)  # R
+    st_gfilter = (rgb[:, :, 1] > 0.5 * top) * (rgb[:, :, 1] < 0.8 * top)  # G
+    st_bfilter = rgb[:, :, 2] < 0.7 * top
     st_filter = st_rfilter * st_gfilter * st_bfilter
 
     # Mask=Light blue
     img_mask[st_filter, 0] = 0.0
-    img_mask[st_filter, 1] = 1.0
-    img_mask[st_filter, 2] = 1.0
+    img_mask[st_filter, 1] = top
+    img_mask[st_filter, 2] = top
 
     # CumuloNimbis (high clouds) -> red, dark orange
-    cb_rfilter = rgb[:, :, 0] > 0.7  # R
-    cb_gfilter = rgb[:, :, 1] < 0.3  # G
-    cb_bfilter = rgb[:, :, 2] < 0.3  # B
+    cb_rfilter = rgb[:, :, 0] > 0.7 * top  # R
+    cb_gfilter = rgb[:, :, 1] < 0.3 * top  # G
+    cb_bfilter = rgb[:, :, 2] < 0.3 * top  # B
     cb_filter = cb_rfilter * cb_gfilter * cb_bfilter
 
     # Mask=Red
-    img_mask[cb_filter, 0] = 1.0
+    img_mask[cb_filter, 0] = top
     img_mask[cb_filter, 1] = 0.0
     img_mask[cb_filter, 2] = 0.0
 
     # Cirrus (high clouds)-> green, dark green
-    cr_rfilter = rgb[:, :, 0] < 0.3  # R
-    cr_gfilter = rgb[:, :, 1] > 0.7  # G
-    cr_bfilter = rgb[:, :, 2] < 0.3  # B
+    cr_rfilter = rgb[:, :, 0] < 0.3 * top  # R
+    cr_gfilter = rgb[:, :, 1] > 0.7 * top  # G
+    cr_bfilter = rgb[:, :, 2] < 0.3 * top  # B
     cr_filter = cr_rfilter * cr_gfilter * cr_bfilter
 
     # Mask= Green
     img_mask[cr_filter, 0] = 0.0
-    img_mask[cr_filter, 1] = 1.0
+    img_mask[cr_filter, 1] = top
     img_mask[cr_filter, 2] = 0.0
 
     # supercooled clouds Thick, small drops, medium clouds-> yellow
-    super_rfilter = rgb[:, :, 0] > 0.8
-    super_gfilter = rgb[:, :, 1] > 0.8
-    super_bfilter = rgb[:, :, 2] < 0.2  # amarillo
+    super_rfilter = rgb[:, :, 0] > 0.8 * top
+    super_gfilter = rgb[:, :, 1] > 0.8 * top
+    super_bfilter = rgb[:, :, 2] < 0.2 * top  # amarillo
     super_filter = super_rfilter * super_gfilter * super_bfilter
 
     # Mask=Yellow
-    img_mask[super_filter, 0] = 1.0
-    img_mask[super_filter, 1] = 1.0
+    img_mask[super_filter, 0] = top
+    img_mask[super_filter, 1] = top
     img_mask[super_filter, 2] = 0.0
 
-    return img_mask[:, :, [0, 1, 2]]
+    return img_mask
 
 
-def rgb2hsi(image):
+@tracing.traced("goes.rgb2hsi")
+def rgb2hsi(image, out=None, dtype=None, chunk_rows=256):
     """Convert a RGB image to a HSI image.
 
+    The image is processed in blocks of rows over a few reusable scratch
+    buffers, and the result is written in place into the output array.
+    Hue and saturation of gray pixels are 0.
+
     Parameters
     ----------
     image: ``numpy.array``
-        Numpy Array object containig a RGB image.
+        Numpy Array object containig a RGB image, either float
+        (values in [0, 1]) or numpy.uint8 (values in [0, 255]).
+    out: ``numpy.array``, optional
+        Array of the same shape of the image where HSI is written.
+    dtype: ``numpy.dtype``, optional
+        Float type of the computation and of the output when ``out``
+        is not given. By default, the type of float images or the
+        precision (see ``core.set_precision``).
+    chunk_rows: int
+        Rows processed on every step.
 
     Returns
     -------
     HSI: ``numpy.array``
         Image in HSI color system.
     """
-    R = image[:, :, 0]
-    G = image[:, :, 1]
-    B = image[:, :, 2]
-    dRG, dRB, dGB = R - G, R - B, G - B
-    aux = np.arccos(0.5 * (dRG + dRB) / ((dRG) ** 2 + dRB * dGB) ** 0.5)
-    aux[np.isnan(aux)] = 0.0
-    H1 = np.copy(aux)
-    H2 = 2 * np.pi - aux
-    H1[G < B] = 0
-    H2[G >= B] = 0
-    H = H1 + H2
-    Inten = (R + G + B) / 3.0
-    Sat = 1 - np.min(image, axis=2) / Inten
-    Sat[np.isnan(Sat)] = 0.0
-    Sat[Sat < 0] = 0.0
-    return np.stack([H, Sat, Inten], axis=2)
+    rows, cols, _ = image.shape
+    if dtype is None:
+        if out is not None:
+            dtype = out.dtype
+        elif np.issubdtype(image.dtype, np.floating):
+            dtype = image.dtype
+        else:
+            dtype = core.get_precision()
+    if out is None:
+        out = np.empty(image.shape, dtype=dtype)
+    elif out.shape != image.shape:
+        raise ValueError(f"out must have shape {image.shape}")
+
+    # Scratch buffers: R, G, B, three differences and one auxiliary
+    scratch = np.empty((7, min(chunk_rows, rows), cols), dtype=dtype)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for r0 in range(0, rows, chunk_rows):
+            n_rows = min(chunk_rows, rows - r0)
+            R, G, B, dRG, dRB, dGB, aux = scratch[:, :n_rows]
+            H, Sat, Inten = (out[r0 : r0 + n_rows, :, k] for k in range(3))
+
+            for k, comp in enumerate((R, G, B)):
+                np.copyto(comp, image[r0 : r0 + n_rows, :, k])
+                if image.dtype == np.uint8:
+                    comp /= 255
+
+            np.subtract(R, G, out=dRG)
+            np.subtract(R, B, out=dRB)
+            np.subtract(G, B, out=dGB)
+
+            # aux = arccos(0.5 (dRG + dRB) / sqrt(dRG^2 + dRB dGB))
+            dGB *= dRB
+            np.square(dRG, out=aux)
+            dGB += aux
+            np.sqrt(dGB, out=dGB)
+            np.add(dRG, dRB, out=aux)
+            aux *= 0.5
+            aux /= dGB
+            np.arccos(aux, out=aux)
+            np.fmax(aux, 0.0, out=aux)  # NaN -> 0
+
+            # Hue is aux if G >= B, else 2 pi - aux
+            np.subtract(2 * np.pi, aux, out=H)
+            np.copyto(H, aux, where=G >= B)
+
+            np.add(R, G, out=Inten)
+            Inten += B
+            Inten /= 3.0
+
+            # Sat = 1 - min(R, G, B) / Inten, with NaN and negatives -> 0
+            np.minimum(R, G, out=aux)
+            np.minimum(aux, B, out=aux)
+            aux /= Inten
+            np.subtract(1, aux, out=Sat)
+            np.fmax(Sat, 0.0, out=Sat)
+
+    return out
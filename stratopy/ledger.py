@@ -0,0 +1,152 @@
+r"""Module containing the ledger of resumable batch jobs."""
+
+import json
+import os
+import sqlite3
+import time
+
+import attr
+
+from .cli import STATUSES, Task
+
+#: Status of the tasks that didn't run yet.
+PENDING = "pending"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    name TEXT PRIMARY KEY,
+    goes TEXT NOT NULL,
+    cloudsat TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    seconds REAL,
+    outputs TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    updated REAL
+)
+"""
+
+
+@attr.s(frozen=True, repr=False)
+class Ledger:
+    """SQLite file recording the state of every task of a batch job.
+
+    Tasks are added once, and the result of every run is recorded as
+    soon as it's available, so a job that is interrupted can be started
+    again with the same tasks: completed tasks are skipped and only the
+    pending, failed and timed out ones run.
+
+    Attributes
+    ----------
+    path: ``str``
+        Path of the SQLite file, created if needed.
+    """
+
+    path = attr.ib(converter=os.fspath)
+    _conn = attr.ib(init=False)
+
+    @_conn.default
+    def _conn_default(self):
+        conn = sqlite3.connect(self.path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        with conn:
+            conn.execute(_SCHEMA)
+        return conn
+
+    def __repr__(self):
+        """repr(x) <=> x.__repr__()."""
+        counts = ", ".join(f"{n} {s}" for s, n in self.counts().items())
+        return f"<Ledger {self.path!r} {counts}>"
+
+    def __enter__(self):
+        """Use the ledger as a context manager that closes it."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the ledger."""
+        self.close()
+
+    def close(self):
+        """Close the SQLite file."""
+        self._conn.close()
+
+    def add(self, tasks):
+        """Add tasks as pending, keeping the state of the known ones."""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO tasks (name, goes, cloudsat, status)"
+                " VALUES (?, ?, ?, ?)",
+                [
+                    (task.name, ";".join(task.goes), task.cloudsat, PENDING)
+                    for task in tasks
+                ],
+            )
+
+    def record(self, result):
+        """Record the result (``cli.TaskResult``) of a run of a task."""
+        with self._conn:
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, attempts = attempts + 1,"
+                " seconds = ?, outputs = ?, error = ?, updated = ?"
+                " WHERE name = ?",
+                (
+                    result.status,
+                    result.seconds,
+                    json.dumps(list(result.outputs)),
+                    result.error,
+                    time.time(),
+                    result.name,
+                ),
+            )
+
+    def pending(self, max_attempts=None, verify=False):
+        """Tasks that have to run.
+
+        Parameters
+        ----------
+        max_attempts: int, optional
+            Tasks that already failed (or timed out) this number of times
+            are not retried.
+        verify: bool
+            If True, completed tasks whose outputs are missing run again.
+
+        Returns
+        -------
+        ``list`` of ``cli.Task``
+            Tasks in the order they were added.
+        """
+        rows = self._conn.execute(
+            "SELECT * FROM tasks WHERE status != 'done' OR ? ORDER BY rowid",
+            (verify,),
+        )
+        tasks = []
+        for row in rows:
+            if row["status"] == "done":
+                outputs = json.loads(row["outputs"])
+                if all(os.path.exists(path) for path in outputs):
+                    continue
+            elif max_attempts is not None and row["attempts"] >= max_attempts:
+                continue
+            goes = row["goes"].split(";")
+            tasks.append(Task(row["name"], goes, row["cloudsat"]))
+        return tasks
+
+    def get(self, name):
+        """State of a task, as a dictionary, or None if it's unknown."""
+        row = self._conn.execute(
+            "SELECT * FROM tasks WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            return None
+        state = dict(row)
+        state["outputs"] = json.loads(state["outputs"])
+        return state
+
+    def counts(self):
+        """Count the tasks of every status."""
+        counts = dict.fromkeys((PENDING,) + STATUSES, 0)
+        rows = self._conn.execute(
+            "SELECT status, COUNT(*) FROM tasks GROUP BY status"
+        )
+        counts.update(dict(rows.fetchall()))
+        return counts
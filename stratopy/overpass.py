@@ -0,0 +1,261 @@
+r"""Module containing the prefilter of CloudSat overpasses of GOES scenes."""
+
+import datetime
+import os
+import pathlib
+
+import attr
+
+from diskcache import Cache
+
+import numpy as np
+
+from .catalog import parse_cloudsat, parse_goes
+from .goes import _as_coordinates
+
+#: Default directory of the cache of tracks, next to the cache of ``IO``.
+DEFAULT_TRACKS_PATH = pathlib.Path(
+    os.path.expanduser(os.path.join("~", "stratopy_cache", "tracks"))
+)
+
+#: Name of CloudSat in TLE files.
+PLATFORM = "CLOUDSAT"
+
+
+def _to_datetime(time):
+    """Naive ``datetime.datetime`` of a ``numpy.datetime64``."""
+    return time.astype("datetime64[us]").item()
+
+
+@attr.s(frozen=True, repr=False)
+class Track:
+    """Summary of the ground track of a CloudSat granule.
+
+    A few points of the track (one every ~10 seconds, ~70 km), enough to
+    decide whether it crosses a region and when.
+
+    Attributes
+    ----------
+    granule: int
+        Number of the granule (orbit).
+    times: ``numpy.ndarray``
+        Times of the points, as ``datetime64[s]`` (UTC).
+    lat, lon: ``numpy.ndarray``
+        Coordinates of the points, in degrees.
+    """
+
+    granule = attr.ib()
+    times = attr.ib(converter=lambda t: np.asarray(t, "datetime64[s]"))
+    lat = attr.ib(converter=np.asarray)
+    lon = attr.ib(converter=np.asarray)
+
+    def __repr__(self):
+        """repr(x) <=> x.__repr__()."""
+        return f"<Track {self.granule}, {self.times.size} points>"
+
+    @classmethod
+    def from_frame(cls, frame, granule, step=64):
+        """Track of a read granule, from every ``step`` profiles.
+
+        Parameters
+        ----------
+        frame: ``cloudsat.CloudSatFrame`` or ``pandas.DataFrame``
+            Profiles of the granule, with "read_time", "Latitude" and
+            "Longitude" (see ``cloudsat.read_hdf``).
+        granule: int
+            Number of the granule.
+        step: int
+            Profiles between the points of the track. Profiles are ~0.16
+            seconds apart.
+        """
+        idx = np.unique(np.r_[np.arange(0, len(frame), step), len(frame) - 1])
+        idx = idx[idx >= 0]
+        return cls(
+            granule,
+            frame["read_time"].to_numpy()[idx],
+            frame["Latitude"].to_numpy()[idx],
+            frame["Longitude"].to_numpy()[idx],
+        )
+
+    @classmethod
+    def predict(cls, record, tle_file, step=10):
+        """Track of a granule predicted from the orbital elements.
+
+        Parameters
+        ----------
+        record: ``catalog.Record``
+            Granule, whose start and end are used.
+        tle_file: ``str``
+            File with the two-line elements of CloudSat near the time of
+            the granule.
+        step: int
+            Seconds between the points of the track.
+        """
+        from pyorbital.orbital import Orbital  # slow to import
+
+        orbit = Orbital(PLATFORM, tle_file=os.fspath(tle_file))
+        seconds = (record.end - record.start).total_seconds()
+        times = np.datetime64(record.start, "s") + np.arange(
+            0, seconds + step, step
+        ).astype("timedelta64[s]")
+        lon, lat, _ = orbit.get_lonlatalt(times)
+        return cls(record.granule, times, lat, lon)
+
+    def inside(self, coordinates, margin=0.0):
+        """Mask of the points inside a region.
+
+        Parameters
+        ----------
+        coordinates: ``tuple`` or ``str``
+            (lat_inf, lat_sup, lon_east, lon_west) or the name of a region
+            in ``goes.REGIONS``.
+        margin: float
+            Degrees added to every side of the region.
+        """
+        lat_inf, lat_sup, lon_east, lon_west = _as_coordinates(coordinates)
+        return (
+            (self.lat >= lat_inf - margin)
+            & (self.lat <= lat_sup + margin)
+            & (self.lon >= lon_west - margin)
+            & (self.lon <= lon_east + margin)
+        )
+
+    def overpass(self, coordinates, margin=0.0):
+        """First and last times of the track inside a region.
+
+        Returns
+        -------
+        ``tuple`` of ``datetime.datetime`` or None
+            None if the track never crosses the region.
+        """
+        times = self.times[self.inside(coordinates, margin)]
+        if not times.size:
+            return None
+        return _to_datetime(times.min()), _to_datetime(times.max())
+
+
+@attr.s(frozen=True)
+class Prefilter:
+    """Decide whether a granule sees a region during a scene, before fetching.
+
+    Granules are discarded first by their time bounds, from their names.
+    Then, the track of the granule decides whether it crosses the region
+    within ``tolerance`` of the scan of the scene: the summary of the
+    track remembered when the granule was read (see ``remember``) or,
+    with a ``tle_file``, the track predicted from the orbital elements.
+    Without a track, granules are kept.
+
+    Attributes
+    ----------
+    coordinates: ``tuple`` or ``str``
+        Region, as the coordinates of ``goes.Goes``.
+    tolerance: ``datetime.timedelta``
+        Maximum time between the overpass and the scan of the scene.
+    margin: float
+        Degrees added to every side of the region, for the spacing of
+        the points of the tracks.
+    tle_file: ``str``, optional
+        Two-line elements of CloudSat, for the orbit prediction.
+    path: ``str`` or path
+        Directory of the cache of tracks.
+    """
+
+    coordinates = attr.ib(
+        default=(-40.0, 10.0, -37.0, -80.0), converter=_as_coordinates
+    )
+    tolerance = attr.ib(default=datetime.timedelta(minutes=15))
+    margin = attr.ib(default=1.0)
+    tle_file = attr.ib(default=None)
+    path = attr.ib(default=DEFAULT_TRACKS_PATH, converter=os.fspath)
+    _cache = attr.ib(init=False, repr=False)
+
+    @_cache.default
+    def _cache_default(self):
+        return Cache(self.path)
+
+    def remember(self, granule, frame):
+        """Store the track of a read granule, for the following checks.
+
+        Parameters
+        ----------
+        granule: ``str`` or ``catalog.Record``
+            Path of the granule, or its record.
+        frame: ``cloudsat.CloudSatFrame``
+            Profiles of the granule.
+        """
+        record = _record(granule, parse_cloudsat)
+        track = Track.from_frame(frame, record.granule)
+        self._cache.set(("track", record.granule), track, retry=True)
+        return track
+
+    def track(self, granule):
+        """Track of a granule: remembered, predicted, or None."""
+        record = _record(granule, parse_cloudsat)
+        track = self._cache.get(("track", record.granule), retry=True)
+        if track is None and self.tle_file is not None:
+            track = Track.predict(record, self.tle_file)
+            self._cache.set(("track", record.granule), track, retry=True)
+        return track
+
+    def check(self, granule, scene):
+        """Whether a granule may cross the region during a scene.
+
+        Parameters
+        ----------
+        granule: ``str`` or ``catalog.Record``
+            Path of the CloudSat granule, or its record.
+        scene: ``str`` or ``catalog.Record``
+            Path of the GOES file, or its record.
+
+        Returns
+        -------
+        bool
+            False if the granule surely doesn't see the region within
+            ``tolerance`` of the scan, so it doesn't need to be fetched.
+        """
+        granule = _record(granule, parse_cloudsat)
+        scene = _record(scene, parse_goes)
+        start = scene.start - self.tolerance
+        end = (scene.end or scene.start) + self.tolerance
+        if not granule.overlaps(start, end):
+            return False
+
+        track = self.track(granule)
+        if track is None:
+            return True
+        passes = track.overpass(self.coordinates, self.margin)
+        return passes is not None and passes[0] <= end and passes[1] >= start
+
+    def pairs(self, granules, scenes):
+        """Pairs of granules and scenes that pass the check.
+
+        Parameters
+        ----------
+        granules, scenes: iterables of ``str`` or ``catalog.Record``
+            e.g. from ``catalog.Catalog.list_cloudsat`` and
+            ``catalog.Catalog.list_goes``.
+
+        Returns
+        -------
+        ``list`` of ``tuple``
+            (granule, scene) records.
+        """
+        granules = [_record(granule, parse_cloudsat) for granule in granules]
+        scenes = [_record(scene, parse_goes) for scene in scenes]
+        return [
+            (granule, scene)
+            for granule in granules
+            for scene in scenes
+            if self.check(granule, scene)
+        ]
+
+    def clear(self):
+        """Remove all the cached tracks."""
+        self._cache.clear(retry=True)
+
+
+def _record(path_or_record, parser):
+    """Record of a path, or the record itself."""
+    if isinstance(path_or_record, (str, os.PathLike)):
+        return parser(path_or_record)
+    return path_or_record
@@ -0,0 +1,247 @@
+r"""Module containing tiled and parallel processing tools."""
+
+import os
+from concurrent import futures
+from multiprocessing import shared_memory
+
+import attr
+
+import numpy as np
+
+
+@attr.s(frozen=True)
+class Tile:
+    """Rectangular piece of an image.
+
+    Attributes
+    ----------
+    rows, cols: ``slice``
+        Rows and columns of the tile in the image.
+    outer_rows, outer_cols: ``slice``
+        Rows and columns of the tile plus its halo, clipped to the image.
+    """
+
+    rows = attr.ib()
+    cols = attr.ib()
+    outer_rows = attr.ib()
+    outer_cols = attr.ib()
+
+    @property
+    def origin(self):
+        """(row, col) of the first pixel of the tile in the image."""
+        return self.rows.start, self.cols.start
+
+    @property
+    def crop(self):
+        """Slices selecting the tile from the tile plus its halo."""
+        r0, c0 = self.outer_rows.start, self.outer_cols.start
+        return (
+            slice(self.rows.start - r0, self.rows.stop - r0),
+            slice(self.cols.start - c0, self.cols.stop - c0),
+        )
+
+
+def iter_tiles(shape, tile_shape=(512, 512), halo=0):
+    """Split an image into tiles.
+
+    Parameters
+    ----------
+    shape: ``tuple``
+        (rows, cols) of the image.
+    tile_shape: ``tuple``
+        (rows, cols) of the tiles. Tiles on the borders may be smaller.
+    halo: int
+        Pixels added on every side of the tiles, for operations that
+        need the neighbourhood of each pixel.
+
+    Yields
+    ------
+    ``parallel.Tile``
+        Tiles in row major order.
+    """
+    rows, cols = shape
+    tile_rows, tile_cols = tile_shape
+    for r0 in range(0, rows, tile_rows):
+        r1 = min(r0 + tile_rows, rows)
+        for c0 in range(0, cols, tile_cols):
+            c1 = min(c0 + tile_cols, cols)
+            yield Tile(
+                rows=slice(r0, r1),
+                cols=slice(c0, c1),
+                outer_rows=slice(max(r0 - halo, 0), min(r1 + halo, rows)),
+                outer_cols=slice(max(c0 - halo, 0), min(c1 + halo, cols)),
+            )
+
+
+def _get_executor(executor, max_workers):
+    """Return (pool, owned) for an executor name or instance."""
+    if isinstance(executor, futures.Executor):
+        return executor, False
+    elif executor == "thread":
+        return futures.ThreadPoolExecutor(max_workers), True
+    elif executor == "process":
+        return futures.ProcessPoolExecutor(max_workers), True
+    raise ValueError("executor must be None, 'thread', 'process' or Executor")
+
+
+def map_tiles(
+    func,
+    arrays,
+    out,
+    tile_shape=(512, 512),
+    halo=0,
+    executor=None,
+    max_workers=None,
+    max_pending=None,
+    **kwargs,
+):
+    """Apply a function by tiles and stitch the results.
+
+    The images are split with ``iter_tiles`` and every tile (plus its
+    halo) is processed by ``func(tile, *blocks, **kwargs)``, which must
+    return an array with the shape of the blocks (and optionally more
+    trailing dimensions). The halo is cropped from the result and the
+    tile is written into ``out``.
+
+    Parameters
+    ----------
+    func: callable
+        Function applied to every tile. It must be picklable (e.g.
+        defined at module level) to run on processes.
+    arrays: ``tuple`` of ``numpy.array``
+        Images with the same (rows, cols).
+    out: ``numpy.array``
+        Preallocated output, of shape (rows, cols, ...).
+    tile_shape: ``tuple``
+        (rows, cols) of the tiles.
+    halo: int
+        Pixels added on every side of the tiles.
+    executor: None, "thread", "process" or ``concurrent.futures.Executor``
+        Where tiles are processed. None runs them serially, "thread" and
+        "process" create a pool of ``max_workers`` that is closed at the
+        end, and an executor instance is used as is.
+    max_workers: int, optional
+        Number of workers of the pool. Default: the number of CPUs.
+    max_pending: int, optional
+        Maximum tiles submitted to the executor and not yet written, so
+        inputs are not all copied at once when they are sent to
+        processes. Default: twice ``max_workers``.
+    kwargs:
+        Keyword arguments for ``func``.
+
+    Returns
+    -------
+    ``numpy.array``
+        The output array.
+    """
+    shape = arrays[0].shape[:2]
+    if any(arr.shape[:2] != shape for arr in arrays):
+        raise ValueError("All arrays must have the same rows and columns")
+    if out.shape[:2] != shape:
+        raise ValueError(f"out must have {shape} rows and columns")
+
+    def blocks(tile):
+        return [arr[tile.outer_rows, tile.outer_cols] for arr in arrays]
+
+    tiles = iter_tiles(shape, tile_shape, halo)
+    if executor is None:
+        for tile in tiles:
+            result = func(tile, *blocks(tile), **kwargs)
+            out[tile.rows, tile.cols] = result[tile.crop]
+        return out
+
+    pool, owned = _get_executor(executor, max_workers)
+    if max_pending is None:
+        max_pending = 2 * (max_workers or os.cpu_count() or 1)
+    pending = {}
+    try:
+        # Bound the tiles in flight
+        for tile in tiles:
+            if len(pending) >= max_pending:
+                done, _ = futures.wait(
+                    pending, return_when=futures.FIRST_COMPLETED
+                )
+                for fut in done:
+                    done_tile = pending.pop(fut)
+                    result = fut.result()
+                    out[done_tile.rows, done_tile.cols] = result[
+                        done_tile.crop
+                    ]
+            fut = pool.submit(func, tile, *blocks(tile), **kwargs)
+            pending[fut] = tile
+
+        for fut in futures.as_completed(pending):
+            tile = pending[fut]
+            out[tile.rows, tile.cols] = fut.result()[tile.crop]
+    finally:
+        if owned:
+            pool.shutdown(cancel_futures=True)
+
+    return out
+
+
+@attr.s(frozen=True, repr=False)
+class SharedArray:
+    """Numpy array stored in a shared memory block.
+
+    Pickling a SharedArray only sends the name, shape and type of the
+    block, and unpickling it (e.g. in a worker process) attaches to the
+    same memory instead of copying the data. The process that created
+    the block must ``unlink`` it when it's no longer needed.
+
+    Attributes
+    ----------
+    array: ``numpy.array``
+        View of the shared memory block.
+    """
+
+    _shm = attr.ib()
+    shape = attr.ib(converter=tuple)
+    dtype = attr.ib(converter=np.dtype)
+    owner = attr.ib(default=False)
+    array = attr.ib(init=False)
+
+    @array.default
+    def _array_default(self):
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    @classmethod
+    def from_array(cls, array):
+        """Copy an array into a new shared memory block."""
+        array = np.asarray(array)
+        size = max(array.nbytes, 1)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        shared = cls(shm, array.shape, array.dtype, owner=True)
+        shared.array[...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, name, shape, dtype):
+        """Attach to an existing shared memory block."""
+        try:
+            # Only the creator tracks (and unlinks) the block
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13, workers share the tracker
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, shape, dtype)
+
+    @property
+    def name(self):
+        """Name of the shared memory block."""
+        return self._shm.name
+
+    def __repr__(self):
+        """repr(x) <=> x.__repr__()."""
+        return f"<SharedArray {self.name} {self.shape} {self.dtype}>"
+
+    def __reduce__(self):
+        """Pickle only the reference to the shared memory block."""
+        return (type(self).attach, (self.name, self.shape, self.dtype.str))
+
+    def close(self):
+        """Close access to the block from this object."""
+        self._shm.close()
+
+    def unlink(self):
+        """Release the shared memory block (only from its creator)."""
+        self._shm.unlink()
@@ -0,0 +1,167 @@
+r"""Module containing the cache of derived products (trimmed images, RGB)."""
+
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+
+import attr
+
+import numpy as np
+
+#: Version of the algorithms of the derived products. Increase it when a
+#: change alters the products, so older cached products are not used.
+ALGORITHM_VERSION = 1
+
+#: Default directory of the cache, next to the cache of ``IO``.
+DEFAULT_PRODUCTS_PATH = pathlib.Path(
+    os.path.expanduser(os.path.join("~", "stratopy_cache", "products"))
+)
+
+#: Name of the file of entries holding a single array.
+_ARRAY = "array"
+
+
+@attr.s(frozen=True)
+class ProductCache:
+    """Directory of derived arrays stored as memory-mappable .npy files.
+
+    Every entry is a directory named after the hash of its key, with one
+    .npy file per array, so cached products are read memory-mapped (and
+    read-only) instead of being loaded. When the entries exceed
+    ``size_limit``, the least recently used are removed.
+
+    Entries are written to a temporary directory and renamed, so several
+    processes can share the cache.
+
+    Attributes
+    ----------
+    path: ``str`` or path
+        Directory of the cache, created if needed.
+    size_limit: int
+        Maximum size of the entries, in bytes.
+    """
+
+    path = attr.ib(default=DEFAULT_PRODUCTS_PATH, converter=pathlib.Path)
+    size_limit = attr.ib(default=2 ** 30)
+
+    def __attrs_post_init__(self):
+        """Create the directory of the cache."""
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(**parts):
+        """Key of a product, from its scene, stage, parameters, etc.
+
+        The algorithm version is always part of the key.
+        """
+        parts = dict(parts, version=ALGORITHM_VERSION)
+        text = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    def _entry(self, key):
+        return self.path / key
+
+    def get(self, key):
+        """Get a product, or None if it's not in the cache.
+
+        Returns
+        -------
+        ``numpy.memmap`` or ``dict`` of ``numpy.memmap``
+            The array, or arrays by name, as they were stored.
+        """
+        entry = self._entry(key)
+        try:
+            names = sorted(path.stem for path in entry.glob("*.npy"))
+            arrays = {
+                name: np.load(entry / f"{name}.npy", mmap_mode="r")
+                for name in names
+            }
+            os.utime(entry)  # most recently used
+        except FileNotFoundError:  # evicted meanwhile
+            return None
+        if not arrays:
+            return None
+        return arrays[_ARRAY] if names == [_ARRAY] else arrays
+
+    def put(self, key, product):
+        """Store a product, an array or a dict of arrays by name.
+
+        Returns
+        -------
+        ``numpy.memmap`` or ``dict`` of ``numpy.memmap``
+            The stored product, as ``get`` returns it.
+        """
+        arrays = product if isinstance(product, dict) else {_ARRAY: product}
+        if not arrays or _ARRAY in arrays and len(arrays) > 1:
+            raise ValueError(f"Invalid names of arrays {list(arrays)}")
+
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.path)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(array))
+            os.rename(tmp, self._entry(key))
+        except OSError:
+            # Stored by another process meanwhile
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not self._entry(key).exists():
+                raise
+        self.evict(keep=key)
+        return self.get(key)
+
+    def get_or_compute(self, key, func, *args, **kwargs):
+        """Get a product, computing and storing it if it's not cached."""
+        product = self.get(key)
+        if product is None:
+            product = self.put(key, func(*args, **kwargs))
+        return product
+
+    def _entries(self):
+        """(last use, size, path) of every entry, oldest first."""
+        entries = []
+        for entry in self.path.iterdir():
+            if entry.name.startswith(".tmp-"):
+                continue
+            try:
+                size = sum(path.stat().st_size for path in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except FileNotFoundError:
+                continue
+        return sorted(entries)
+
+    def size(self):
+        """Size of the entries, in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, keep=None):
+        """Remove the least recently used entries over the size limit.
+
+        Parameters
+        ----------
+        keep: ``str``, optional
+            Key of an entry that is never removed, e.g. the last stored.
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.size_limit:
+                break
+            if entry.name != keep:
+                self._remove(entry)
+                total -= size
+
+    def _remove(self, entry):
+        # Rename first, so entries are never read half removed
+        trash = tempfile.mkdtemp(prefix=".tmp-", dir=self.path)
+        try:
+            os.rename(entry, os.path.join(trash, entry.name))
+        except OSError:  # removed by another process
+            pass
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def clear(self):
+        """Remove all the entries."""
+        for _, _, entry in self._entries():
+            self._remove(entry)
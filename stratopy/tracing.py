@@ -0,0 +1,295 @@
+r"""Module containing tracing tools for the processing stages."""
+
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+import attr
+
+#: Sinks that receive every finished span. Tracing is disabled (and
+#: spans cost a single check) while it's empty.
+_SINKS = []
+
+#: Open spans of every thread.
+_LOCAL = threading.local()
+
+
+def _is_main_thread():
+    """Whether the current thread is the main thread."""
+    return threading.current_thread() is threading.main_thread()
+
+
+def _stack():
+    """Open spans of the current thread, innermost last."""
+    if not hasattr(_LOCAL, "stack"):
+        _LOCAL.stack = []
+    return _LOCAL.stack
+
+
+@attr.s(repr=False)
+class Span:
+    """Measures of a named stage of the processing.
+
+    Spans are created with ``span`` and ``traced``, and sent to the sinks
+    when they finish.
+
+    Attributes
+    ----------
+    name: ``str``
+        Name of the stage, e.g. "goes.trim".
+    attrs: ``dict``
+        Extra values of the stage, e.g. the channel.
+    parent: ``str`` or None
+        Name of the enclosing span, if any.
+    depth: int
+        Number of enclosing spans.
+    start: float
+        Start time, in seconds since the epoch.
+    wall, cpu: float
+        Elapsed and CPU (of the process) time, in seconds.
+    bytes_read: int
+        Bytes read from files in the stage, including inner spans.
+    peak_memory: int or None
+        Peak of memory allocated in the stage over the memory at its
+        start, in bytes. Only measured while ``tracemalloc`` is tracing,
+        see ``trace``, and for spans of the main thread: the peak of
+        ``tracemalloc`` is shared by the whole process, so spans of other
+        threads can't restart it without spoiling the others. Memory
+        allocated by other threads during a span is counted in its peak.
+    """
+
+    name = attr.ib()
+    attrs = attr.ib(factory=dict)
+    parent = attr.ib(default=None)
+    depth = attr.ib(default=0)
+    start = attr.ib(default=None)
+    wall = attr.ib(default=None)
+    cpu = attr.ib(default=None)
+    bytes_read = attr.ib(default=0)
+    peak_memory = attr.ib(default=None)
+    _marks = attr.ib(factory=dict)
+
+    def __repr__(self):
+        """repr(x) <=> x.__repr__()."""
+        return f"<Span {self.name!r} wall={self.wall} cpu={self.cpu}>"
+
+    def __enter__(self):
+        """Start measuring the stage."""
+        stack = _stack()
+        if stack:
+            self.parent, self.depth = stack[-1].name, len(stack)
+        if tracemalloc.is_tracing() and _is_main_thread():
+            current, peak = tracemalloc.get_traced_memory()
+            # Keep the peak of the enclosing span before restarting it
+            if stack:
+                stack[-1]._raise_peak(peak)
+            tracemalloc.reset_peak()
+            self._marks["memory"] = current
+            self._marks["peak"] = current
+        stack.append(self)
+        self.start = time.time()
+        self._marks["wall"] = time.perf_counter()
+        self._marks["cpu"] = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Stop measuring the stage and send it to the sinks."""
+        self.wall = time.perf_counter() - self._marks["wall"]
+        self.cpu = time.process_time() - self._marks["cpu"]
+        stack = _stack()
+        stack.remove(self)
+        if "memory" in self._marks and tracemalloc.is_tracing():
+            self._raise_peak(tracemalloc.get_traced_memory()[1])
+            self.peak_memory = self._marks["peak"] - self._marks["memory"]
+            if stack:
+                stack[-1]._raise_peak(self._marks["peak"])
+        if stack:
+            stack[-1].bytes_read += self.bytes_read
+        for sink in list(_SINKS):
+            sink(self)
+        return False
+
+    def _raise_peak(self, peak):
+        self._marks["peak"] = max(self._marks.get("peak", 0), peak)
+
+    def to_dict(self):
+        """Span as a dictionary of plain values."""
+        return attr.asdict(
+            self, filter=lambda field, _: not field.name.startswith("_")
+        )
+
+
+class _NullSpan:
+    """Span returned while tracing is disabled, that does nothing."""
+
+    bytes_read = 0
+
+    def __enter__(self):
+        """Do nothing."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Do nothing."""
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def is_enabled():
+    """Whether there are sinks receiving spans."""
+    return bool(_SINKS)
+
+
+def span(name, **attrs):
+    """Measure a stage of the processing.
+
+    Parameters
+    ----------
+    name: ``str``
+        Name of the stage.
+    attrs:
+        Extra values stored in the span.
+
+    Returns
+    -------
+    ``tracing.Span``
+        Context manager measuring the code it encloses. While tracing is
+        disabled, a shared object that does nothing.
+
+    Examples
+    --------
+    >>> with tracing.span("goes.trim", channel="M3C03"):
+    ...     image = goes_obj.trim()
+    """
+    if not _SINKS:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+
+def traced(name):
+    """Decorate a function to measure every call in a span."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _SINKS:
+                return func(*args, **kwargs)
+            with Span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def add_bytes(nbytes):
+    """Add bytes read from files to the current span, if any."""
+    if _SINKS:
+        stack = _stack()
+        if stack:
+            stack[-1].bytes_read += int(nbytes)
+
+
+def add_sink(sink):
+    """Send finished spans to a sink, a callable that takes a span."""
+    _SINKS.append(sink)
+
+
+def remove_sink(sink):
+    """Stop sending spans to a sink."""
+    _SINKS.remove(sink)
+
+
+@contextlib.contextmanager
+def trace(*sinks, memory=False):
+    """Enable tracing in a block of code.
+
+    Parameters
+    ----------
+    sinks: callable
+        Sinks receiving the spans of the block, e.g. ``LoggingSink()``,
+        ``JSONLinesSink(path)`` or ``list.append``.
+    memory: bool
+        If True, ``tracemalloc`` is started (if it's not tracing) to
+        measure the peak memory of every span. Tracing memory slows down
+        allocations.
+
+    Examples
+    --------
+    >>> spans = []
+    >>> with tracing.trace(spans.append):
+    ...     goes_obj.RGB
+    """
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    for sink in sinks:
+        add_sink(sink)
+    try:
+        yield
+    finally:
+        for sink in sinks:
+            remove_sink(sink)
+        if started:
+            tracemalloc.stop()
+
+
+@attr.s(frozen=True)
+class LoggingSink:
+    """Sink that logs every span.
+
+    Attributes
+    ----------
+    logger: ``logging.Logger``
+        Default: the "stratopy.tracing" logger.
+    level: int
+        Level of the records.
+    """
+
+    logger = attr.ib(factory=lambda: logging.getLogger(__name__))
+    level = attr.ib(default=logging.INFO)
+
+    def __call__(self, span):
+        """Log a span."""
+        self.logger.log(
+            self.level,
+            "%s%s wall=%.4fs cpu=%.4fs bytes_read=%d peak_memory=%s %s",
+            "  " * span.depth,
+            span.name,
+            span.wall,
+            span.cpu,
+            span.bytes_read,
+            span.peak_memory,
+            span.attrs or "",
+        )
+
+
+@attr.s(frozen=True)
+class JSONLinesSink:
+    """Sink that appends every span to a JSON lines file.
+
+    Attributes
+    ----------
+    path: ``str`` or path
+        File where spans are appended, one JSON object per line.
+    """
+
+    path = attr.ib(converter=os.fspath)
+    _lock = attr.ib(init=False, factory=threading.Lock, eq=False)
+
+    def __call__(self, span):
+        """Append a span to the file."""
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, "a") as fp:
+            fp.write(line + "\n")
+
+
+# Traces of a whole run, e.g. STRATOPY_TRACE=spans.jsonl
+if os.environ.get("STRATOPY_TRACE"):
+    add_sink(JSONLinesSink(os.environ["STRATOPY_TRACE"]))
@@ -0,0 +1,221 @@
+r"""Module containing writers of merged frames and images to disk."""
+
+import os
+import pathlib
+
+from netCDF4 import Dataset, date2num
+
+import numpy as np
+
+import pandas as pd
+
+from . import cloudsat
+
+#: Units of the time coordinate of the image stores.
+TIME_UNITS = "seconds since 2000-01-01 12:00:00"
+
+#: Name of the merged neighbourhoods column, see ``core.merge``.
+TENSOR_COLUMN = "goes_vec"
+
+
+def _import_pyarrow():
+    """Import pyarrow, which is only needed by the Parquet writers."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:  # pragma: no cover
+        raise ImportError(
+            "Parquet support requires pyarrow: pip install pyarrow"
+        )
+    return pa, pq
+
+
+def _sidecar_path(path):
+    """Path of the array stored along with a Parquet file."""
+    path = pathlib.Path(path)
+    return path.with_name(f"{path.name}.{TENSOR_COLUMN}.npy")
+
+
+def to_parquet(
+    frame, path, tensor=None, sidecar=False, compression="zstd", **kwargs
+):
+    """Write a merged frame to a Parquet file.
+
+    Object columns of ``core.merge`` are stored as plain columns: the
+    (col, row) tuples as two integer columns and the neighbourhoods
+    (the "goes_vec" column or the array of ``merge(as_tensor=True)``) as
+    a fixed size list column, or as a .npy file next to the Parquet file.
+    In both cases the shape of the neighbourhoods is kept in the metadata
+    of the file. See ``read_parquet``.
+
+    Parameters
+    ----------
+    frame: ``pandas.DataFrame`` or ``cloudsat.CloudSatFrame``
+        Merged frame.
+    path: ``str`` or path
+        Path of the Parquet file.
+    tensor: ``numpy.array``, optional
+        Neighbourhoods of shape (rows, size, size, bands) aligned with
+        the frame. By default, the "goes_vec" column, if any.
+    sidecar: bool
+        If True, neighbourhoods are written to "<path>.goes_vec.npy",
+        which can be read memory-mapped, instead of into the Parquet file.
+    compression: ``str``
+        Parquet compression codec.
+    kwargs:
+        Keyword arguments for ``pyarrow.parquet.write_table``.
+    """
+    pa, pq = _import_pyarrow()
+    if isinstance(frame, cloudsat.CloudSatFrame):
+        frame = frame._data
+    frame = pd.DataFrame(frame)
+
+    if tensor is None and TENSOR_COLUMN in frame:
+        tensor = np.stack(frame[TENSOR_COLUMN].to_numpy())
+    frame = frame.drop(columns=TENSOR_COLUMN, errors="ignore")
+    if tensor is not None and len(tensor) != len(frame):
+        raise ValueError("tensor must have one row per row of the frame")
+
+    if "col_row" in frame:
+        col_row = np.array(frame["col_row"].tolist(), dtype=int)
+        col, row = col_row.reshape(-1, 2).T
+        frame = frame.drop(columns="col_row").assign(col=col, row=row)
+
+    table = pa.Table.from_pandas(frame)
+    metadata = dict(table.schema.metadata or {})
+    if tensor is not None:
+        tensor = np.ascontiguousarray(tensor)
+        metadata[b"stratopy_tensor_shape"] = ",".join(
+            str(dim) for dim in tensor.shape[1:]
+        ).encode()
+        if sidecar:
+            np.save(_sidecar_path(path), tensor)
+        else:
+            values = pa.array(tensor.reshape(-1))
+            column = pa.FixedSizeListArray.from_arrays(
+                values, int(np.prod(tensor.shape[1:]))
+            )
+            table = table.append_column(TENSOR_COLUMN, column)
+    table = table.replace_schema_metadata(metadata)
+
+    pq.write_table(table, path, compression=compression, **kwargs)
+
+
+def read_parquet(path, columns=None, mmap_mode="r"):
+    """Read a merged frame written with ``to_parquet``.
+
+    Parameters
+    ----------
+    path: ``str`` or path
+        Path of the Parquet file.
+    columns: ``list``, optional
+        Columns to read, apart from the neighbourhoods.
+    mmap_mode: ``str`` or None
+        Memory-map mode of the .npy file of neighbourhoods, if any.
+
+    Returns
+    -------
+    ``tuple``
+        (frame, tensor) where tensor is None if the file has no
+        neighbourhoods.
+    """
+    pa, pq = _import_pyarrow()
+    schema = pq.read_schema(path)
+    shape = (schema.metadata or {}).get(b"stratopy_tensor_shape")
+    has_column = TENSOR_COLUMN in schema.names
+
+    if columns is not None and has_column:
+        columns = list(columns) + [TENSOR_COLUMN]
+    table = pq.read_table(path, columns=columns)
+
+    tensor = None
+    if shape is not None:
+        shape = tuple(int(dim) for dim in shape.decode().split(","))
+        if has_column:
+            column = table.column(TENSOR_COLUMN).combine_chunks()
+            tensor = column.flatten().to_numpy().reshape((-1,) + shape)
+            table = table.drop([TENSOR_COLUMN])
+        else:
+            tensor = np.load(_sidecar_path(path), mmap_mode=mmap_mode)
+
+    return table.to_pandas(), tensor
+
+
+def write_images(
+    path, time, chunks=(256, 256), complevel=4, attrs=None, **images
+):
+    """Write images to a compressed netCDF store, appending by time.
+
+    Every image is a variable of dimensions (time, y, x) or (time, y, x,
+    <name>_band), chunked by (1, chunks, bands) and compressed, so small
+    windows of a single time can be read without decompressing whole
+    images. If the file exists, the images are appended as a new time
+    step, and they must have the shapes and variables of the store.
+
+    Parameters
+    ----------
+    path: ``str`` or path
+        Path of the netCDF file.
+    time: ``datetime.datetime``
+        Time of the images, e.g. the date of a Goes object.
+    chunks: ``tuple``
+        (rows, cols) of the chunks.
+    complevel: int
+        zlib compression level, from 1 to 9.
+    attrs: ``dict``, optional
+        Global attributes, written when the file is created.
+    images: ``numpy.array``
+        Images by variable name, of shape (rows, cols) or (rows, cols,
+        bands), e.g. ``RGB=goes_obj.RGB, mask=goes.mask(goes_obj.RGB)``.
+
+    Returns
+    -------
+    int
+        Index of the time step written.
+    """
+    if not images:
+        raise ValueError("At least one image is needed")
+    images = {name: np.asarray(img) for name, img in images.items()}
+    shape = next(iter(images.values())).shape[:2]
+    if any(img.shape[:2] != shape for img in images.values()):
+        raise ValueError("All images must have the same rows and columns")
+
+    mode = "a" if os.path.exists(path) else "w"
+    with Dataset(path, mode) as store:
+        if mode == "w":
+            store.setncatts(attrs or {})
+            store.createDimension("time", None)
+            store.createDimension("y", shape[0])
+            store.createDimension("x", shape[1])
+            store.createVariable("time", "f8", ("time",)).units = TIME_UNITS
+
+        if (len(store.dimensions["y"]), len(store.dimensions["x"])) != shape:
+            raise ValueError(f"Images of {path} have another shape")
+        variables = set(store.variables) - {"time"}
+        if mode == "a" and variables != set(images):
+            raise ValueError(f"{path} stores the images {sorted(variables)}")
+
+        index = len(store.dimensions["time"])
+        store["time"][index] = date2num(time, TIME_UNITS)
+        for name, img in images.items():
+            if name not in store.variables:
+                dims = ("time", "y", "x")
+                chunksizes = (1,) + tuple(
+                    min(chunk, size) for chunk, size in zip(chunks, shape)
+                )
+                if img.ndim == 3:
+                    store.createDimension(f"{name}_band", img.shape[2])
+                    dims += (f"{name}_band",)
+                    chunksizes += (img.shape[2],)
+                store.createVariable(
+                    name,
+                    img.dtype,
+                    dims,
+                    zlib=True,
+                    complevel=complevel,
+                    shuffle=True,
+                    chunksizes=chunksizes,
+                )
+            store[name][index] = img
+
+    return index
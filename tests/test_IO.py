@@ -1,13 +1,19 @@
+import datetime
+import hashlib
 import io
 import os
 import pathlib
 from unittest import mock
 
+from diskcache import Cache
 from diskcache.core import ENOVAL
 
 from pandas import DataFrame
 
+import pytest
+
 from stratopy import IO
+from stratopy.catalog import Catalog
 from stratopy.cloudsat import CloudSatFrame, read_hdf
 from stratopy.goes import Goes, read_nc
 
@@ -53,7 +59,7 @@ def test_cache_cloudsat():
             CLOUDSAT_SERVER_DIR, user=None, passwd=None
         )
         cache_get.assert_called_with(
-            "2019002175851", default=ENOVAL, retry=True
+            "2019002175851", default=ENOVAL, read=True, retry=True
         )
 
     assert isinstance(
@@ -75,7 +81,7 @@ def test_cache_goes():
     ) as cache_get:
         goes_frame = IO.fetch_goes(GOES_SERVER_DIR)
         cache_get.assert_called_with(
-            "20190021800363", default=ENOVAL, retry=True
+            "20190021800363", default=ENOVAL, read=True, retry=True
         )
 
     assert isinstance(
@@ -85,27 +91,26 @@ def test_cache_goes():
 
 
 @mock.patch("stratopy.IO.FTP")
-@mock.patch("diskcache.Cache.set")
-@mock.patch("io.BytesIO")
-def test_fetch_cloudsat_patched(mock_buffer, mock_cache, mock_ftp_constructor):
+def test_fetch_cloudsat_patched(mock_ftp_constructor, tmp_path):
     mock_ftp = mock_ftp_constructor.return_value
 
-    # open cloudsat file and store binary
-    with open(PATH_CLOUDSAT, "rb") as binary_stream:
-        cls_binary = binary_stream.read()
-
-    # Mock memory buffered binary stream from server
-    mock_buffer.return_value.getvalue.return_value = cls_binary
+    # Mock the data connection streaming the cloudsat file
+    conn = mock_ftp.transfercmd.return_value.__enter__.return_value
+    conn.makefile.return_value = open(PATH_CLOUDSAT, "rb")
+    mock_ftp.size.return_value = os.path.getsize(PATH_CLOUDSAT)
 
-    # Call function with mocked connection and cache
+    # Call function with mocked connection
     cloudsat_frame = IO.fetch_cloudsat(
-        CLOUDSAT_SERVER_DIR, user=None, passwd=None
+        CLOUDSAT_SERVER_DIR, user=None, passwd=None, path=tmp_path
     )
 
     # Check if mocked instances were called
     mock_ftp.connect.assert_called_with(host="ftp.cloudsat.cira.colostate.edu")
     mock_ftp.login.assert_called_with(None, None)
-    mock_cache.assert_called()
+    mock_ftp.transfercmd.assert_called_with(
+        f"RETR {CLOUDSAT_SERVER_DIR}", rest=None
+    )
+    assert "2019002175851" in Cache(str(tmp_path))
 
     assert isinstance(
         cloudsat_frame,
@@ -114,21 +119,174 @@ def test_fetch_cloudsat_patched(mock_buffer, mock_cache, mock_ftp_constructor):
 
 
 @mock.patch("s3fs.S3FileSystem")
-@mock.patch("diskcache.Cache.set")
-def test_fetch_goes_patched(mock_cache, mock_s3):
+def test_fetch_goes_patched(mock_s3, tmp_path):
     # Mock open method of s3 module
     mock_s3.return_value.open.return_value = open(PATH_GOES, "rb")
 
-    # Call function with mocked connection and cache
-    goes_frame = IO.fetch_goes(GOES_SERVER_DIR)
+    # Call function with mocked connection
+    goes_frame = IO.fetch_goes(GOES_SERVER_DIR, path=tmp_path)
 
     # Check if mocked instances were called
     mock_s3.return_value.open.assert_called_with(GOES_SERVER_DIR, "rb")
-    mock_cache.assert_called()
+    assert "20190021800363" in Cache(str(tmp_path))
 
     assert isinstance(goes_frame, Goes)
 
 
+@mock.patch("stratopy.IO.read_nc")
+@mock.patch("s3fs.S3FileSystem")
+def test_fetch_goes_streaming(mock_s3, mock_read_nc, tmp_path):
+    payload = os.urandom(3 * IO.BLOCK_SIZE + 5)
+    contents = []
+
+    def read_nc(paths, **kwargs):
+        assert os.path.basename(paths[0]) == os.path.basename(GOES_SERVER_DIR)
+        with open(paths[0], "rb") as fp:
+            contents.append(fp.read())
+
+    readers = []
+
+    def open_object(dirname, mode):
+        reader = mock.MagicMock(size=len(payload))
+        reader.__enter__.return_value = reader
+        reader.read.side_effect = io.BytesIO(payload).read
+        readers.append(reader)
+        return reader
+
+    mock_read_nc.side_effect = read_nc
+    mock_s3.return_value.open.side_effect = open_object
+
+    IO.fetch_goes(GOES_SERVER_DIR, path=tmp_path)
+    IO.fetch_goes(GOES_SERVER_DIR, path=tmp_path)
+    assert contents == [payload, payload]
+    assert mock_s3.return_value.open.call_count == 1
+
+    # Reads are bounded by the block size
+    sizes = [call.args[0] for call in readers[0].read.call_args_list]
+    assert sizes and max(sizes) == IO.BLOCK_SIZE
+
+    # Corrupted files are downloaded again when verified
+    with Cache(str(tmp_path)) as cache:
+        assert cache[("20190021800363", "sha256")] == (
+            hashlib.sha256(payload).hexdigest()
+        )
+        with cache.get("20190021800363", read=True) as fp:
+            name = fp.name
+    with open(name, "r+b") as fp:
+        fp.write(b"corrupted")
+    IO.fetch_goes(GOES_SERVER_DIR, path=tmp_path)
+    assert mock_s3.return_value.open.call_count == 1
+    IO.fetch_goes(GOES_SERVER_DIR, path=tmp_path, verify=True)
+    assert mock_s3.return_value.open.call_count == 2
+    assert contents[-1] == payload
+
+    # Truncated downloads are not cached
+    payload = payload[:-10]
+    readers[0].size = len(payload) + 10
+    mock_s3.return_value.open.side_effect = lambda *args: readers[0]
+    readers[0].read.side_effect = io.BytesIO(payload).read
+    Cache(str(tmp_path)).clear()
+    with pytest.raises(IOError):
+        IO.fetch_goes(GOES_SERVER_DIR, path=tmp_path)
+    assert "20190021800363" not in Cache(str(tmp_path))
+
+
+class FlakyFile(io.BytesIO):
+    """Remote file whose connections drop every ``drop`` bytes."""
+
+    def __init__(self, payload, drop):
+        super().__init__(payload)
+        self.size = len(payload)
+        self.drop = drop
+        self.starts = []
+
+    def seek(self, offset, whence=0):
+        self.starts.append(offset)
+        self.sent = 0
+        return super().seek(offset, whence)
+
+    def read(self, size=-1):
+        if self.sent >= self.drop:
+            raise ConnectionResetError("Connection dropped")
+        size = self.drop - self.sent if size < 0 else size
+        chunk = super().read(min(size, self.drop - self.sent))
+        self.sent += len(chunk)
+        return chunk
+
+    def close(self):
+        pass
+
+
+@mock.patch("stratopy.IO.read_hdf")
+@mock.patch("stratopy.IO.FTP")
+def test_fetch_cloudsat_resume(mock_ftp_constructor, mock_read_hdf, tmp_path):
+    payload = os.urandom(IO.BLOCK_SIZE * 2 + 100)
+    remote = FlakyFile(payload, drop=IO.BLOCK_SIZE)
+    mock_ftp = mock_ftp_constructor.return_value
+    mock_ftp.size.return_value = len(payload)
+
+    def transfercmd(cmd, rest=None):
+        # Data connection with the file from the REST offset
+        remote.seek(rest or 0)
+        conn = mock.MagicMock()
+        conn.__enter__.return_value.makefile.return_value = remote
+        return conn
+
+    mock_ftp.transfercmd.side_effect = transfercmd
+    mock_read_hdf.side_effect = lambda path: open(path, "rb").read()
+
+    retry = IO.Retry(attempts=3, backoff=0.0)
+    with mock.patch("time.sleep") as sleep:
+        content = IO.fetch_cloudsat(
+            CLOUDSAT_SERVER_DIR, None, None, path=tmp_path, retry=retry
+        )
+    assert content == payload
+    assert remote.starts == [0, IO.BLOCK_SIZE, 2 * IO.BLOCK_SIZE]
+    assert mock_ftp.login.call_count == 3
+    assert sleep.call_count == 2
+    assert os.listdir(tmp_path / "partial") == []
+
+    # Out of attempts, the partial download is kept for the next fetch
+    remote = FlakyFile(payload, drop=IO.BLOCK_SIZE)
+    Cache(str(tmp_path)).clear()
+    retry = IO.Retry(attempts=2, backoff=0.0)
+    with pytest.raises(ConnectionResetError):
+        IO.fetch_cloudsat(
+            CLOUDSAT_SERVER_DIR, None, None, path=tmp_path, retry=retry
+        )
+    part = tmp_path / "partial" / "2019002175851.part"
+    assert part.stat().st_size == 2 * IO.BLOCK_SIZE
+
+    content = IO.fetch_cloudsat(CLOUDSAT_SERVER_DIR, None, None, path=tmp_path)
+    assert content == payload
+    assert remote.starts == [0, IO.BLOCK_SIZE, 2 * IO.BLOCK_SIZE]
+
+
+@mock.patch("stratopy.IO.read_nc")
+@mock.patch("s3fs.S3FileSystem")
+def test_fetch_goes_resume(mock_s3, mock_read_nc, tmp_path):
+    payload = os.urandom(IO.BLOCK_SIZE * 3)
+    remote = FlakyFile(payload, drop=2 * IO.BLOCK_SIZE)
+    mock_s3.return_value.open.return_value = remote
+    mock_read_nc.side_effect = lambda paths: open(paths[0], "rb").read()
+
+    with mock.patch("time.sleep") as sleep:
+        assert IO.fetch_goes(GOES_SERVER_DIR, path=tmp_path) == payload
+    assert remote.starts == [0, 2 * IO.BLOCK_SIZE]
+    assert sleep.call_args_list == [mock.call(IO.RETRY.delay(0))]
+
+    # Files that don't exist are not retried
+    mock_s3.return_value.open.side_effect = FileNotFoundError()
+    with pytest.raises(FileNotFoundError):
+        IO.fetch_goes(GOES_SERVER_DIR.replace("s2019", "s2018"), path=tmp_path)
+    assert mock_s3.return_value.open.call_count == 3
+
+
+def test_retry_delay():
+    retry = IO.Retry(backoff=0.5, factor=3.0, max_delay=10.0)
+    assert [retry.delay(n) for n in range(4)] == [0.5, 1.5, 4.5, 10.0]
+
+
 @mock.patch("stratopy.IO.fetch_goes")
 @mock.patch("stratopy.IO.fetch_cloudsat")
 def test_fetch(mock_cloudsat, mock_goes):
@@ -144,3 +302,32 @@ def test_fetch(mock_cloudsat, mock_goes):
     mock_cloudsat.assert_called_with(CLOUDSAT_SERVER_DIR)
 
     assert isinstance(stratoframe, DataFrame)
+
+
+@mock.patch("s3fs.S3FileSystem")
+def test_list_goes(mock_s3, tmp_path):
+    def ls(prefix):
+        if prefix.endswith("/07"):
+            raise FileNotFoundError(prefix)
+        name = "OR_ABI-L2-MCMIPF-M6_G16_s2019004{}{}000_e_c.nc"
+        return [
+            f"{prefix}/{name.format(prefix[-2:], minute)}"
+            for minute in ("50", "00", "10")
+        ]
+
+    mock_s3.return_value.ls.side_effect = ls
+    start = datetime.datetime(2019, 1, 4, 6, 5)
+    end = datetime.datetime(2019, 1, 4, 8)
+    keys = IO.list_goes(start, end, catalog=Catalog(tmp_path))
+    starts = [IO.goes_scan_start(key) for key in keys]
+    assert starts == [
+        datetime.datetime(2019, 1, 4, 6, 10),
+        datetime.datetime(2019, 1, 4, 6, 50),
+        datetime.datetime(2019, 1, 4, 8, 0),
+    ]
+    assert mock_s3.return_value.ls.call_count == 3
+    assert keys[0].startswith("noaa-goes16/ABI-L2-MCMIPF/2019/004/06/")
+
+    # The listings are cached
+    assert IO.list_goes(start, end, catalog=Catalog(tmp_path)) == keys
+    assert mock_s3.return_value.ls.call_count == 3
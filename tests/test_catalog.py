@@ -0,0 +1,138 @@
+import datetime
+import ftplib
+from unittest import mock
+
+import pytest
+
+from stratopy import catalog
+
+GOES_NAME = (
+    "OR_ABI-L2-CMIPF-M3C03_G16_s20190021800363_e20190021811129_"
+    "c20190021811205.nc"
+)
+
+CLOUDSAT_NAME = "2019002175851_67551_CS_2B-CLDCLASS_GRANULE_P1_R05_E08_F03.hdf"
+
+
+def goes_name(time, channel="C03"):
+    return f"OR_ABI-L2-CMIPF-M3{channel}_G16_s{time:%Y%j%H%M%S}0_e_c.nc"
+
+
+def test_parse():
+    record = catalog.parse(f"noaa-goes16/ABI-L2-CMIPF/2019/002/18/{GOES_NAME}")
+    assert record.name == GOES_NAME
+    assert record.satellite == "G16"
+    assert record.product == "ABI-L2-CMIPF"
+    assert (record.mode, record.channel) == ("M3", "C03")
+    assert record.start == datetime.datetime(2019, 1, 2, 18, 0, 36, 300000)
+    assert record.end == datetime.datetime(2019, 1, 2, 18, 11, 12, 900000)
+
+    record = catalog.parse_goes("OR_ABI-L2-MCMIPF-M6_G16_s20190040600363_e_c")
+    assert record.channel is None and record.end is None
+
+    record = catalog.parse(CLOUDSAT_NAME)
+    assert record.satellite == "CloudSat"
+    assert record.product == "2B-CLDCLASS"
+    assert record.granule == 67551
+    assert record.start == datetime.datetime(2019, 1, 2, 17, 58, 51)
+    assert record.end == record.start + catalog.GRANULE_DURATION
+    assert record.overlaps(record.end, record.end + catalog.GRANULE_DURATION)
+
+    with pytest.raises(ValueError):
+        catalog.parse("scene.nc")
+    with pytest.raises(ValueError):
+        catalog.parse_cloudsat(GOES_NAME)
+
+
+def test_nearest():
+    records = [
+        catalog.parse_goes(goes_name(datetime.datetime(2019, 1, 2, 18, m)))
+        for m in (0, 10, 20)
+    ]
+    time = datetime.datetime(2019, 1, 2, 18, 13)
+    assert catalog.nearest(records, time) is records[1]
+    tolerance = datetime.timedelta(minutes=2)
+    assert catalog.nearest(records, time, tolerance) is None
+    assert catalog.nearest([], time) is None
+
+
+@mock.patch("s3fs.S3FileSystem")
+def test_list_goes(mock_s3, tmp_path):
+    def ls(prefix):
+        if prefix.endswith("/19"):
+            raise FileNotFoundError(prefix)
+        hour = datetime.datetime(2019, 1, 2, int(prefix[-2:]))
+        names = [
+            goes_name(hour + datetime.timedelta(minutes=minute), channel)
+            for channel in ("C03", "C13")
+            for minute in (0, 30)
+        ]
+        return [f"{prefix}/{name}" for name in names + ["index.html"]]
+
+    mock_s3.return_value.ls.side_effect = ls
+    cat = catalog.Catalog(tmp_path)
+    start = datetime.datetime(2019, 1, 2, 17, 30)
+    end = datetime.datetime(2019, 1, 2, 20)
+    records = cat.list_goes(start, end, "ABI-L2-CMIPF", channel="C13")
+    assert [rec.start.strftime("%H:%M") for rec in records] == [
+        "17:30",
+        "18:00",
+        "18:30",
+        "20:00",
+    ]
+    assert {rec.channel for rec in records} == {"C13"}
+    assert mock_s3.return_value.ls.call_count == 4
+
+    # Queries are answered from the cached listings
+    time = datetime.datetime(2019, 1, 2, 18, 20)
+    nearest = cat.nearest_goes(time, product="ABI-L2-CMIPF", channel="C03")
+    assert nearest.start.strftime("%H:%M") == "18:30"
+    assert catalog.Catalog(tmp_path).list_goes(
+        start, end, "ABI-L2-CMIPF", channel="C13"
+    ) == records
+    assert mock_s3.return_value.ls.call_count == 4
+
+    cat.clear()
+    cat.list_goes(start, start, "ABI-L2-CMIPF")
+    assert mock_s3.return_value.ls.call_count == 5
+
+
+@mock.patch("s3fs.S3FileSystem")
+def test_listing_ttl(mock_s3, tmp_path):
+    mock_s3.return_value.ls.return_value = []
+    cat = catalog.Catalog(tmp_path, ttl=60.0)
+    now = catalog._utcnow()
+    with mock.patch.object(cat._cache, "set", wraps=cat._cache.set) as set_:
+        cat.list_goes(now, now)
+        cat.list_goes(now - datetime.timedelta(days=2), now)
+    # The listing of the current hour expires, the archived doesn't
+    assert set_.call_args_list[0][1]["expire"] == 60.0
+    assert set_.call_args_list[1][1]["expire"] is None
+
+
+@mock.patch("ftplib.FTP")
+def test_list_cloudsat(mock_ftp_constructor, tmp_path):
+    def nlst(dirname):
+        if dirname.endswith("/003"):
+            raise ftplib.error_perm("550 No such directory")
+        day = dirname[-3:]
+        return [
+            f"2019{day}{hour}0000_675{hour}_CS_2B-CLDCLASS_GRANULE_P1_R05.hdf"
+            for hour in ("00", "12", "23")
+        ]
+
+    mock_ftp = mock_ftp_constructor.return_value
+    mock_ftp.nlst.side_effect = nlst
+    records = catalog.Catalog(tmp_path).list_cloudsat(
+        datetime.datetime(2019, 1, 2, 0, 30),
+        datetime.datetime(2019, 1, 3, 12),
+        user="user",
+        passwd="passwd",
+    )
+    # The granule starting at 23:00 the day before still covers 00:30
+    assert [rec.granule for rec in records] == [67523, 67500, 67512, 67523]
+    assert records[0].start == datetime.datetime(2019, 1, 1, 23)
+    assert records[1].path.startswith("2B-CLDCLASS.P1_R05/2019/002/")
+    mock_ftp.login.assert_called_once_with("user", "passwd")
+    assert mock_ftp.nlst.call_count == 3
+    mock_ftp.close.assert_called_once()
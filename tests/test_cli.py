@@ -0,0 +1,223 @@
+import json
+import os
+import time
+from unittest import mock
+
+from netCDF4 import Dataset
+
+import pytest
+
+from stratopy import cli, ledger
+
+from .test_goes import fake_reflectance, fake_scene
+
+
+def fake_task(task, output, delay=0.0):
+    if task.name == "crash":
+        os._exit(3)
+    if task.name == "error":
+        raise ValueError("bad scene")
+    time.sleep(delay if task.name == "slow" else 0.0)
+    return [os.path.join(output, task.name)]
+
+
+def test_read_manifest(tmp_path):
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text(
+        "goes,cloudsat,name\n"
+        "a/OR_ABI-L2-MCMIPF-M6_G16_s2019.nc,,\n"
+        "c03.nc;c07.nc;c13.nc,granule.hdf,scene\n"
+    )
+    first, second = cli.read_manifest(manifest)
+    assert first.name == "OR_ABI-L2-MCMIPF-M6_G16_s2019"
+    assert first.goes == ("a/OR_ABI-L2-MCMIPF-M6_G16_s2019.nc",)
+    assert first.cloudsat is None
+    assert second.goes == ("c03.nc", "c07.nc", "c13.nc")
+    assert second.cloudsat == "granule.hdf" and second.name == "scene"
+
+    manifest.write_text("path\nscene.nc\n")
+    with pytest.raises(ValueError):
+        cli.read_manifest(manifest)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_run_batch(tmp_path, workers):
+    names = ["ok", "error", "other"] + (["crash", "slow"] if workers else [])
+    tasks = [cli.Task.from_goes((f"{name}.nc",)) for name in names]
+    seen = []
+    results = cli.run_batch(
+        tasks,
+        str(tmp_path / "out"),
+        workers=workers,
+        timeout=1.0 if workers else None,
+        callback=seen.append,
+        target=fake_task,
+        delay=30.0,
+    )
+    assert [result.name for result in results] == names
+    assert sorted(seen, key=lambda res: names.index(res.name)) == results
+
+    status = {result.name: result for result in results}
+    assert status["ok"].status == "done"
+    assert status["ok"].outputs == (str(tmp_path / "out" / "ok"),)
+    assert status["error"].status == "failed"
+    assert "ValueError: bad scene" in status["error"].error
+    if workers:
+        assert status["crash"].status == "failed"
+        assert "exit code 3" in status["crash"].error
+        assert status["slow"].status == "timeout"
+        assert 1.0 <= status["slow"].seconds < 10.0
+
+    summary = cli.summarize(results)
+    assert summary.startswith(f"{len(names)} tasks: 2 done")
+    assert "error: failed (ValueError: bad scene)" in summary
+
+    # Failures without an error message
+    summary = cli.summarize(
+        [
+            cli.TaskResult("empty", "failed", 1.0, error=""),
+            cli.TaskResult("none", "timeout", 2.0),
+        ]
+    )
+    assert "empty: failed (failed)" in summary
+    assert "none: timeout (timeout)" in summary
+
+
+@mock.patch("stratopy.goes.Calculator")
+def test_main(mock_calculator, tmp_path):
+    mock_calculator.return_value.reflectance_from_tbs = fake_reflectance
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text("goes,name\nscene.nc,scene\n")
+    report = tmp_path / "report.json"
+    argv = ["--manifest", str(manifest), "-o", str(tmp_path), "-j", "0"]
+
+    with mock.patch("stratopy.cli._load_goes", return_value=fake_scene()):
+        assert cli.main(argv + ["--report", str(report)]) == 0
+
+    with Dataset(tmp_path / "scene.nc") as store:
+        assert set(store.variables) == {"time", "RGB", "mask"}
+    assert json.loads(report.read_text())[0]["status"] == "done"
+
+    # Several GOES files can't be fetched
+    manifest.write_text("goes\nc03.nc;c07.nc;c13.nc\n")
+    assert cli.main(argv) == 1
+
+    with pytest.raises(SystemExit):
+        cli.main(["--start", "2019-01-04T06:00"])
+
+
+def test_ledger(tmp_path):
+    tasks = [cli.Task.from_goes((f"{name}.nc",)) for name in ("ok", "error")]
+    with ledger.Ledger(tmp_path / "jobs.sqlite") as jobs:
+        jobs.add(tasks)
+        assert jobs.pending() == tasks
+        assert jobs.counts()["pending"] == 2
+
+        for result in cli.run_batch(
+            tasks, str(tmp_path), workers=0, target=fake_task
+        ):
+            jobs.record(result)
+        assert jobs.pending() == tasks[1:]
+        assert jobs.pending(max_attempts=1) == []
+        assert jobs.get("ok")["outputs"] == [str(tmp_path / "ok")]
+        assert jobs.get("error")["attempts"] == 1
+        assert jobs.get("other") is None
+
+        # Outputs of "ok" don't exist
+        assert jobs.pending(verify=True) == tasks
+        jobs.add(tasks)
+        assert jobs.counts() == {
+            "pending": 0,
+            "done": 1,
+            "failed": 1,
+            "timeout": 0,
+        }
+
+
+@mock.patch("stratopy.goes.Calculator")
+def test_main_ledger(mock_calculator, tmp_path):
+    mock_calculator.return_value.reflectance_from_tbs = fake_reflectance
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text("goes\nscene.nc\nc03.nc;c07.nc;c13.nc\n")
+    path = tmp_path / "jobs.sqlite"
+    argv = ["--manifest", str(manifest), "-o", str(tmp_path), "-j", "0"]
+    argv += ["--ledger", str(path)]
+
+    with mock.patch(
+        "stratopy.cli._load_goes", wraps=cli._load_goes
+    ) as load_goes:
+        load_goes.side_effect = [fake_scene(), ValueError()]
+        assert cli.main(argv) == 1
+
+        # Only the failed task runs again
+        load_goes.side_effect = [fake_scene()]
+        assert cli.main(argv) == 0
+        assert load_goes.call_args[0][0] == ("c03.nc", "c07.nc", "c13.nc")
+        assert cli.main(argv) == 0
+        assert load_goes.call_count == 3
+
+    with ledger.Ledger(path) as jobs:
+        assert jobs.get("c03")["attempts"] == 2
+
+
+def test_main_region(tmp_path):
+    goes = "OR_ABI-L2-MCMIPF-M3_G16_s20190022100000_e20190022110000_c.nc"
+    granule = "2019002175851_67551_CS_2B-CLDCLASS_GRANULE_P1_R05_E08_F03.hdf"
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text(f"goes,cloudsat,name\n{goes},{granule},scene\n")
+    argv = ["--manifest", str(manifest), "-o", str(tmp_path), "-j", "0"]
+    argv += ["--cache", str(tmp_path), "--region=-40,10,-37,-80"]
+
+    # The granule ends before the scene, so nothing is fetched
+    with mock.patch("stratopy.cli._load_goes") as load_goes:
+        with mock.patch("stratopy.cli._load_cloudsat") as load_cloudsat:
+            assert cli.main(argv) == 0
+    load_goes.assert_not_called()
+    load_cloudsat.assert_not_called()
+    assert not os.path.exists(tmp_path / "scene.nc")
+    assert not os.path.exists(tmp_path / "scene.parquet")
+    assert os.path.isdir(tmp_path / "tracks")
+
+
+@mock.patch("stratopy.goes.Calculator")
+def test_main_region_outputs(mock_calculator, tmp_path):
+    mock_calculator.return_value.reflectance_from_tbs = fake_reflectance
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text("goes,name\nscene.nc,scene\n")
+    argv = ["--manifest", str(manifest), "-o", str(tmp_path), "-j", "0"]
+    argv += ["--region=-33,-31,-66,-68"]
+
+    # The outputs are trimmed to the region
+    def load_goes(paths, cache, **kwargs):
+        return fake_scene(**kwargs)
+
+    with mock.patch("stratopy.cli._load_goes", side_effect=load_goes) as load:
+        assert cli.main(argv) == 0
+    coordinates = (-33.0, -31.0, -66.0, -68.0)
+    assert load.call_args[1]["coordinates"] == coordinates
+    expected = fake_scene(coordinates=coordinates).RGB
+    with Dataset(tmp_path / "scene.nc") as store:
+        assert store["RGB"].shape[-3:] == expected.shape
+        assert store["RGB"].shape[-3:] != fake_scene().RGB.shape
+
+
+def test_main_skip_night(tmp_path):
+    goes = "OR_ABI-L2-MCMIPF-M3_G16_s20190040600363_e20190040611130_c.nc"
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text(f"goes,name\n{goes},scene\n")
+    argv = ["--manifest", str(manifest), "-o", str(tmp_path), "-j", "0"]
+    report = tmp_path / "report.json"
+    argv += ["--skip-night", "--report", str(report)]
+
+    # 06:00 UTC is night in South America, so the scene isn't fetched
+    with mock.patch("stratopy.cli._load_goes") as load_goes:
+        assert cli.main(argv + ["--region=south_america"]) == 0
+    load_goes.assert_not_called()
+    assert json.loads(report.read_text())[0]["outputs"] == []
+
+    # Without a region, the night is checked in the region of the scene
+    scene = mock.Mock(**{"is_night.return_value": True})
+    with mock.patch("stratopy.cli._load_goes", return_value=scene):
+        assert cli.main(argv) == 0
+    scene.is_night.assert_called_once_with()
+    assert json.loads(report.read_text())[0]["outputs"] == []
@@ -1,8 +1,16 @@
+from unittest import mock
+
 import numpy as np
 import numpy.ma as ma
 
+import pandas as pd
+
+import pytest
+
 from stratopy import core
 
+from .test_goes import fake_reflectance, fake_scene
+
 arr = np.array([35786023.0, -0.0, 0.0])
 masked_sat = arr.view(ma.MaskedArray)
 
@@ -32,3 +40,249 @@ def test_scan2colfil():
     assert isinstance(col_fl, float)
     assert isinstance(row_fl, float)
     np.testing.assert_equal((2712, 2712), core.scan2colfil((0.0, 0.0)))
+
+
+def test_valid_minmax():
+    img = np.array([[65535.0, 2.0, 3.0], [4.0, 65535.0, 10.0]])
+    dqf = np.array([[0, 0, 0], [0, 0, 3]])
+    assert core.valid_minmax(img, fill_value=65535.0) == (2.0, 10.0)
+    assert core.valid_minmax(img, dqf, fill_value=65535.0) == (2.0, 4.0)
+    assert core.valid_minmax(img, fill_value=65535.0, chunk_rows=1) == (
+        2.0,
+        10.0,
+    )
+
+
+def test_valid_minmax_masked():
+    img = ma.masked_equal([[65535.0, 1.0], [7.0, 65535.0]], 65535.0)
+    assert core.valid_minmax(img) == (1.0, 7.0)
+    np.testing.assert_equal(
+        core.valid_minmax(ma.masked_all((2, 2))), (np.nan, np.nan)
+    )
+
+
+def test_merge_norm_exception():
+    with pytest.raises(ValueError):
+        core.merge(None, None, norm="minmax")
+
+
+def test_merge_as_tensor(tmp_path):
+    rng = np.random.default_rng(0)
+    goes_obj = mock.Mock(
+        _data={
+            band: {"CMI": ma.masked_array(rng.uniform(200, 300, (5424, 5424)))}
+            for band in ("M3C07", "M3C13")
+        },
+        _projection=dict.fromkeys(("M3C07", "M3C13"), core.GeosProjection()),
+    )
+    profiles = pd.DataFrame(
+        {
+            "Latitude": [-30.0, -31.0, 45.0, 0.0],
+            "Longitude": [-60.0, -61.0, 105.0, -75.0],
+            "layer_0": [1, 2, 3, 0],
+            **{f"layer_{i}": np.zeros(4) for i in range(1, 10)},
+        }
+    )
+
+    merged = core.merge(profiles, goes_obj, norm="fixed")
+    frame, tensor = core.merge(
+        profiles, goes_obj, norm="fixed", as_tensor=True
+    )
+    # Cloudless and hidden profiles are dropped
+    assert tensor.shape == (2, 3, 3, 2)
+    assert list(frame.index) == [0, 1] and "goes_vec" not in frame
+    np.testing.assert_allclose(tensor, np.stack(merged.goes_vec.values))
+
+    path = tmp_path / "vectors.npy"
+    _, mapped = core.merge(
+        profiles, goes_obj, norm="fixed", as_tensor=True, out=path
+    )
+    np.testing.assert_array_equal(np.load(path), tensor)
+
+    with pytest.raises(ValueError):
+        core.merge(profiles, goes_obj, as_tensor=True, out=np.empty(3))
+
+
+@mock.patch("stratopy.goes.Calculator")
+def test_merge_projections(mock_calculator):
+    # Pieces of the full disk at 1 and 2 km, not at the default offsets
+    mock_calculator.return_value.reflectance_from_tbs = fake_reflectance
+    goes_obj = fake_scene()
+    profiles = pd.DataFrame(
+        {
+            "Latitude": [-31.0, -33.5],
+            "Longitude": [-66.0, -68.0],
+            **{f"layer_{i}": np.ones(2) for i in range(10)},
+        }
+    )
+    frame, tensor = core.merge(profiles, goes_obj, norm=False, as_tensor=True)
+
+    for count, (key, band) in enumerate(goes_obj._data.items()):
+        projection = goes_obj._projection[key]
+        col, row = np.rint(
+            projection.latlon2colfil(profiles.Latitude, profiles.Longitude)
+        ).astype(int)
+        expected = band["CMI"][row, col]
+        np.testing.assert_allclose(tensor[:, 1, 1, count], expected)
+    coarse = goes_obj._projection["M3C13"]
+    col, row = coarse.latlon2colfil(-31.0, -66.0)
+    assert frame.col_row.iloc[0] == (round(float(col)), round(float(row)))
+
+
+@pytest.mark.parametrize("padding", ["constant", "edge", "reflect"])
+def test_extract_patches(padding):
+    image = np.arange(42.0).reshape(6, 7)
+    kwargs = {"constant_values": -1.0} if padding == "constant" else {}
+    padded = np.pad(image, 2, padding, **kwargs)
+    rows, cols = np.array([0, 5, 3]), np.array([6, 0, 3])
+
+    patches = core.extract_patches(
+        image, (rows, cols), size=5, padding=padding, fill_value=-1.0
+    )
+    assert patches.shape == (3, 5, 5)
+    for patch, r, c in zip(patches, rows, cols):
+        np.testing.assert_array_equal(patch, padded[r : r + 5, c : c + 5])
+
+    # Dense tiling, every two pixels
+    dense = core.extract_patches(
+        image, size=5, stride=2, padding=padding, fill_value=-1.0
+    )
+    assert dense.shape == (3, 4, 5, 5)
+    np.testing.assert_array_equal(dense[1, 3], padded[2:7, 6:11])
+
+
+def test_extract_patches_bands_valid():
+    image = np.random.default_rng(0).uniform(size=(8, 9, 2))
+    dense = core.extract_patches(image, size=3, padding="valid")
+    assert dense.shape == (6, 7, 3, 3, 2)
+    assert np.shares_memory(dense, image)
+    np.testing.assert_array_equal(dense[0, 0], image[:3, :3])
+
+    out = np.empty((1, 3, 3, 2))
+    patches = core.extract_patches(image, ([4], [4]), out=out)
+    assert patches is out
+    np.testing.assert_array_equal(out[0], image[3:6, 3:6])
+
+    with pytest.raises(ValueError):
+        core.extract_patches(image, ([0], [4]), padding="valid")
+    with pytest.raises(ValueError):
+        core.extract_patches(image, ([-1], [4]))
+    with pytest.raises(ValueError):
+        core.extract_patches(image, ([1], [9]))
+    with pytest.raises(ValueError):
+        core.extract_patches(image, size=4)
+    with pytest.raises(ValueError):
+        core.extract_patches(image, padding="wrap")
+    with pytest.raises(ValueError):
+        core.extract_patches(image, stride=0)
+
+
+def test_gen_vect():
+    bands = {"C07": np.arange(25.0).reshape(5, 5), "C13": np.ones((5, 5))}
+    vec = core.gen_vect((1, 2), bands)
+    assert vec.shape == (3, 3, 2)
+    np.testing.assert_array_equal(vec[..., 0], bands["C07"][1:4, 0:3])
+    assert np.isnan(core.gen_vect((0, 0), bands)[0, 0]).all()
+    assert core.gen_vect((2, 2), bands, size=5).shape == (5, 5, 2)
+
+    # Negative indices used to wrap silently
+    with pytest.raises(ValueError):
+        core.gen_vect((-1, 2), bands)
+    with pytest.raises(ValueError):
+        core.gen_vect((1, 5), bands)
+
+
+def test_scan2sat_off_disk():
+    x = np.array([0.0, 0.2])
+    y = ma.MaskedArray([0.0, 0.0], mask=[False, True])
+    sx, sy, sz = core.scan2sat(x, y)
+    assert sx[0] == 35786023.0
+    assert np.isnan(sx[1]) and np.isnan(sy[1]) and np.isnan(sz[1])
+    sx, _, _ = core.scan2sat(np.array([0.2]), np.array([0.0]))
+    assert np.isnan(sx[0])
+
+
+def test_navigation_out_float32():
+    x = np.linspace(-0.1, 0.1, 12, dtype=np.float32).reshape(3, 4)
+    y = np.linspace(0.1, -0.1, 12, dtype=np.float32).reshape(3, 4)
+    out = tuple(np.empty((3, 4), dtype=np.float32) for _ in range(3))
+    sat = core.scan2sat(x, y, dtype=np.float32, out=out)
+    assert all(res is buf for res, buf in zip(sat, out))
+
+    lat, lon = core.sat2latlon(*sat, dtype=np.float32)
+    assert lat.dtype == np.float32 and lon.dtype == np.float32
+
+    x_back, y_back = core.latlon2scan(lat, lon)
+    np.testing.assert_allclose(x_back, x, atol=1e-6)
+    np.testing.assert_allclose(y_back, y, atol=1e-6)
+
+    with pytest.raises(ValueError):
+        core.scan2sat(x, y, out=out[:2])
+
+
+def test_precision():
+    assert core.get_precision() == np.float64
+    x = np.array([0.01, -0.02])
+    with core.precision(np.float32) as dtype:
+        assert dtype == np.float32
+        assert core.scan2sat(x, x)[0].dtype == np.float32
+        lat, lon = core.GeosProjection().colfil2latlon(2712, [100, 200])
+        assert lat.dtype == np.float32 and lon.dtype == np.float32
+        # Per call override
+        assert core.latlon2scan(x, x, dtype=np.float64)[0].dtype == np.float64
+        vec = core.gen_vect((1, 1), {"C13": np.ones((3, 3))})
+        assert vec.dtype == np.float32
+    assert core.get_precision() == np.float64
+    assert core.scan2sat(x, x)[0].dtype == np.float64
+
+    with pytest.raises(TypeError):
+        core.set_precision(np.int32)
+
+
+def test_latlon2scan_hidden():
+    x, y = core.latlon2scan(np.array([0.0, 0.0]), np.array([-75.0, 105.0]))
+    assert (x[0], y[0]) == (0.0, 0.0)
+    assert np.isnan(x[1]) and np.isnan(y[1])
+
+
+def test_geos_projection():
+    proj = core.GeosProjection()
+    assert proj == core.GeosProjection() and hash(proj) == hash(
+        core.GeosProjection()
+    )
+    assert proj.H == 6378137.0 + 35786023.0
+
+    np.testing.assert_equal(proj.latlon2colfil(0.0, -75.0), (2711.5, 2711.5))
+    lat, lon = proj.colfil2latlon(
+        np.arange(2000, 2010)[np.newaxis, :], np.arange(2500, 2505)[:, None]
+    )
+    assert lat.shape == (5, 10)
+    col, row = proj.latlon2colfil(lat, lon)
+    np.testing.assert_allclose(col[0], np.arange(2000, 2010), atol=1e-6)
+    np.testing.assert_allclose(row[:, 0], np.arange(2500, 2505), atol=1e-6)
+
+    # Off-disk pixel
+    lat, lon = proj.colfil2latlon(0, 0)
+    assert np.isnan(lat) and np.isnan(lon)
+
+
+def test_geos_projection_window():
+    proj = core.GeosProjection()
+    coordinates = (-40.0, 10.0, -37.0, -80.0)
+    c0, r0 = core.scan2colfil(core.latlon2scan(10.0, -80.0))
+    c1, r1 = core.scan2colfil(core.latlon2scan(-40.0, -37.0))
+    assert proj.window(coordinates) == (r0, r1, c0, c1)
+
+
+def test_geos_projection_from_dataset():
+    dataset = {
+        "goes_imager_projection": mock.Mock(
+            perspective_point_height=35786023.0,
+            semi_major_axis=6378137.0,
+            semi_minor_axis=6356752.31414,
+            longitude_of_projection_origin=-75.0,
+        ),
+        "x": mock.Mock(scale_factor=5.6e-05, add_offset=-0.151844),
+        "y": mock.Mock(scale_factor=-5.6e-05, add_offset=0.151844),
+    }
+    assert core.GeosProjection.from_dataset(dataset) == core.GeosProjection()
@@ -1,10 +1,15 @@
+import datetime
+import pickle
+from concurrent import futures
 from unittest import mock
 
+from netCDF4 import Dataset
+
 import numpy as np
 
 import pytest
 
-from stratopy import goes
+from stratopy import core, goes, parallel, products, tracing
 
 PATH_CHANNEL_3 = (
     "data/GOES16/"
@@ -63,6 +68,22 @@ def test_read_nc_len():
         goes.read_nc((PATH_CHANNEL_3, PATH_CHANNEL_7))
 
 
+@mock.patch("stratopy.goes.Dataset")
+@mock.patch("stratopy.goes.Goes")
+def test_read_nc_directory_names(mock_goes, mock_file):
+    # Channels and dates come from the file names only
+    paths = tuple(
+        path.replace("data/GOES16/", "data/goes-16_s20200010000000/")
+        for path in FILE_PATH
+    )
+    goes.read_nc(paths)
+    (data,), _ = mock_goes.call_args
+    assert set(data) == {"M3C03", "M3C07", "M3C13"}
+
+    with pytest.raises(ValueError):
+        goes.read_nc(paths[:2] + (FAKE_DATE,))
+
+
 @mock.patch("stratopy.goes.Dataset")
 @mock.patch("stratopy.goes.Goes.trim")
 @mock.patch("stratopy.core.scan2colfil", return_value=(1, 1))
@@ -150,3 +171,440 @@ def test_rgb2hsi():
 
     assert isinstance(hsi, np.ndarray)
     np.testing.assert_equal(hsi, goes.rgb2hsi(rgb))
+
+
+def test_trim_window_memoized():
+    goes.trim_window.cache_clear()
+    proj = core.GeosProjection()
+    coordinates = (-40.0, 10.0, -37.0, -80.0)
+    window = goes.trim_window(proj, coordinates)
+    assert window == proj.window(coordinates)
+    assert goes.trim_window(core.GeosProjection(), coordinates) == window
+    assert goes.trim_window.cache_info().hits == 1
+
+
+@pytest.fixture
+def cuyo(monkeypatch):
+    # Registered in a copy of the regions, restored after the test
+    monkeypatch.setattr(goes, "REGIONS", dict(goes.REGIONS))
+    goes.register_region("cuyo", (-37, -31, -66, -70))
+    return "cuyo"
+
+
+def test_precompute_windows(cuyo):
+    assert goes.REGIONS["cuyo"] == (-37.0, -31.0, -66.0, -70.0)
+    proj = core.GeosProjection()
+    windows = goes.precompute_windows([proj, proj], ["cuyo", "south_america"])
+    assert set(windows) == {"cuyo", "south_america"}
+    assert windows["cuyo"][proj] == proj.window(goes.REGIONS["cuyo"])
+
+    with pytest.raises(ValueError):
+        goes.precompute_windows([proj], ["atlantis"])
+    with pytest.raises(ValueError):
+        goes.register_region("line", (1.0, 2.0))
+
+
+def fake_channel(size=300, seed=0, scale=None, offset=(-0.151844, 0.151844)):
+    # Small image of a single channel, without netCDF files. By default
+    # it's a full disk with a coarser resolution.
+    scale = 5.6e-05 * 5424 / size if scale is None else scale
+    image = np.random.default_rng(seed).uniform(200, 300, (size, size))
+    image[0, 0] = 65535.0
+    return {
+        "CMI": np.ma.masked_equal(image, 65535.0),
+        "t": goes.DetachedVariable(np.array(599896836.0)),
+        "goes_imager_projection": goes.DetachedVariable(
+            np.array(-2147483647),
+            {
+                "perspective_point_height": 35786023.0,
+                "semi_major_axis": 6378137.0,
+                "semi_minor_axis": 6356752.31414,
+                "longitude_of_projection_origin": -75.0,
+            },
+        ),
+        "x": goes.DetachedVariable(
+            np.arange(size), {"scale_factor": scale, "add_offset": offset[0]}
+        ),
+        "y": goes.DetachedVariable(
+            np.arange(size), {"scale_factor": -scale, "add_offset": offset[1]}
+        ),
+    }
+
+
+def test_trim_regions(cuyo):
+    dat = goes.Goes({"M3C13": fake_channel()})
+    regions = dat.trim_regions(["cuyo", "south_america"])
+    assert np.shares_memory(
+        regions["cuyo"]["M3C13"], regions["south_america"]["M3C13"]
+    )
+    np.testing.assert_equal(
+        regions["south_america"]["M3C13"], dat.trim()["M3C13"]
+    )
+    cuyo = goes.Goes({"M3C13": fake_channel()}, coordinates="cuyo")
+    np.testing.assert_equal(regions["cuyo"]["M3C13"], cuyo.trim()["M3C13"])
+
+    with pytest.raises(ValueError):
+        dat.trim_regions({})
+
+
+def test_trim_c03_alone():
+    # 1 km image around Cuyo, decimated to the 2 km grid even without
+    # 2 km channels
+    scale = 2.8e-05
+    x, y = core.GeosProjection().latlon2scan(np.array(-33.5), np.array(-67.5))
+    offset = (float(x) - 300 * scale, float(y) + 300 * scale)
+    dat = goes.Goes(
+        {"M3C03": fake_channel(600, scale=scale, offset=offset)},
+        coordinates=(-34.0, -33.0, -67.0, -68.0),
+    )
+    r0, r1, c0, c1 = dat._projection["M3C03"].window(dat.coordinates)
+    assert dat.trim()["M3C03"].shape == (
+        len(range(0, r1 - r0 - 1, 2)),
+        len(range(0, c1 - c0, 2)),
+    )
+
+
+def test_normalize_rgb():
+    rng = np.random.default_rng(0)
+    R = rng.uniform(-0.1, 1.1, (7, 5))
+    G = rng.uniform(-0.1, 0.7, (7, 5))
+    B = rng.uniform(190, 330, (7, 5))
+
+    rgb = goes.normalize_rgb(R, G, B, chunk_rows=3)
+    with np.errstate(invalid="ignore"):
+        expected = np.stack(
+            [R, ((G - 0) / 0.6) ** 0.4, (B - 203) / 120], axis=2
+        ).clip(0, 1)
+    np.testing.assert_allclose(rgb, expected)
+
+    out = np.empty((7, 5, 3), dtype=np.float32)
+    assert goes.normalize_rgb(R, G, B, out=out) is out
+    np.testing.assert_allclose(out, expected, rtol=1e-6)
+
+    rgb8 = goes.normalize_rgb(R, G, B, dtype=np.uint8)
+    assert rgb8.dtype == np.uint8
+    np.testing.assert_equal(rgb8, np.rint(np.nan_to_num(expected) * 255))
+
+    with pytest.raises(ValueError):
+        goes.normalize_rgb(R, G, B[:3])
+    with pytest.raises(ValueError):
+        goes.normalize_rgb(R, G, B, out=out[:3])
+    with pytest.raises(TypeError):
+        goes.normalize_rgb(R, G, B, dtype=np.int32)
+
+
+def test_mask_uint8():
+    rgb = np.array(
+        [[[0.9, 0.1, 0.9], [0.4, 0.6, 0.2], [0.1, 0.9, 0.1], [0.5, 0.5, 0.5]]]
+    )
+    rgb8 = np.rint(rgb * 255).astype(np.uint8)
+    np.testing.assert_equal(goes.mask(rgb8), goes.mask(rgb) * 255)
+
+
+def test_rgb2hsi_chunks():
+    rng = np.random.default_rng(0)
+    rgb = rng.uniform(0, 1, (9, 4, 3))
+    rgb[0, 0] = 0.5  # gray pixel
+
+    hsi = goes.rgb2hsi(rgb)
+    assert hsi.dtype == np.float64
+    np.testing.assert_equal(hsi[0, 0], [0.0, 0.0, 0.5])
+    np.testing.assert_equal(goes.rgb2hsi(rgb, chunk_rows=2), hsi)
+
+    out = np.empty((9, 4, 3), dtype=np.float32)
+    assert goes.rgb2hsi(rgb, out=out) is out
+    np.testing.assert_allclose(out, hsi, rtol=1e-5, atol=1e-6)
+
+    rgb8 = np.rint(rgb * 255).astype(np.uint8)
+    np.testing.assert_allclose(
+        goes.rgb2hsi(rgb8), goes.rgb2hsi(rgb8 / 255.0), atol=1e-12
+    )
+
+    with pytest.raises(ValueError):
+        goes.rgb2hsi(rgb, out=out[:2])
+
+
+def fake_reflectance(zenith, ch7, ch13):
+    return (ch7 - ch13) / 100.0 * np.cos(np.deg2rad(zenith))
+
+
+def fake_scene(**kwargs):
+    # Pieces of the full disk around (-32, -67), at 1 and 2 km
+    offset_1km = (-0.151858 + 5700 * 2.8e-05, 0.151858 - 8200 * 2.8e-05)
+    offset_2km = (-0.151844 + 2850 * 5.6e-05, 0.151844 - 4100 * 5.6e-05)
+    data = {
+        "M3C03": fake_channel(800, 3, 2.8e-05, offset_1km),
+        "M3C07": fake_channel(400, 7, 5.6e-05, offset_2km),
+        "M3C13": fake_channel(400, 13, 5.6e-05, offset_2km),
+    }
+    data["M3C03"]["CMI"] /= 300.0  # reflectance
+    kwargs.setdefault("coordinates", (-35.0, -30.0, -65.0, -69.0))
+    return goes.Goes(data, **kwargs)
+
+
+@mock.patch("stratopy.goes.Calculator")
+def test_day_microphysics_tiles(mock_calculator):
+    mock_calculator.return_value.reflectance_from_tbs = fake_reflectance
+    dat = fake_scene()
+    assert dat.RGB.shape == dat.trim()["M3C07"].shape + (3,)
+
+    tiled = dat.day_microphysics(
+        tile_shape=(16, 16), executor="thread", max_workers=2
+    )
+    np.testing.assert_allclose(tiled, dat.RGB)
+
+    masked = dat.day_microphysics(masked=True, tile_shape=(10, 20))
+    np.testing.assert_equal(masked, goes.mask(dat.RGB))
+    np.testing.assert_equal(dat.rgb(masked=True), masked)
+
+
+def _trim_sum(dat):
+    # Runs in a worker process
+    return float(dat.trim()["M3C13"].sum()), float(dat.RGB.sum())
+
+
+def test_detach_pickle():
+    dat = goes.Goes({"M3C13": fake_channel()})
+    detached = dat.detach()
+    assert not dat.is_detached and detached.is_detached
+    assert np.ma.is_masked(detached._data["M3C13"]["CMI"][0, 0])
+    assert detached._data["M3C13"]["x"].scale_factor == dat._projection[
+        "M3C13"
+    ].scale
+
+    loaded = pickle.loads(pickle.dumps(dat))
+    assert loaded.is_detached
+    assert loaded._img_date == dat._img_date
+    assert loaded._projection == dat._projection
+    np.testing.assert_equal(loaded.RGB, dat.RGB)
+    np.testing.assert_equal(loaded.trim()["M3C13"], dat.trim()["M3C13"])
+
+
+def test_detach_shared():
+    dat = goes.Goes({"M3C13": fake_channel()})
+    shared = dat.detach(shared=True)
+    try:
+        cmi = shared._data["M3C13"]["CMI"].values
+        assert isinstance(cmi, parallel.SharedArray)
+        # Only references to the shared memory are pickled
+        assert len(pickle.dumps(shared)) < cmi.array.nbytes / 10
+
+        loaded = pickle.loads(pickle.dumps(shared))
+        np.testing.assert_equal(loaded.trim()["M3C13"], dat.trim()["M3C13"])
+        assert loaded.RGB.base is not None
+
+        with futures.ProcessPoolExecutor(1) as pool:
+            result = pool.submit(_trim_sum, shared).result()
+        assert result == _trim_sum(dat)
+    finally:
+        shared.release()
+
+
+def test_detached_variable_packed(tmp_path):
+    raw = np.random.default_rng(0).integers(0, 4096, (6, 5), dtype=np.uint16)
+    raw[0, 0] = 65535
+    raw[1, 1] = 4095
+
+    with Dataset(tmp_path / "packed.nc", "w") as nc:
+        nc.createDimension("y", 6)
+        nc.createDimension("x", 5)
+        cmi = nc.createVariable("CMI", "u2", ("y", "x"), fill_value=65535)
+        cmi.scale_factor = np.float32(0.0003)
+        cmi.add_offset = np.float32(0.1)
+        cmi.valid_range = np.array([0, 4094], dtype=np.uint16)
+        cmi.set_auto_maskandscale(False)
+        cmi[:] = raw
+
+    with Dataset(tmp_path / "packed.nc") as nc:
+        variable = nc.variables["CMI"]
+        packed = goes.DetachedVariable.from_variable(variable, packed=True)
+        assert packed.packed and packed.array.dtype == np.uint16
+        expected = variable[:]
+        # Reading raw values doesn't change the variable
+        assert variable.scale and variable.mask
+
+    # Masked pixels keep the packed value, as in netCDF4
+    np.testing.assert_array_equal(packed[:].data, expected.data)
+    for key in (np.s_[:], np.s_[1:4, 2:], np.s_[0, 0], np.s_[1, 1]):
+        block = packed[key]
+        assert block.dtype == expected.dtype
+        np.testing.assert_array_equal(block.mask, np.ma.getmask(expected[key]))
+        np.testing.assert_array_equal(
+            np.ma.filled(block, 0), np.ma.filled(expected[key], 0)
+        )
+
+
+@mock.patch("stratopy.goes.Calculator")
+def test_precision(mock_calculator):
+    mock_calculator.return_value.reflectance_from_tbs = fake_reflectance
+    with core.precision(np.float32):
+        dat = fake_scene()
+        trimmed = dat.trim()
+        assert dat.RGB.dtype == np.float32
+        rgb8 = dat.rgb(dtype=np.uint8)
+        assert goes.rgb2hsi(rgb8).dtype == np.float32
+    assert all(img.dtype == np.float32 for img in trimmed.values())
+    assert dat.trim(dtype=np.float64)["M3C13"].dtype == np.float64
+
+    # Images with less precision are not expanded
+    single = np.float32(1.0)
+    assert goes.as_precision(np.ones(2, np.float32)).dtype == single.dtype
+    assert goes.as_precision(np.ones(2), np.float32).dtype == single.dtype
+
+
+@mock.patch("stratopy.goes.Calculator")
+def test_tracing(mock_calculator):
+    mock_calculator.return_value.reflectance_from_tbs = fake_reflectance
+    dat = fake_scene()
+    spans = []
+    with tracing.trace(spans.append):
+        dat.rgb()
+    names = [span.name for span in spans]
+    assert names.count("goes.trim") == 3
+    assert names[-1] == "goes.day_microphysics"
+    assert {"goes.resample_c03", "goes.solar7", "goes.normalize_rgb"} <= set(
+        names
+    )
+
+    trim = {
+        span.attrs["channel"]: span
+        for span in spans
+        if span.name == "goes.trim"
+    }
+    assert trim["M3C07"].bytes_read == dat.trim()["M3C07"].nbytes
+    solar7 = names.index("goes.solar7")
+    assert spans[solar7].parent == "goes.day_microphysics"
+    assert spans[solar7].depth == 1
+
+    # Disabled, nothing is measured
+    assert not tracing.is_enabled()
+    with tracing.span("goes.trim") as span:
+        dat.trim()
+    assert not isinstance(span, tracing.Span)
+
+
+@mock.patch("stratopy.goes.Calculator")
+def test_product_cache(mock_calculator, tmp_path):
+    mock_calculator.return_value.reflectance_from_tbs = fake_reflectance
+    cache = products.ProductCache(tmp_path)
+    dat = fake_scene(cache=cache)
+    expected = fake_scene()
+    np.testing.assert_allclose(dat.RGB, expected.RGB)
+    for ch_id, img in dat.trim().items():
+        np.testing.assert_array_equal(img, expected.trim()[ch_id])
+
+    # Another object of the same scene doesn't compute them again
+    with mock.patch.object(goes.Goes, "_trim") as trim:
+        again = fake_scene(cache=cache)
+        np.testing.assert_array_equal(again.RGB, dat.RGB)
+        again.trim()
+    trim.assert_not_called()
+    assert len(list(tmp_path.iterdir())) == 2
+
+    # Other parameters are other products
+    dat.trim(dtype=np.float32)
+    dat.rgb(masked=True)
+    assert len(list(tmp_path.iterdir())) == 4
+
+    # Scenes of other satellites (or files) with the same start too
+    files = [path.replace("G16", "G17") for path in FILE_PATH]
+    for files in (FILE_PATH, files, files[:1]):
+        fake_scene(cache=cache, files=files).trim()
+    assert len(list(tmp_path.iterdir())) == 10
+
+
+def test_is_night():
+    region = (-35.0, -30.0, -65.0, -69.0)
+    assert goes.is_night(datetime.datetime(2019, 1, 4, 6), region)
+    assert not goes.is_night(datetime.datetime(2019, 1, 4, 18), region)
+    assert not goes.is_night(datetime.datetime(2019, 1, 4, 6), region, 180)
+
+    # The sun sets earlier in the east of South America
+    south_america = goes.REGIONS["south_america"]
+    night = datetime.datetime(2019, 1, 4, 23, 30)
+    assert not goes.is_night(night, south_america)
+    assert goes.is_night(night, (-40.0, 10.0, -37.0, -40.0))
+
+
+@mock.patch("stratopy.goes.Calculator")
+def test_day_microphysics_night(mock_calculator):
+    mock_calculator.return_value.reflectance_from_tbs = fake_reflectance
+    dat = fake_scene()
+    shape = dat.RGB.shape
+    assert dat._img_date == datetime.datetime(2019, 1, 4, 18, 0, 36)
+
+    # Night scenes are neither read nor corrected
+    dat._img_date = datetime.datetime(2019, 1, 4, 6)
+    mock_calculator.reset_mock()
+    with mock.patch.object(goes.Goes, "trim") as trim:
+        rgb = dat.rgb()
+        rgb8 = dat.day_microphysics(dtype=np.uint8)
+        masked = dat.day_microphysics(masked=True)
+    trim.assert_not_called()
+    mock_calculator.assert_not_called()
+    assert rgb.shape == shape and np.isnan(rgb).all()
+    assert rgb8.shape == shape and not rgb8.any()
+    np.testing.assert_equal(masked, goes.mask(rgb))
+
+    # Everything is computed without a maximum zenith
+    dat_all = dat.day_microphysics(max_zenith=None)
+    assert np.isfinite(dat_all).any()
+
+
+@mock.patch("stratopy.goes.Calculator")
+def test_day_microphysics_terminator(mock_calculator):
+    mock_calculator.return_value.reflectance_from_tbs = fake_reflectance
+    dat = fake_scene()
+    window = dat._trim_coord["M3C07"]
+    projection = dat._projection["M3C07"]
+
+    # Sunrise at the scene
+    for minutes in range(9 * 60, 12 * 60, 5):
+        date = datetime.datetime(2019, 1, 4) + datetime.timedelta(
+            minutes=minutes
+        )
+        zenith = goes.sun_zenith(window, date, projection)
+        if np.nanmin(zenith) < goes.MAX_ZENITH < np.nanmax(zenith):
+            break
+    dat._img_date = date
+    night = ~(zenith <= goes.MAX_ZENITH)
+    assert night.any() and not night.all()
+
+    rgb = dat.day_microphysics()
+    everything = dat.day_microphysics(max_zenith=None)
+    assert np.isnan(rgb[night]).all()
+    np.testing.assert_allclose(rgb[~night], everything[~night])
+    np.testing.assert_allclose(
+        dat.day_microphysics(tile_shape=(16, 16)), rgb
+    )
+    np.testing.assert_equal(
+        dat.day_microphysics(masked=True, tile_shape=(16, 16)),
+        goes.mask(rgb),
+    )
+
+    # Only the sunlit pixels are corrected
+    trimmed = dat.trim()
+    mock_calculator.reset_mock()
+    calls = []
+
+    def reflectance(zenith, ch7, ch13):
+        calls.append(zenith.size)
+        return fake_reflectance(zenith, ch7, ch13)
+
+    mock_calculator.return_value.reflectance_from_tbs = reflectance
+    G = goes.solar7(
+        window,
+        trimmed["M3C07"],
+        trimmed["M3C13"],
+        projection,
+        utc_time=date,
+        max_zenith=goes.MAX_ZENITH,
+    )
+    assert calls == [(~night).sum()]
+    assert np.isnan(G[night]).all()
+
+    # The date of the image is used, not a fixed one
+    default = goes.solar7(
+        window, trimmed["M3C07"], trimmed["M3C13"], projection
+    )
+    assert not np.allclose(G[~night], default[~night])
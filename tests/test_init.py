@@ -0,0 +1,30 @@
+import importlib
+import subprocess
+import sys
+
+import stratopy
+
+
+def test_lazy_import():
+    code = (
+        "import sys, stratopy; stratopy.merge; stratopy.Goes; "
+        "print(sorted({'geopandas', 'pyspectral', 's3fs'} & set(sys.modules)))"
+    )
+    out = subprocess.check_output([sys.executable, "-c", code], text=True)
+    assert out.strip() == "[]"
+
+
+def test_public_names():
+    for module_name, names in stratopy._EXPORTS.items():
+        module = importlib.import_module(f"stratopy.{module_name}")
+        assert getattr(stratopy, module_name) is module
+        for name in names:
+            assert getattr(stratopy, name) is getattr(module, name)
+        defined = {
+            name
+            for name, value in vars(module).items()
+            if getattr(value, "__module__", None) == module.__name__
+            and not name.startswith("_")
+        }
+        assert defined <= set(names)
+    assert set(stratopy.__all__) <= set(dir(stratopy))
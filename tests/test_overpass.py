@@ -0,0 +1,126 @@
+import datetime
+from unittest import mock
+
+import numpy as np
+
+import pandas as pd
+
+from stratopy import IO, catalog, overpass
+
+GRANULE = (
+    "2B-CLDCLASS.P1_R05/2019/002/"
+    "2019002175851_67551_CS_2B-CLDCLASS_GRANULE_P1_R05_E08_F03.hdf"
+)
+
+START = datetime.datetime(2019, 1, 2, 17, 58, 51)
+
+# CloudSat elements for the orbit of the granule
+TLE = (
+    "CLOUDSAT\n"
+    "1 29107U 06016A   19002.50000000  .00000100  00000-0  30000-4 0  9997\n"
+    "2 29107  98.2000 300.0000 0001500  90.0000 270.0000 14.57000000600000\n"
+)
+
+
+def scene(time):
+    return (
+        "noaa-goes16/ABI-L2-MCMIPF/"
+        f"OR_ABI-L2-MCMIPF-M3_G16_s{time:%Y%j%H%M%S}0_"
+        f"e{time + datetime.timedelta(minutes=10):%Y%j%H%M%S}0_c.nc"
+    )
+
+
+def fake_granule(size=5940):
+    # South to north along 60 W, a profile per second
+    return pd.DataFrame(
+        {
+            "read_time": pd.date_range(START, periods=size, freq="s"),
+            "Latitude": np.linspace(-80.0, 80.0, size),
+            "Longitude": np.full(size, -60.0),
+        }
+    )
+
+
+def test_track_from_frame():
+    track = overpass.Track.from_frame(fake_granule(), 67551, step=64)
+    assert track.times.size == 94 and track.lat[-1] == 80.0
+    first, last = track.overpass("south_america", margin=1.0)
+    # Latitudes -41 to 11 are crossed from ~18:23 to ~18:55
+    assert datetime.datetime(2019, 1, 2, 18, 22) < first
+    assert first < last < datetime.datetime(2019, 1, 2, 18, 56)
+    assert track.overpass((60.0, 70.0, 10.0, 0.0)) is None
+
+    assert overpass.Track.from_frame(fake_granule(0), 67551).times.size == 0
+
+
+def test_track_predict(tmp_path):
+    tle_file = tmp_path / "cloudsat.tle"
+    tle_file.write_text(TLE)
+    track = overpass.Track.predict(catalog.parse(GRANULE), tle_file)
+    assert track.granule == 67551
+    assert track.times[0] == np.datetime64(START)
+    assert track.times.size == 99 * 6 + 1
+    # Sun synchronous orbit, inclination 98.2
+    assert 81.0 < np.abs(track.lat).max() < 82.5
+    assert np.all((track.lon >= -180.0) & (track.lon <= 180.0))
+
+
+def test_prefilter(tmp_path):
+    prefilter = overpass.Prefilter("south_america", path=tmp_path)
+    day = datetime.datetime(2019, 1, 2)
+
+    # The granule ends ~19:37, far from the scene
+    assert not prefilter.check(GRANULE, scene(day.replace(hour=21)))
+    # Without a track, granules within the time bounds are kept
+    assert prefilter.track(GRANULE) is None
+    assert prefilter.check(GRANULE, scene(day.replace(hour=18)))
+
+    prefilter.remember(GRANULE, fake_granule())
+    assert repr(prefilter.track(GRANULE)) == "<Track 67551, 94 points>"
+    assert not prefilter.check(GRANULE, scene(day.replace(hour=17, minute=50)))
+    assert prefilter.check(GRANULE, scene(day.replace(hour=18, minute=30)))
+    assert not prefilter.check(GRANULE, scene(day.replace(hour=19, minute=20)))
+
+    # Tracks are shared through the cache
+    other = overpass.Prefilter((-40.0, 10.0, -37.0, -80.0), path=tmp_path)
+    day = day.replace(hour=17, minute=40)
+    scenes = [scene(day + datetime.timedelta(minutes=m)) for m in (10, 30, 50)]
+    pairs = other.pairs([GRANULE], scenes)
+    assert [f"{s.start:%H:%M}" for _, s in pairs] == ["18:10", "18:30"]
+    assert pairs[0][0].granule == 67551
+
+    other.clear()
+    assert prefilter.track(GRANULE) is None
+
+
+def test_prefilter_tle(tmp_path):
+    tle_file = tmp_path / "cloudsat.tle"
+    tle_file.write_text(TLE)
+    prefilter = overpass.Prefilter(tle_file=tle_file, path=tmp_path)
+    track = prefilter.track(GRANULE)
+    assert track.times.size == 99 * 6 + 1
+
+    # Only the scenes within the tolerance of the overpass are kept
+    first, last = track.overpass(prefilter.coordinates, prefilter.margin)
+    tolerance = prefilter.tolerance
+    for minutes in range(0, 100, 10):
+        start = START + datetime.timedelta(minutes=minutes)
+        end = start + datetime.timedelta(minutes=10)
+        expected = first - tolerance <= end and last + tolerance >= start
+        assert prefilter.check(GRANULE, scene(start)) == expected
+
+
+@mock.patch("stratopy.IO.fetch_cloudsat")
+@mock.patch("stratopy.IO.fetch_goes")
+def test_fetch_prefilter(mock_goes, mock_cloudsat, tmp_path):
+    prefilter = overpass.Prefilter(path=tmp_path)
+    day = datetime.datetime(2019, 1, 2, 21)
+    assert IO.fetch(GRANULE, scene(day), prefilter=prefilter) is None
+    mock_goes.assert_not_called()
+    mock_cloudsat.assert_not_called()
+
+    mock_cloudsat.return_value = fake_granule()
+    with mock.patch("stratopy.core.merge") as merge:
+        IO.fetch(GRANULE, scene(day.replace(hour=18)), prefilter=prefilter)
+    merge.assert_called_once()
+    assert prefilter.track(GRANULE).granule == 67551
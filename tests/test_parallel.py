@@ -0,0 +1,123 @@
+import threading
+import time
+from concurrent import futures
+
+import numpy as np
+
+import pytest
+
+from stratopy import parallel
+
+
+def box_mean(tile, image):
+    # 3x3 mean, needs a halo of one pixel
+    padded = np.pad(image, 1, mode="edge")
+    return sum(
+        padded[i : i + image.shape[0], j : j + image.shape[1]]
+        for i in range(3)
+        for j in range(3)
+    ) / 9.0
+
+
+def add_origin(tile, image, factor=1):
+    return image * factor + tile.origin[0] * 1000 + tile.origin[1]
+
+
+IMAGE = np.random.default_rng(0).uniform(size=(50, 37))
+
+
+def test_iter_tiles():
+    tiles = list(parallel.iter_tiles((50, 37), (16, 16), halo=2))
+    assert len(tiles) == 4 * 3
+    assert tiles[0].rows == slice(0, 16)
+    assert tiles[0].outer_rows == slice(0, 18)
+    last = tiles[-1]
+    assert last.rows == slice(48, 50) and last.cols == slice(32, 37)
+    assert last.outer_rows == slice(46, 50)
+    assert last.crop == (slice(2, 4), slice(2, 7))
+
+    covered = np.zeros((50, 37), dtype=int)
+    for tile in tiles:
+        covered[tile.rows, tile.cols] += 1
+    assert (covered == 1).all()
+
+
+@pytest.mark.parametrize("executor", [None, "thread", "process"])
+def test_map_tiles_halo(executor):
+    out = np.empty_like(IMAGE)
+    result = parallel.map_tiles(
+        box_mean,
+        (IMAGE,),
+        out,
+        tile_shape=(16, 16),
+        halo=1,
+        executor=executor,
+        max_workers=2,
+    )
+    assert result is out
+    np.testing.assert_allclose(out, box_mean(None, IMAGE))
+
+
+def test_map_tiles_executor_instance():
+    out = np.empty_like(IMAGE)
+    with futures.ThreadPoolExecutor(2) as pool:
+        parallel.map_tiles(
+            add_origin, (IMAGE,), out, (10, 10), executor=pool, factor=2
+        )
+    rows, cols = np.indices(IMAGE.shape)
+    np.testing.assert_allclose(
+        out, IMAGE * 2 + (rows // 10 * 10) * 1000 + cols // 10 * 10
+    )
+
+
+class CountingExecutor(futures.Executor):
+    # Executor without the attributes of the concurrent.futures pools,
+    # which counts the tiles in flight
+    def __init__(self):
+        self.pool = futures.ThreadPoolExecutor(8)
+        self.lock = threading.Lock()
+        self.pending = self.max_pending = 0
+
+    def submit(self, fn, *args, **kwargs):
+        def run():
+            time.sleep(0.01)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.pending -= 1
+
+        with self.lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        return self.pool.submit(run)
+
+
+@pytest.mark.parametrize("kwargs, limit", [({"max_pending": 3}, 3), ({}, 8)])
+def test_map_tiles_max_pending(kwargs, limit):
+    out = np.empty_like(IMAGE)
+    executor = CountingExecutor()
+    with executor.pool:
+        parallel.map_tiles(
+            add_origin,
+            (IMAGE,),
+            out,
+            (5, 5),
+            executor=executor,
+            max_workers=4,
+            **kwargs,
+        )
+    assert limit // 2 < executor.max_pending <= limit
+    rows, cols = np.indices(IMAGE.shape)
+    np.testing.assert_allclose(
+        out, IMAGE + (rows // 5 * 5) * 1000 + cols // 5 * 5
+    )
+
+
+def test_map_tiles_exceptions():
+    with pytest.raises(ValueError):
+        parallel.map_tiles(box_mean, (IMAGE, IMAGE[:3]), np.empty((50, 37)))
+    with pytest.raises(ValueError):
+        parallel.map_tiles(box_mean, (IMAGE,), np.empty((5, 37)))
+    with pytest.raises(ValueError):
+        parallel.map_tiles(box_mean, (IMAGE,), np.empty((50, 37)), executor=1)
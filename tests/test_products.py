@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+
+import pytest
+
+from stratopy import products
+
+
+def test_product_cache(tmp_path):
+    cache = products.ProductCache(tmp_path / "products")
+    key = cache.key(stage="rgb", scene="2019-01-04T06:00:36")
+    assert key == cache.key(scene="2019-01-04T06:00:36", stage="rgb")
+    assert key != cache.key(stage="rgb", scene="2019-01-04T06:10:36")
+    assert cache.get(key) is None
+
+    array = np.arange(12.0).reshape(3, 4)
+    stored = cache.put(key, array)
+    assert isinstance(stored, np.memmap) and not stored.flags.writeable
+    np.testing.assert_array_equal(cache.get(key), array)
+
+    images = {"M3C03": array, "M3C07": array[:2]}
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return images
+
+    for _ in range(2):
+        trimmed = cache.get_or_compute("trim", compute)
+    assert len(calls) == 1
+    assert trimmed.keys() == images.keys()
+    np.testing.assert_array_equal(trimmed["M3C07"], array[:2])
+
+    # Stored by another process meanwhile
+    cache.put(key, array * 2)
+    np.testing.assert_array_equal(cache.get(key), array)
+
+    with pytest.raises(ValueError):
+        cache.put("bad", {"array": array, "other": array})
+    assert sorted(os.listdir(cache.path)) == sorted([key, "trim"])
+
+    cache.clear()
+    assert cache.size() == 0 and os.listdir(cache.path) == []
+
+
+def test_product_cache_eviction(tmp_path):
+    array = np.zeros(1000)
+    products.ProductCache(tmp_path / "size").put("a", array)
+    size = os.path.getsize(tmp_path / "size" / "a" / "array.npy")
+    cache = products.ProductCache(tmp_path / "cache", size_limit=3 * size)
+
+    for key in "abc":
+        cache.put(key, array)
+        os.utime(cache.path / key, (0, ord(key)))
+    assert cache.get("a") is not None  # "b" is now the oldest
+
+    cache.put("d", array)
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.size() == 3 * size
+
+    # The last product is kept even if it's over the limit
+    cache.put("e", np.zeros(10000))
+    assert os.listdir(cache.path) == ["e"]
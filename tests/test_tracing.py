@@ -0,0 +1,99 @@
+import json
+import logging
+import threading
+
+import numpy as np
+
+import pytest
+
+from stratopy import tracing
+
+
+@tracing.traced("test.allocate")
+def allocate(nbytes):
+    tracing.add_bytes(nbytes)
+    return np.ones(nbytes, np.uint8)
+
+
+def test_span_nesting():
+    spans = []
+    with tracing.trace(spans.append):
+        with tracing.span("outer", region="south_america") as outer:
+            allocate(100)
+            allocate(50)
+        assert tracing.is_enabled()
+    assert not tracing.is_enabled()
+
+    assert [span.name for span in spans] == [
+        "test.allocate",
+        "test.allocate",
+        "outer",
+    ]
+    assert spans[0].parent == "outer" and spans[0].depth == 1
+    assert spans[0].bytes_read == 100
+    assert outer.bytes_read == 150
+    assert outer.attrs == {"region": "south_america"}
+    assert outer.wall >= spans[0].wall + spans[1].wall
+    assert outer.peak_memory is None
+
+    # Spans end (and the stack is cleared) on errors
+    with tracing.trace(spans.append):
+        with pytest.raises(ValueError):
+            with tracing.span("failed"):
+                raise ValueError()
+        with tracing.span("next") as span:
+            pass
+    assert span.parent is None
+
+
+def test_span_memory():
+    spans = []
+    with tracing.trace(spans.append, memory=True):
+        with tracing.span("outer"):
+            allocate(10 ** 6)
+            allocate(10 ** 5)
+    inner, small, outer = spans
+    assert 10 ** 6 <= inner.peak_memory < 2 * 10 ** 6
+    assert 10 ** 5 <= small.peak_memory < 10 ** 6
+    assert outer.peak_memory >= inner.peak_memory
+
+
+def test_span_memory_threads():
+    spans = []
+    with tracing.trace(spans.append, memory=True):
+        with tracing.span("main"):
+            thread = threading.Thread(target=allocate, args=(10 ** 5,))
+            thread.start()
+            thread.join()
+            allocate(10 ** 6)
+
+    # Only spans of the main thread restart and measure the peak
+    in_thread, inner, main = spans
+    assert in_thread.peak_memory is None
+    assert in_thread.bytes_read == 10 ** 5
+    assert 10 ** 6 <= inner.peak_memory < 2 * 10 ** 6
+    assert main.peak_memory >= inner.peak_memory
+
+
+def test_sinks(tmp_path, caplog):
+    path = tmp_path / "spans.jsonl"
+    with caplog.at_level(logging.INFO, logger="stratopy.tracing"):
+        with tracing.trace(tracing.JSONLinesSink(path), tracing.LoggingSink()):
+            allocate(10)
+            allocate(20)
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["bytes_read"] for line in lines] == [10, 20]
+    assert set(lines[0]) == {
+        "name",
+        "attrs",
+        "parent",
+        "depth",
+        "start",
+        "wall",
+        "cpu",
+        "bytes_read",
+        "peak_memory",
+    }
+    assert "test.allocate" in caplog.text
+    assert "bytes_read=20" in caplog.text
@@ -0,0 +1,105 @@
+import datetime
+
+from netCDF4 import Dataset
+
+import numpy as np
+
+import pandas as pd
+
+import pytest
+
+from stratopy import cloudsat, writers
+
+
+def merged_frame(n=4):
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame(
+        {
+            "read_time": pd.date_range("2019-01-04", periods=n, freq="s"),
+            "Latitude": rng.uniform(-30, 0, n),
+            "Longitude": rng.uniform(-70, -40, n),
+            "layer_0": rng.integers(1, 8, n),
+            "col_row": [(i, 2 * i) for i in range(n)],
+        }
+    )
+    tensor = rng.uniform(size=(n, 3, 3, 2)).astype(np.float32)
+    return frame, tensor
+
+
+@pytest.mark.parametrize("sidecar", [False, True])
+def test_parquet_round_trip(tmp_path, sidecar):
+    pytest.importorskip("pyarrow")
+    frame, tensor = merged_frame()
+    path = tmp_path / "merged.parquet"
+
+    frame_vec = frame.assign(goes_vec=list(tensor))
+    writers.to_parquet(frame_vec, path, sidecar=sidecar)
+    assert (tmp_path / "merged.parquet.goes_vec.npy").exists() == sidecar
+
+    loaded, loaded_tensor = writers.read_parquet(path)
+    np.testing.assert_array_equal(loaded_tensor, tensor)
+    assert loaded_tensor.dtype == np.float32
+    assert list(loaded.col) == [0, 1, 2, 3]
+    assert list(loaded.row) == [0, 2, 4, 6]
+    pd.testing.assert_series_equal(loaded.read_time, frame.read_time)
+
+    subset, _ = writers.read_parquet(path, columns=["layer_0"])
+    assert list(subset.columns) == ["layer_0"]
+
+
+@pytest.mark.filterwarnings("error")
+@pytest.mark.parametrize("wrap", [False, True])
+def test_parquet_frames(tmp_path, wrap):
+    pytest.importorskip("pyarrow")
+    frame, tensor = merged_frame()
+    path = tmp_path / "merged.parquet"
+    writers.to_parquet(
+        cloudsat.CloudSatFrame(frame) if wrap else frame, path, tensor=tensor
+    )
+    loaded, _ = writers.read_parquet(path)
+    assert list(loaded.layer_0) == list(frame.layer_0)
+
+
+def test_parquet_tensor(tmp_path):
+    pytest.importorskip("pyarrow")
+    frame, tensor = merged_frame()
+    path = tmp_path / "merged.parquet"
+    writers.to_parquet(frame, path, tensor=tensor)
+    np.testing.assert_array_equal(writers.read_parquet(path)[1], tensor)
+
+    writers.to_parquet(frame, path)
+    assert writers.read_parquet(path)[1] is None
+
+    with pytest.raises(ValueError):
+        writers.to_parquet(frame, path, tensor=tensor[:2])
+
+
+def test_write_images(tmp_path):
+    path = tmp_path / "images.nc"
+    rgb = np.random.default_rng(0).uniform(size=(20, 30, 3))
+    labels = (rgb[..., 0] > 0.5).astype(np.uint8)
+    time = datetime.datetime(2019, 1, 4, 6)
+
+    assert writers.write_images(path, time, (8, 8), RGB=rgb, mask=labels) == 0
+    step = writers.write_images(
+        path, time + datetime.timedelta(hours=1), RGB=rgb / 2, mask=labels
+    )
+    assert step == 1
+
+    with Dataset(path) as store:
+        assert store["RGB"].shape == (2, 20, 30, 3)
+        assert store["RGB"].chunking() == [1, 8, 8, 3]
+        assert store["RGB"].filters()["zlib"]
+        assert store["mask"].dtype == np.uint8
+        np.testing.assert_array_equal(store["RGB"][1], rgb / 2)
+        np.testing.assert_array_equal(store["mask"][0], labels)
+        assert store["time"][1] - store["time"][0] == 3600
+
+    with pytest.raises(ValueError):
+        writers.write_images(path, time, RGB=rgb)
+    with pytest.raises(ValueError):
+        writers.write_images(path, time, RGB=rgb[:5], mask=labels[:5])
+    with pytest.raises(ValueError):
+        writers.write_images(path, time, RGB=rgb, mask=labels[:5])
+    with pytest.raises(ValueError):
+        writers.write_images(path, time)